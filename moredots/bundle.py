@@ -0,0 +1,123 @@
+"""
+Module for exporting dotfile repositories into bundle files,
+which allow to install them without network access.
+"""
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from cStringIO import StringIO
+
+from moredots import exc
+from moredots.utils import temp_path
+
+
+__all__ = ['create', 'extract', 'read_manifest']
+
+
+#: Version of the bundle file format
+FORMAT = 1
+
+MANIFEST_NAME = 'manifest.json'
+BUNDLE_NAME = 'repo.bundle'
+
+
+def create(repo, path):
+    """Writes the dotfile repository into a bundle file.
+
+    Bundle file is an uncompressed tar archive which holds a manifest
+    with repository metadata, followed by a Git bundle of the repo's
+    current branch. This way, it can be installed with a single
+    sequential read, and copied or baked into machine images as-is.
+
+    :param repo: :class:`DotfileRepo` object
+    :param path: Path to the bundle file to create
+    :return: Manifest of the bundle, as dictionary
+    """
+    branch = repo.git_repo.head.ref.name
+    origin = getattr(repo.git_repo.remotes, 'origin', None)
+    manifest = {
+        'format': FORMAT,
+        'branch': branch,
+        'commit': repo.git_repo.head.commit.hexsha,
+        'remote': origin.url if origin is not None else None,
+        'dotfiles': len(repo.inventory),
+        'profiles': sorted(set(tag for entry in repo.inventory
+                               for tag in entry.tag_list)),
+        'created': int(time.time()),
+    }
+
+    temp_dir = tempfile.mkdtemp(prefix='mdots-bundle-')
+    try:
+        bundle_file = os.path.join(temp_dir, BUNDLE_NAME)
+        repo.git_repo.git.bundle('create', bundle_file, 'HEAD', branch)
+
+        # written under temporary name, so that no partial bundle
+        # is ever visible under the target path
+        temp_file = temp_path(path)
+        with tarfile.open(temp_file, 'w') as tar:
+            data = json.dumps(manifest, sort_keys=True)
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(data)
+            info.mtime = manifest['created']
+            tar.addfile(info, StringIO(data))
+            tar.add(bundle_file, arcname=BUNDLE_NAME)
+        os.rename(temp_file, path)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    return manifest
+
+
+def extract(path, directory):
+    """Extracts the contents of bundle file into given directory,
+    reading the file sequentially.
+
+    :param path: Path to the bundle file
+    :param directory: Directory to put the Git bundle in
+    :return: Tuple of the bundle's manifest and path to the Git bundle
+
+    :raise: ``exc.InvalidBundleError`` if file is not a valid bundle
+    """
+    manifest = bundle_file = None
+    try:
+        with tarfile.open(path, 'r|') as tar:
+            for member in tar:
+                if member.name == MANIFEST_NAME:
+                    manifest = json.load(tar.extractfile(member))
+                elif member.name == BUNDLE_NAME:
+                    bundle_file = os.path.join(directory, BUNDLE_NAME)
+                    with open(bundle_file, 'wb') as f:
+                        shutil.copyfileobj(tar.extractfile(member), f)
+    except (IOError, tarfile.TarError, ValueError):
+        raise exc.InvalidBundleError(path)
+
+    _check_manifest(path, manifest)
+    if bundle_file is None:
+        raise exc.InvalidBundleError(path)
+    return manifest, bundle_file
+
+
+def read_manifest(path):
+    """Reads only the manifest of given bundle file.
+    :raise: ``exc.InvalidBundleError`` if file is not a valid bundle
+    """
+    try:
+        with tarfile.open(path, 'r|') as tar:
+            member = tar.next()
+            manifest = json.load(tar.extractfile(member)) \
+                if member is not None and member.name == MANIFEST_NAME \
+                else None
+    except (IOError, tarfile.TarError, ValueError):
+        raise exc.InvalidBundleError(path)
+
+    _check_manifest(path, manifest)
+    return manifest
+
+
+def _check_manifest(path, manifest):
+    """Check that bundle's manifest is one we can understand."""
+    if not isinstance(manifest, dict) or manifest.get('format') != FORMAT:
+        raise exc.InvalidBundleError(path)
@@ -0,0 +1,111 @@
+"""
+Client of ``mdots server``, used as the program's entry point.
+
+Commands are forwarded to the resident server if one is running,
+and executed in the current process otherwise. To keep the startup
+of forwarded commands fast, this module imports nothing but
+the standard library.
+"""
+import errno
+import json
+import os
+import socket
+import sys
+import tempfile
+
+
+__all__ = ['main', 'request', 'socket_path']
+
+
+#: Environment variable overriding the path to server's socket.
+#: If it's set but empty, commands are never forwarded to the server.
+SOCKET_ENV = 'MDOTS_SOCKET'
+
+#: Commands which are always executed in the current process
+LOCAL_COMMANDS = ('server',)
+
+
+def main(argv=None):
+    """Entry point."""
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if not (argv and argv[0] in LOCAL_COMMANDS):
+        response = request(argv)
+        if response is not None:
+            sys.stdout.write(response['stdout'])
+            sys.stderr.write(response['stderr'])
+            return response['exit']
+
+    from moredots.main import main as run_command
+    return run_command(argv)
+
+
+def request(argv, path=None):
+    """Asks the server to execute command with given arguments.
+
+    :param argv: List of command line arguments (without program name)
+    :param path: Path to server's socket. By default, it's obtained
+                 by calling :func:`socket_path`
+    :return: Dictionary with ``stdout`` and ``stderr`` output
+             of the command and its ``exit`` code,
+             or ``None`` if there's no server to talk to
+
+    Socket which doesn't belong to the current user is never used,
+    as it may have been created in a shared directory (like /tmp)
+    by someone else, who would then receive the commands.
+    """
+    path = path or socket_path()
+    if not path:
+        return None
+    try:
+        if os.lstat(path).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except socket.error as e:
+            if e.errno in (errno.ENOENT, errno.ECONNREFUSED, errno.EACCES):
+                return None
+            raise
+
+        message = json.dumps({'argv': argv, 'cwd': os.getcwd()})
+        sock.sendall(message + '\n')
+        sock.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+
+    # command may have been partially executed by then,
+    # so it's not safe to simply run it again in this process
+    if not chunks:
+        return {'stdout': '', 'exit': 1,
+                'stderr': "fatal: mdots server closed the connection\n"}
+    return json.loads(''.join(chunks))
+
+
+def socket_path():
+    """Path to the socket of ``mdots server``.
+    :return: Path, or empty string if the server shouldn't be used
+    """
+    if SOCKET_ENV in os.environ:
+        return os.environ[SOCKET_ENV]
+
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'mdots.sock')
+    return os.path.join(tempfile.gettempdir(), 'mdots-%d.sock' % os.getuid())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,15 +3,26 @@ Command line argument parsing.
 """
 import os
 import argparse
+import time
 
 import git
 
-from moredots.repo import DotfileRepo
+from moredots import completion, discover
+from moredots.remotes import ROLES
+from moredots.repo import DotfileRepo, LINK_TYPES
 
 
 __all__ = ['create_argument_parser']
 
 
+#: Special profile name which stands for all dotfiles
+ALL_PROFILES = 'all'
+
+#: Cache of :class:`DotfileRepo` objects which ``mdots server`` keeps
+#: between commands, or ``None`` when running a single command
+repo_cache = None
+
+
 def create_argument_parser():
     """Creates argparse command-line parser."""
     parser = argparse.ArgumentParser(
@@ -35,7 +46,18 @@ def configure_command_subparsers(argparser):
     configure_add(subparsers)
     configure_rm(subparsers)
     configure_sync(subparsers)
+    configure_remote(subparsers)
     configure_install(subparsers)
+    configure_fsck(subparsers)
+    configure_which(subparsers)
+    configure_gc(subparsers)
+    configure_discover(subparsers)
+    configure_list(subparsers)
+    configure_switch(subparsers)
+    configure_relocate(subparsers)
+    configure_bundle(subparsers)
+    configure_server(subparsers)
+    configure_completion(subparsers)
 
 
 def configure_init(subparsers):
@@ -58,13 +80,51 @@ def configure_add(subparsers):
     add_filepath_argument(parser, purpose="add to repository")
     add_repo_argument(parser,
                       desc="dotfiles repository where the file should be added")
-    parser.add_argument(
+    link_type = parser.add_mutually_exclusive_group()
+    link_type.add_argument(
         '--hardlink',
         help="If provided, the dotfile will be hardlinked "
              "rather than symlinked from home directory.",
         action='store_true',
         default=False,
     )
+    link_type.add_argument(
+        '--reflink',
+        help="If provided, the dotfile in home directory will be replaced "
+             "with a copy-on-write clone of the file in repository "
+             "(or a regular copy, if filesystem doesn't support cloning).",
+        action='store_true',
+        default=False,
+    )
+    link_type.add_argument(
+        '--encrypt',
+        help="If provided, the dotfile will be stored in repository "
+             "encrypted, using the filter commands from moredots.encrypt "
+             "and moredots.decrypt options of its Git config, while home "
+             "directory keeps its plaintext.",
+        action='store_true',
+        default=False,
+    )
+    link_type.add_argument(
+        '--template',
+        help="If provided, the dotfile will be treated as template, "
+             "rendered into home directory with host facts (like "
+             "{{ hostname }} or {{ os }}) and variables from "
+             "moredots.vars section of repository's Git config.",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--tag',
+        dest='tags',
+        metavar="PROFILE",
+        help="Install the dotfile only for given profile. "
+             "Can be specified multiple times. "
+             "By default, dotfile is installed for all profiles.",
+        action='append',
+        default=[],
+    )
+    add_dry_run_argument(parser)
 
 
 def configure_rm(subparsers):
@@ -76,6 +136,7 @@ def configure_rm(subparsers):
     add_filepath_argument(parser, purpose="remove from repository")
     add_repo_argument(
         parser, desc="dotfiles repository that the file should be removed from")
+    add_dry_run_argument(parser)
 
 
 def configure_sync(subparsers):
@@ -89,6 +150,41 @@ def configure_sync(subparsers):
         parser, desc="local dotfiles repository to be synced with remote one")
 
 
+def configure_remote(subparsers):
+    """Configure command used to manage remotes
+    which dotfiles repository is synced with.
+    """
+    parser = subparsers.add_parser(
+        'remote', help="List, add or remove remotes which repository "
+                       "is synced with.")
+
+    parser.add_argument(
+        'action',
+        choices=['list', 'add', 'rm'],
+        nargs='?',
+        default='list',
+        help="Action to perform on remotes.",
+    )
+    parser.add_argument(
+        'name',
+        metavar="NAME",
+        nargs='?',
+        default=None,
+        help="Name of the remote to add or remove.",
+    )
+    add_remote_url_argument(parser, required=False, desc="remote to add")
+    parser.add_argument(
+        '--role',
+        choices=ROLES,
+        help="Whether the remote is only pulled from, only pushed to "
+             "(e.g. a backup mirror), or both during sync.",
+        default='both',
+    )
+    # positional repo argument would be ambiguous with optional NAME & URL
+    add_repo_argument(parser, '--repo', '-r',
+                      desc="dotfiles repository whose remotes are managed")
+
+
 def configure_install(subparsers):
     """Configure command used to 'install' (clone & symlink files)
     a remote dotfiles repository.
@@ -96,11 +192,258 @@ def configure_install(subparsers):
     parser = subparsers.add_parser(
         'install', help="Installs dotfiles from a remote repository.")
 
-    add_remote_url_argument(parser, required=True,
+    add_remote_url_argument(parser, required=False,
                             desc="remote dotfiles repository to install")
     add_repo_argument(parser, existing=False,
                       desc="directory for the local dotfiles repository")
     add_home_dir_argument(parser)
+    parser.add_argument(
+        '--from-bundle',
+        dest='bundle_file',
+        metavar="FILE",
+        help="Install from a bundle file created with 'mdots bundle create' "
+             "instead of cloning remote repository. If REMOTE_URL is given "
+             "as well, it will be used for subsequent syncs.",
+        default=None,
+    )
+    parser.add_argument(
+        '--profile',
+        help="If provided, only dotfiles belonging to given profile "
+             "will be checked out and installed.",
+        default=None,
+    )
+
+
+def configure_fsck(subparsers):
+    """Configure command used to check consistency of dotfiles repository."""
+    parser = subparsers.add_parser(
+        'fsck', help="Check that dotfiles in home directory, repository, "
+                     "its inventory and Git index are all consistent.")
+
+    add_repo_argument(parser, desc="dotfiles repository to check")
+    parser.add_argument(
+        '--repair',
+        help="If provided, problems found will be repaired where possible.",
+        action='store_true',
+        default=False,
+    )
+    add_json_argument(parser)
+
+
+def configure_which(subparsers):
+    """Configure command used to check whether a file in home directory
+    is managed by dotfiles repository.
+    """
+    parser = subparsers.add_parser(
+        'which', help="Show which dotfile in repository (if any) "
+                      "given file in home directory corresponds to.")
+
+    add_filepath_argument(parser, purpose="look up")
+    add_repo_argument(parser, desc="dotfiles repository to look in")
+
+
+def configure_gc(subparsers):
+    """Configure command used to remove orphaned links from home directory."""
+    parser = subparsers.add_parser(
+        'gc', help="Remove links from home directory which point to "
+                   "no longer existing files in repository.")
+
+    add_repo_argument(parser, desc="dotfiles repository to collect garbage of")
+    add_dry_run_argument(parser)
+
+
+def configure_discover(subparsers):
+    """Configure command used to find dotfiles that are not yet
+    in dotfiles repository.
+    """
+    parser = subparsers.add_parser(
+        'discover', help="Find dotfiles in home directory which aren't "
+                         "tracked by repository yet.")
+
+    add_repo_argument(parser, desc="dotfiles repository to compare against")
+    parser.add_argument(
+        '--ignore',
+        metavar="PATTERN",
+        help="Skip files matching given pattern (relative to home directory). "
+             "Can be specified multiple times.",
+        action='append',
+        default=[],
+    )
+    parser.add_argument(
+        '--max-depth',
+        metavar="DEPTH",
+        help="Maximum depth of directories to scan. Default: %(default)s.",
+        type=int,
+        default=discover.MAX_DEPTH,
+    )
+    parser.add_argument(
+        '--time-budget',
+        metavar="SECONDS",
+        help="Stop scanning after given number of seconds. "
+             "Default: %(default)s.",
+        type=float,
+        default=discover.TIME_BUDGET,
+    )
+    add_json_argument(parser)
+
+
+def configure_list(subparsers):
+    """Configure command used to list dotfiles tracked by
+    dotfiles repository.
+    """
+    parser = subparsers.add_parser(
+        'list', help="List dotfiles tracked by repository.")
+
+    parser.add_argument(
+        'pattern',
+        metavar="PATTERN",
+        help="Only list dotfiles whose paths start with given prefix "
+             "or, if it contains wildcards, match given pattern.",
+        nargs='?',
+        default=None,
+    )
+    add_repo_argument(parser, desc="dotfiles repository to list")
+    parser.add_argument(
+        '--link-type',
+        help="Only list dotfiles linked in given way.",
+        choices=LINK_TYPES,
+        default=None,
+    )
+    parser.add_argument(
+        '--tag',
+        metavar="PROFILE",
+        help="Only list dotfiles tagged with given profile.",
+        default=None,
+    )
+    parser.add_argument(
+        '--profile',
+        help="Only list dotfiles installed for given profile, "
+             "including ones which aren't tagged at all.",
+        default=None,
+    )
+    parser.add_argument(
+        '--modified-since',
+        metavar="TIME",
+        help="Only list dotfiles modified after given time, specified "
+             "as YYYY-MM-DD[THH:MM[:SS]] (local time) or Unix timestamp.",
+        type=timestamp,
+        default=None,
+    )
+    add_json_argument(parser)
+
+
+def configure_switch(subparsers):
+    """Configure command used to switch dotfiles repository
+    to a different profile.
+    """
+    parser = subparsers.add_parser(
+        'switch', help="Switch to a different profile, installing only "
+                       "the dotfiles tagged for it.")
+
+    parser.add_argument(
+        'profile',
+        metavar="PROFILE",
+        help="Name of the profile to switch to. "
+             "Use '%s' to install all dotfiles." % ALL_PROFILES,
+    )
+    add_repo_argument(parser, desc="dotfiles repository to switch")
+    add_dry_run_argument(parser)
+
+
+def configure_relocate(subparsers):
+    """Configure command used to move dotfiles repository
+    or its home directory.
+    """
+    parser = subparsers.add_parser(
+        'relocate', help="Move repository and/or its home directory, "
+                         "rewriting links that no longer point to the repo.")
+
+    add_repo_argument(parser, desc="dotfiles repository to relocate")
+    parser.add_argument(
+        '--to',
+        dest='repo_dir',
+        metavar="DIRECTORY",
+        help="New directory for the repository. If omitted, repository "
+             "is not moved (e.g. because it has been moved already).",
+        default=None,
+    )
+    parser.add_argument(
+        '--home',
+        dest='home_dir',
+        metavar="HOME_DIRECTORY",
+        help="New home directory for the repository.",
+        default=None,
+    )
+    link_style = parser.add_mutually_exclusive_group()
+    link_style.add_argument(
+        '--relative',
+        help="If provided, symlinks to dotfiles will be relative "
+             "from now on, so that they survive moving both the repository "
+             "and home directory together.",
+        action='store_const',
+        const=True,
+        default=None,
+    )
+    link_style.add_argument(
+        '--absolute',
+        dest='relative',
+        help="If provided, symlinks to dotfiles will be absolute from now on.",
+        action='store_const',
+        const=False,
+    )
+
+
+def configure_bundle(subparsers):
+    """Configure command used to export dotfiles repository
+    into a bundle file.
+    """
+    parser = subparsers.add_parser(
+        'bundle', help="Export repository into a single file which can be "
+                       "installed from without network access.")
+
+    parser.add_argument(
+        'action',
+        choices=['create'],
+        help="Action to perform on the bundle file.",
+    )
+    parser.add_argument(
+        'bundle_file',
+        metavar="FILE",
+        help="Path to the bundle file.",
+    )
+    add_repo_argument(parser, desc="dotfiles repository to bundle")
+
+
+def configure_server(subparsers):
+    """Configure command used to run resident moredots server,
+    which executes other commands on behalf of ``mdots`` client.
+    """
+    parser = subparsers.add_parser(
+        'server', help="Run server which executes moredots commands, "
+                       "so that they start faster.")
+
+    parser.add_argument(
+        '--socket',
+        dest='socket_path',
+        metavar="PATH",
+        help="Specify path to the Unix socket to listen on. By default, "
+             "$MDOTS_SOCKET or mdots.sock in $XDG_RUNTIME_DIR is used.",
+        default=None,
+    )
+
+
+def configure_completion(subparsers):
+    """Configure command used to generate shell completion script."""
+    parser = subparsers.add_parser(
+        'completion', help="Print shell completion script, e.g. for use "
+                           "with eval \"$(mdots completion bash)\".")
+
+    parser.add_argument(
+        'shell',
+        choices=sorted(completion.SHELLS),
+        help="Shell to generate the script for.",
+    )
+    add_repo_argument(parser, desc="dotfiles repository to complete paths from")
 
 
 # Common parameters
@@ -188,13 +531,54 @@ def add_home_dir_argument(parser):
     )
 
 
+def add_dry_run_argument(parser):
+    """Include the flag that makes command only show what it would do."""
+    parser.add_argument(
+        '--dry-run', '-n',
+        help="If provided, no changes will be made, only reported.",
+        action='store_true',
+        default=False,
+    )
+
+
+def add_json_argument(parser):
+    """Include the flag that switches command output to JSON Lines,
+    i.e. a separate JSON object for every line.
+    """
+    parser.add_argument(
+        '--json',
+        dest='output_json',
+        help="If provided, output will be in JSON Lines format.",
+        action='store_true',
+        default=False,
+    )
+
+
 # Utility functions
 
+def timestamp(value):
+    """argparse argument type for converting dates and times
+into Unix timestamps.
+"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for time_format in ('%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return time.mktime(time.strptime(value, time_format))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError("invalid time: %s" % value)
+
+
 def dotfile_repo(repo_dir):
     """argparse argument type for converting paths to moredots repositories
 into :class:`DotfileRepo` objects automatically.
 """
     try:
+        if repo_cache is not None:
+            return repo_cache.get(repo_dir)
         return DotfileRepo(repo_dir)
     except git.InvalidGitRepositoryError:
         msg = "fatal: %s is not a moredots repository" % repo_dir
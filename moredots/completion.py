@@ -0,0 +1,99 @@
+"""
+Module generating shell completion scripts for ``mdots``.
+
+Scripts complete paths of tracked dotfiles by reading the completion
+cache written along with repository's inventory, so pressing Tab
+doesn't have to start Python at all.
+"""
+from pipes import quote
+
+
+__all__ = ['SHELLS', 'script']
+
+
+#: Commands whose FILE argument is a dotfile tracked by the repository
+DOTFILE_COMMANDS = ('rm',)
+
+BASH_SCRIPT = r"""
+_mdots_dotfiles() {
+    if command -v look >/dev/null 2>&1; then
+        LC_ALL=C look -- "$1" %(cache_file)s 2>/dev/null
+    else
+        awk -v prefix="$1" 'index($0, prefix) == 1' %(cache_file)s 2>/dev/null
+    fi
+}
+
+_mdots() {
+    local cur=${COMP_WORDS[COMP_CWORD]}
+    if [ "$COMP_CWORD" -eq 1 ]; then
+        COMPREPLY=($(compgen -W "%(commands)s" -- "$cur"))
+    else
+        case "${COMP_WORDS[1]}" in
+            %(dotfile_commands)s) local IFS=$'\n'
+                COMPREPLY=($(_mdots_dotfiles "$cur")) ;;
+        esac
+    fi
+}
+
+complete -o default -F _mdots mdots
+"""
+
+ZSH_SCRIPT = r"""
+_mdots_dotfiles() {
+    if (( $+commands[look] )); then
+        LC_ALL=C look -- "$1" %(cache_file)s 2>/dev/null
+    else
+        awk -v prefix="$1" 'index($0, prefix) == 1' %(cache_file)s 2>/dev/null
+    fi
+}
+
+_mdots() {
+    if (( CURRENT == 2 )); then
+        compadd -- %(commands)s
+    else
+        case "${words[2]}" in
+            %(dotfile_commands)s) compadd -- ${(f)"$(_mdots_dotfiles "$PREFIX")"} ;;
+            *) _files ;;
+        esac
+    fi
+}
+
+compdef _mdots mdots
+"""
+
+FISH_SCRIPT = r"""
+function __mdots_dotfiles
+    if command -sq look
+        env LC_ALL=C look -- $argv[1] %(cache_file)s 2>/dev/null
+    else
+        awk -v prefix=$argv[1] 'index($0, prefix) == 1' %(cache_file)s 2>/dev/null
+    end
+end
+
+complete -c mdots -n __fish_use_subcommand -f -a '%(commands)s'
+complete -c mdots -n '__fish_seen_subcommand_from %(dotfile_commands)s' -f \
+    -a '(__mdots_dotfiles (commandline -ct))'
+"""
+
+#: Supported shells and templates of their completion scripts
+SHELLS = {
+    'bash': (BASH_SCRIPT, '|'),
+    'zsh': (ZSH_SCRIPT, '|'),
+    'fish': (FISH_SCRIPT, ' '),
+}
+
+
+def script(shell, repo, commands):
+    """Generates completion script for given shell.
+
+    :param shell: One of ``SHELLS``
+    :param repo: :class:`DotfileRepo` whose dotfiles will be completed
+    :param commands: List of names of all moredots commands
+    :return: Script, as string
+    """
+    template, separator = SHELLS[shell]
+    return template.lstrip() % {
+        'cache_file': quote(repo.inventory.completion_file),
+        'commands': " ".join(sorted(commands)),
+        'dotfile_commands': separator.join(DOTFILE_COMMANDS),
+    }
@@ -0,0 +1,174 @@
+"""
+Module for discovering dotfiles in home directory
+which are not yet tracked by dotfile repository.
+"""
+import os
+import stat
+import time
+from collections import deque, namedtuple
+from multiprocessing.pool import ThreadPool
+
+from moredots.ignore import IgnoreRules
+from moredots.utils import scandir
+
+
+__all__ = ['Candidate', 'discover']
+
+
+#: Patterns of paths (relative to $HOME) which are skipped by default,
+#: as they contain caches or other volatile data rather than configuration
+DEFAULT_IGNORES = (
+    '/.cache/', '/.local/share/Trash/', '/.thumbnails/', '/.npm/', '/.yarn/',
+    '/.cargo/registry/', '/.rustup/', '/.gradle/', '/.m2/', '/.ivy2/',
+    '/.pyenv/', '/.virtualenvs/', '/.mozilla/', '/.*_history',
+    '/.xsession-errors*',
+)
+
+#: Default number of worker threads scanning the dotfiles
+WORKERS = 8
+
+#: Default maximum depth of directories that will be scanned
+MAX_DEPTH = 8
+
+#: Default time (in seconds) after which scanning is stopped
+TIME_BUDGET = 5.0
+
+#: Tuple describing an untracked dotfile found in $HOME:
+#: - ``path`` is the relative path to dotfile (with dot)
+#: - ``is_dir`` tells whether it's a dot-directory
+#: - ``size`` is the total size of file(s), in bytes
+#: - ``mtime`` is the most recent modification time of file(s)
+#: - ``files`` is the number of files
+#: - ``complete`` tells whether the whole directory could be scanned
+#:   within depth & time limits
+Candidate = namedtuple('Candidate', ['path', 'is_dir', 'size', 'mtime',
+                                     'files', 'complete'])
+
+
+def discover(repo, ignore=(), max_depth=MAX_DEPTH, time_budget=TIME_BUDGET,
+             workers=WORKERS):
+    """Finds dotfiles and dot-directories in the repo's home directory
+    which aren't tracked by the repository.
+
+    Dot-directories are scanned concurrently to compute their sizes
+    and file counts. Scanning stops at given depth or when the time budget
+    runs out, in which case the results are marked incomplete.
+
+    Besides the default ignore patterns, the ones from repo's .mdotsignore
+    are used to skip files and directories.
+
+    :param repo: :class:`DotfileRepo` object
+    :param ignore: Additional gitignore-style patterns of paths to skip,
+                   matched against paths relative to $HOME
+    :param max_depth: Maximum depth of directories to scan
+    :param time_budget: Time (in seconds) for the whole scan
+    :param workers: Number of worker threads to use
+    :return: List of :class:`Candidate` tuples
+    """
+    deadline = time.time() + time_budget
+    rules = IgnoreRules(DEFAULT_IGNORES + tuple(ignore) +
+                        tuple(repo.ignore_rules.patterns))
+    home_dir = repo.home_dir
+
+    paths = []
+    for name in os.listdir(home_dir):
+        if not name.startswith('.') or _is_tracked(repo, name):
+            continue
+        if rules.match(name, is_dir=os.path.isdir(os.path.join(home_dir,
+                                                               name))):
+            continue
+        paths.append(name)
+
+    pool = ThreadPool(workers)
+    try:
+        candidates = pool.map(
+            lambda path: _scan(home_dir, path, rules, max_depth, deadline),
+            paths)
+    finally:
+        pool.close()
+        pool.join()
+
+    # directories holding nothing but links to tracked dotfiles are skipped
+    candidates = [c for c in candidates
+                  if c is not None and (c.files or not c.complete)]
+    return sorted(candidates, key=lambda c: c.path)
+
+
+def _is_tracked(repo, path):
+    """Whether given file in $HOME is already a (link to) dotfile
+    in the repository.
+    """
+    if path in repo.inventory:
+        return True
+    return repo.reverse_index.lookup(os.path.join(repo.home_dir, path)) \
+        is not None
+
+
+def _scan(home_dir, path, rules, max_depth, deadline):
+    """Scan the dotfile or dot-directory in $HOME.
+    :return: :class:`Candidate` or ``None`` if it cannot be accessed
+    """
+    try:
+        st = os.lstat(os.path.join(home_dir, path))
+    except OSError:
+        return None
+    if stat.S_ISLNK(st.st_mode):
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return Candidate(path=path, is_dir=False, size=st.st_size,
+                         mtime=st.st_mtime, files=1, complete=True)
+
+    size, mtime, files = 0, st.st_mtime, 0
+    complete = True
+
+    # breadth-first traversal, so that time budget running out
+    # leaves us with the shallowest (most important) part of directory
+    queue = deque([(path, 1)])
+    while queue:
+        if time.time() > deadline:
+            complete = False
+            break
+
+        directory, depth = queue.popleft()
+        for name, entry_stat in _list_dir(os.path.join(home_dir, directory)):
+            entry_path = os.path.join(directory, name)
+            is_dir = stat.S_ISDIR(entry_stat.st_mode)
+            if rules.match(entry_path, is_dir):
+                continue
+
+            if is_dir:
+                if depth < max_depth:
+                    queue.append((entry_path, depth + 1))
+                else:
+                    complete = False
+            elif stat.S_ISREG(entry_stat.st_mode):
+                size += entry_stat.st_size
+                mtime = max(mtime, entry_stat.st_mtime)
+                files += 1
+
+    return Candidate(path=path, is_dir=True, size=size, mtime=mtime,
+                     files=files, complete=complete)
+
+
+def _list_dir(directory):
+    """Yields names & lstat() results of all entries in given directory,
+    using ``scandir()`` if available.
+
+    Unreadable directories are skipped, as are entries which vanish
+    or can't be stat'ed while the directory is being listed.
+    """
+    try:
+        if scandir is not None:
+            entries = [(entry.name, entry) for entry in scandir(directory)]
+        else:
+            entries = [(name, None) for name in os.listdir(directory)]
+    except OSError:
+        return
+
+    for name, entry in entries:
+        try:
+            entry_stat = entry.stat(follow_symlinks=False) if entry \
+                else os.lstat(os.path.join(directory, name))
+        except OSError:
+            continue
+        yield name, entry_stat
@@ -0,0 +1,154 @@
+"""
+Module containing the :class:`DecryptionCache` class which handles
+encrypted dotfiles, stored in the repository only as ciphertext.
+"""
+import hashlib
+import os
+import subprocess
+from distutils.spawn import find_executable
+
+from moredots import exc
+from moredots.utils import CHUNK_SIZE, copy_file, stat_key, temp_path
+
+
+__all__ = ['DecryptionCache']
+
+
+CACHE_DIR = 'mdots_secrets'
+
+#: Options in repo's Git config holding the filter commands
+#: which encrypt and decrypt dotfiles (from standard input to output)
+ENCRYPT_OPTION = 'encrypt'
+DECRYPT_OPTION = 'decrypt'
+
+#: Filter commands used when none are configured but ``gpg`` is installed
+GPG_COMMANDS = {
+    ENCRYPT_OPTION: 'gpg --quiet --yes --encrypt --default-recipient-self',
+    DECRYPT_OPTION: 'gpg --quiet --decrypt',
+}
+
+
+class DecryptionCache(object):
+    """Represents the cache of decrypted (plaintext) contents
+    of encrypted dotfiles.
+
+    Encrypted dotfiles are kept in the repository as ciphertext, produced
+    by user-configured filter command (e.g. ``gpg`` or ``age``), while
+    $HOME holds their plaintext copies. Since decryption is slow
+    (and may even ask for passphrase), plaintext is cached under the Git
+    blob hash of ciphertext, so that dotfiles are only decrypted again
+    once their ciphertext changes, e.g. after being pulled from remote.
+
+    Cache holds secrets in plaintext, so it's only accessible to the user
+    and local to the machine, in the repo's .git directory.
+    """
+    def __init__(self, repo):
+        """Constructor.
+        :param repo: :class:`DotfileRepo` object
+        """
+        self.repo = repo
+        self._hashes = {}  # repo path -> (stat key, blob hash)
+
+    def render(self, dotfile):
+        """Provides the plaintext of encrypted dotfile,
+        decrypting it only if it's not in the cache yet.
+
+        :param dotfile: :class:`Dotfile` tuple
+        :return: Path to cached file with plaintext
+
+        :raise: ``exc.EncryptionError`` if dotfile cannot be decrypted
+        """
+        path = self.file(dotfile.repo_path)
+        if not os.path.exists(path):
+            self._ensure_dir()
+            self._filter(DECRYPT_OPTION, dotfile, dotfile.repo_path, path)
+        return path
+
+    def encrypt(self, dotfile):
+        """Encrypts dotfile from $HOME into the repository.
+
+        Its plaintext is put in the cache right away,
+        so that it doesn't need to be decrypted back.
+
+        :param dotfile: :class:`Dotfile` tuple
+        :raise: ``exc.EncryptionError`` if dotfile cannot be encrypted
+        """
+        self._ensure_dir()
+        self._filter(ENCRYPT_OPTION, dotfile,
+                     dotfile.home_path, dotfile.repo_path)
+        copy_file(dotfile.home_path, self.file(dotfile.repo_path))
+        os.chmod(self.file(dotfile.repo_path), 0o600)
+
+    def prune(self, dotfiles):
+        """Removes plaintexts of all files from the cache,
+        except for the current versions of given dotfiles.
+
+        :param dotfiles: Iterable of encrypted :class:`Dotfile` tuples
+        """
+        if not os.path.isdir(self.dir):
+            return
+
+        keep = set(self.blob_hash(dotfile.repo_path) for dotfile in dotfiles
+                   if os.path.isfile(dotfile.repo_path))
+        for name in os.listdir(self.dir):
+            if name not in keep:
+                os.unlink(os.path.join(self.dir, name))
+
+    def file(self, repo_path):
+        """Full path to the cached plaintext of given file with ciphertext."""
+        return os.path.join(self.dir, self.blob_hash(repo_path))
+
+    def blob_hash(self, path):
+        """Computes the hash that Git gives to contents of given file.
+        Hashes are remembered until the file is changed.
+        """
+        key = stat_key(path)
+        _, size, _ = key
+
+        cached_key, blob_hash = self._hashes.get(path, (None, None))
+        if cached_key != key:
+            sha1 = hashlib.sha1("blob %d\0" % size)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    sha1.update(chunk)
+            blob_hash = sha1.hexdigest()
+            self._hashes[path] = (key, blob_hash)
+        return blob_hash
+
+    @property
+    def dir(self):
+        """Full path to the cache directory."""
+        return os.path.join(self.repo.git_repo.git_dir, CACHE_DIR)
+
+    def _ensure_dir(self):
+        """Create cache directory, accessible only to the current user."""
+        if not os.path.isdir(self.dir):
+            os.mkdir(self.dir, 0o700)
+
+    def _filter(self, option, dotfile, source, target):
+        """Run filter command from given option of repo's config,
+        passing ``source`` file to its standard input and writing
+        the output to ``target`` file.
+        """
+        command = self.repo.get_config(option)
+        if not command and find_executable('gpg'):
+            command = GPG_COMMANDS[option]
+        if not command:
+            raise exc.EncryptionError(dotfile.path, repo=self.repo)
+
+        # output is written under temporary name, so that failed
+        # or interrupted command doesn't leave garbage behind
+        temp_target = temp_path(target)
+        old_umask = os.umask(0o077)
+        try:
+            with open(source, 'rb') as stdin:
+                with open(temp_target, 'wb') as stdout:
+                    status = subprocess.call(command, shell=True,
+                                             stdin=stdin, stdout=stdout)
+        finally:
+            os.umask(old_umask)
+
+        if status != 0:
+            os.unlink(temp_target)
+            raise exc.EncryptionError(dotfile.path, repo=self.repo)
+        os.rename(temp_target, target)
@@ -44,6 +44,50 @@ class DotfileNotFoundError(DotfileError):
     pass
 
 
+class IgnoredDotfileError(DotfileError):
+    """Error raised when trying to add a dotfile which matches
+    one of the patterns in repository's .mdotsignore file.
+    """
+    pass
+
+
+class InvalidLinkTypeError(DotfileError):
+    """Error raised when dotfile cannot be linked from $HOME
+    in the requested way, e.g. when trying to hardlink a directory.
+    """
+    pass
+
+
+class EncryptionError(DotfileError):
+    """Error raised when dotfile cannot be encrypted or decrypted,
+    because filter command for that isn't configured or it has failed.
+    """
+    pass
+
+
+class ObjectNotFoundError(DotfileError):
+    """Error raised when content of dotfile kept in external store
+    is neither in the local store nor in the remote one.
+    """
+    pass
+
+
+class TemplateError(DotfileError):
+    """Error raised when templated dotfile cannot be rendered
+    because it uses a variable which isn't defined.
+    """
+    def __init__(self, path, repo=None, variable=None, *args, **kwargs):
+        super(TemplateError, self).__init__(path, repo, *args, **kwargs)
+        self.variable = variable
+
+
+class CrossDeviceLinkError(InvalidLinkTypeError):
+    """Error raised when trying to hardlink a dotfile from $HOME
+    that is on a different filesystem than the dotfile repository.
+    """
+    pass
+
+
 # Repository errors
 
 class RepositoryError(Exception):
@@ -117,3 +161,70 @@ class UnrelatedRemoteError(SynchronizationError):
     specified remote repository is unrelated to local repository.
     """
     pass
+
+
+class MergeConflictError(SynchronizationError):
+    """Error raised when changes pulled from remote repository
+    conflict with local ones and have to be resolved manually.
+    """
+    pass
+
+
+class PullError(SynchronizationError):
+    """Error raised when changes cannot be pulled from remote repository,
+    e.g. because it's unreachable.
+    """
+    def __init__(self, repo, remote=None, error=None, *args, **kwargs):
+        """Constructor.
+        :param error: Error message from Git
+        """
+        super(PullError, self).__init__(repo, remote, *args, **kwargs)
+        self.error = error
+
+
+class UnknownRemoteError(SynchronizationError):
+    """Error raised when trying to operate on a remote
+    which the dotfile repository doesn't have.
+    """
+    pass
+
+
+# Bundle errors
+
+class BundleError(Exception):
+    """Base class for exceptions related to bundle files."""
+
+    def __init__(self, path, *args, **kwargs):
+        super(BundleError, self).__init__(*args, **kwargs)
+        self.path = path
+
+    def __repr__(self):
+        return "<%s path=%s>" % (self.__class__.__name__, self.path)
+
+
+class InvalidBundleError(BundleError):
+    """Error raised when file specified as bundle to install from
+    is not a valid moredots bundle.
+    """
+    pass
+
+
+# Server errors
+
+class ServerError(Exception):
+    """Base class for exceptions related to ``mdots server``."""
+
+    def __init__(self, socket_path, *args, **kwargs):
+        super(ServerError, self).__init__(*args, **kwargs)
+        self.socket_path = socket_path
+
+    def __repr__(self):
+        return "<%s socket_path=%s>" % (self.__class__.__name__,
+                                        self.socket_path)
+
+
+class ServerRunningError(ServerError):
+    """Error raised when starting the server on a socket
+    which another server is already listening on.
+    """
+    pass
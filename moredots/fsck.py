@@ -0,0 +1,251 @@
+"""
+Module for checking consistency of dotfile repositories.
+
+A repository is consistent when dotfiles in $HOME, files in the repo's
+working tree, records in the inventory and entries in the Git index
+all agree with each other.
+"""
+import os
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from moredots.inventory import InventoryEntry
+
+
+__all__ = ['Problem', 'check', 'repair']
+
+
+#: Default number of worker threads checking the dotfiles
+WORKERS = 8
+
+#: Tuple describing a single inconsistency found in the repository:
+#: - ``kind`` is one of the constants below
+#: - ``path`` is the relative path to dotfile (with dot)
+#: - ``detail`` is human-readable description of the problem
+Problem = namedtuple('Problem', ['kind', 'path', 'detail'])
+
+MISSING_FILE = 'missing_file'        # inventory entry without file in repo
+UNTRACKED_FILE = 'untracked_file'    # file in repo without inventory entry
+MISSING_LINK = 'missing_link'        # dotfile absent from $HOME
+BROKEN_LINK = 'broken_link'          # symlink in $HOME pointing elsewhere
+WRONG_LINK_TYPE = 'wrong_link_type'  # e.g. real file instead of symlink
+NOT_INDEXED = 'not_indexed'          # file in repo absent from Git index
+DELETED = 'deleted'                  # Git index entry without file in repo
+
+
+def check(repo, workers=WORKERS):
+    """Checks consistency of given dotfile repository.
+
+    Dotfiles are checked concurrently by a pool of worker threads,
+    as most of the work consists of waiting for stat() calls.
+
+    :param repo: :class:`DotfileRepo` object
+    :param workers: Number of worker threads to use
+    :return: List of :class:`Problem` tuples
+    """
+    dotfiles = dict((df.path, df) for df in repo.dotfiles)
+    indexed, skipped = _read_index(repo)
+
+    # dotfiles outside of sparse checkout are missing from the repo on purpose
+    paths = set(dotfiles) | set(
+        entry.path for entry in repo.inventory
+        if _relative_repo_path(repo, repo.dotfile(entry.path).repo_path)
+        not in skipped)
+    # as are links to dotfiles that belong to other profiles only
+    paths -= set(entry.path for entry in repo.inventory
+                 if not entry.in_profile(repo.profile))
+
+    pool = ThreadPool(workers)
+    try:
+        results = pool.imap_unordered(
+            lambda path: _check_dotfile(repo, path, dotfiles.get(path)),
+            paths, chunksize=64)
+        problems = [problem for result in results for problem in result]
+    finally:
+        pool.close()
+        pool.join()
+
+    problems.extend(_check_index(repo, dotfiles.values(), indexed, skipped))
+    return sorted(problems, key=lambda p: (p.path, p.kind))
+
+
+def repair(repo, problems):
+    """Repairs given problems with the dotfile repository, where possible.
+
+    Dotfiles in $HOME that are regular files or directories are never
+    replaced, as that could lead to losing data.
+
+    :param repo: :class:`DotfileRepo` object
+    :param problems: List of :class:`Problem` tuples, as returned by
+                     :func:`check`
+    :return: List of :class:`Problem` tuples that have been repaired
+    """
+    # inventory and links are changed like in any other modification
+    # of the repo, which e.g. ``mdots server`` may be doing right now
+    with repo.lock:
+        repaired = []
+        to_add, to_remove = set(), set()
+
+        # inventory has to be fixed first, as relinking depends on it
+        inventory_kinds = (MISSING_FILE, UNTRACKED_FILE)
+        problems = sorted(problems,
+                          key=lambda p: p.kind not in inventory_kinds)
+        for problem in problems:
+            dotfile = repo.dotfile(problem.path)
+            if problem.kind == MISSING_FILE:
+                repo.inventory.remove(dotfile.path)
+            elif problem.kind == UNTRACKED_FILE:
+                if os.path.isdir(dotfile.repo_path):
+                    repo.inventory.add(dotfile.path, hardlink=False, fold=True)
+                else:
+                    repo.inventory.add(dotfile.path, hardlink=False)
+            elif problem.kind == NOT_INDEXED:
+                to_add.add(dotfile.repo_path)
+            elif problem.kind == DELETED:
+                to_remove.add(dotfile.repo_path)
+            elif _is_drifted_hardlink(repo, dotfile):
+                updated = repo.repair_hardlinks([dotfile])
+                to_add.update(df.repo_path for df in updated)
+            elif not repo.relink(dotfile.path):
+                continue
+            repaired.append(problem)
+
+        if repo.inventory.dirty:
+            repo.inventory.save()
+            to_add.add(repo.inventory.file)
+        if to_add or to_remove:
+            repo.commit("repair %s" % ", ".join(sorted(
+                            set(p.path for p in repaired))),
+                        add=sorted(to_add), remove=sorted(to_remove))
+
+    return repaired
+
+
+# Checking individual dotfiles
+
+def _check_dotfile(repo, path, dotfile=None):
+    """Check single dotfile, known from either the repo's working tree
+    (in which case ``dotfile`` is given) or its inventory (or both).
+    :return: List of :class:`Problem` tuples
+    """
+    entry = repo.inventory.get(path)
+    if dotfile is None:
+        return [Problem(MISSING_FILE, path, "file listed in inventory "
+                                            "doesn't exist in repository")]
+    if entry is None:
+        entry = InventoryEntry(path=path)
+        problems = [Problem(UNTRACKED_FILE, path, "file in repository "
+                                                  "isn't listed in inventory")]
+    else:
+        problems = []
+
+    problem = _check_link(dotfile, entry)
+    if problem:
+        problems.append(problem)
+    return problems
+
+
+def _check_link(dotfile, entry):
+    """Check whether dotfile is properly linked from $HOME
+    to the file in repository, according to its inventory entry.
+    :return: :class:`Problem` or ``None``
+    """
+    home_path, repo_path = dotfile.home_path, dotfile.repo_path
+    try:
+        home_stat = os.lstat(home_path)
+    except OSError:
+        return Problem(MISSING_LINK, dotfile.path,
+                       "%s doesn't exist" % home_path)
+
+    if os.path.islink(home_path):
+        if entry.link_type != 'symlink':
+            return Problem(WRONG_LINK_TYPE, dotfile.path,
+                           "%s is a symlink instead of %s" % (
+                               home_path, entry.link_type))
+        if os.path.realpath(home_path) != os.path.realpath(repo_path):
+            return Problem(BROKEN_LINK, dotfile.path,
+                           "%s doesn't point to %s" % (home_path, repo_path))
+        return None
+
+    if entry.link_type == 'symlink':
+        # folded directories may have been unfolded into real directories
+        if entry.get('fold') and os.path.isdir(home_path):
+            return None
+        return Problem(WRONG_LINK_TYPE, dotfile.path,
+                       "%s is not a symlink" % home_path)
+
+    if entry.link_type == 'hardlink':
+        repo_stat = os.lstat(repo_path)
+        if (home_stat.st_dev, home_stat.st_ino) != \
+                (repo_stat.st_dev, repo_stat.st_ino):
+            return Problem(WRONG_LINK_TYPE, dotfile.path,
+                           "%s is not a hardlink to %s" % (home_path,
+                                                           repo_path))
+    return None
+
+
+def _check_index(repo, dotfiles, indexed, skipped):
+    """Check whether files in the repo's working tree
+    agree with entries in its Git index.
+
+    :param indexed: Set of paths in Git index
+    :param skipped: Set of paths outside of sparse checkout
+    :return: List of :class:`Problem` tuples
+    """
+    problems = []
+    for path in sorted(indexed - skipped):
+        if path.startswith('.'):
+            continue  # repo's own files, like the inventory
+        if not os.path.lexists(os.path.join(repo.dir, path)):
+            dotfile = repo.dotfile(os.path.join(repo.dir, path))
+            problems.append(Problem(DELETED, dotfile.path,
+                                    "%s is in Git index but doesn't exist" %
+                                    dotfile.repo_path))
+
+    for dotfile in dotfiles:
+        for repo_path in repo.walk_files(dotfile):
+            path = _relative_repo_path(repo, repo_path)
+            if path not in indexed:
+                problems.append(Problem(NOT_INDEXED,
+                                        repo.dotfile(repo_path).path,
+                                        "%s is not in Git index" % repo_path))
+
+    return problems
+
+
+def _read_index(repo):
+    """Read paths of files in the repo's Git index.
+
+    Index is listed by Git itself, as GitPython can't read the format
+    used by sparse checkout.
+
+    :return: Tuple of set of paths in the index, and set of paths
+             outside of sparse checkout (including their parent
+             directories, which folded dotfiles may be)
+    """
+    indexed, skipped = set(), set()
+    for line in repo.git_repo.git.ls_files('-t', '-z').split('\0'):
+        if not line:
+            continue
+        tag, path = line.split(' ', 1)
+        indexed.add(path)
+        if tag == 'S':  # skip-worktree flag, set by sparse checkout
+            while path and path not in skipped:
+                skipped.add(path)
+                path = path.rpartition('/')[0]
+    return indexed, skipped
+
+
+def _relative_repo_path(repo, repo_path):
+    """Path to a file in the repo, as it's listed in Git index."""
+    return os.path.relpath(repo_path, start=repo.dir).replace(os.path.sep, '/')
+
+
+# Repairing
+
+def _is_drifted_hardlink(repo, dotfile):
+    """Whether dotfile should be a hardlink but is a separate file instead."""
+    entry = repo.inventory.get(dotfile.path)
+    return (entry is not None and entry.link_type == 'hardlink'
+            and os.path.isfile(dotfile.home_path)
+            and not os.path.islink(dotfile.home_path))
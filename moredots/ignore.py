@@ -0,0 +1,178 @@
+"""
+Module containing the :class:`IgnoreRules` class which decides
+what files should be left out of dotfile repository.
+"""
+import os
+import re
+
+
+__all__ = ['IgnoreRules']
+
+
+IGNORE_FILE = '.mdotsignore'
+
+#: Characters which make a pattern into a glob rather than literal path
+GLOB_CHARS = re.compile(r'[*?\[]')
+
+
+class IgnoreRules(object):
+    """Compiled set of gitignore-style patterns of files to ignore.
+
+    Patterns are matched against dotfile paths relative to $HOME
+    (with dots), e.g. ``.vim/.netrwhist``. Their syntax follows
+    .gitignore files:
+
+    * blank lines and lines starting with ``#`` are skipped
+    * pattern without slash (e.g. ``*.swp``) matches file name
+      at any depth; with a slash (e.g. ``.config/foo``) it's matched
+      against the whole path
+    * trailing slash (e.g. ``.cache/``) restricts pattern to directories
+    * ``*`` and ``?`` don't match slashes, while ``**`` does
+    * pattern prefixed with ``!`` re-includes files matched by others
+
+    Ignoring a directory ignores everything inside it as well.
+    Unlike in Git, negated patterns always take precedence over
+    positive ones, regardless of their order.
+
+    Patterns are compiled once: literal paths are put into a trie
+    of path segments, literal names into a set, and globs into
+    a single combined regex. This makes matching a path cost roughly
+    proportional to its length, rather than to the number of patterns.
+    """
+    def __init__(self, patterns=()):
+        """Constructor.
+        :param patterns: Iterable of gitignore-style patterns
+        """
+        self.patterns = []
+        self._names = {}   # file name -> whether it's directory-only
+        self._trie = {}    # path segment -> subtree; None key marks the end
+        regexes = []
+        negated = []
+
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            self.patterns.append(pattern)
+
+            if pattern.startswith('!'):
+                negated.append(pattern[1:])
+                continue
+
+            dir_only = pattern.endswith('/')
+            anchored = '/' in pattern.rstrip('/')
+            pattern = pattern.strip('/')
+            if not pattern:
+                continue
+
+            if GLOB_CHARS.search(pattern):
+                regexes.append(_translate(pattern, anchored, dir_only))
+            elif anchored:
+                node = self._trie
+                for segment in pattern.split('/'):
+                    node = node.setdefault(segment, {})
+                node[None] = node.get(None, True) and dir_only
+            else:
+                self._names[pattern] = self._names.get(pattern, True) \
+                    and dir_only
+
+        self._regex = re.compile('|'.join(regexes)) if regexes else None
+        self._negated = IgnoreRules(negated) if negated else None
+
+    @classmethod
+    def load(cls, path):
+        """Loads rules from given ignore file.
+        If the file doesn't exist, the rules will be empty.
+        """
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(f.readlines())
+
+    def match(self, path, is_dir=False):
+        """Checks whether given path should be ignored.
+
+        :param path: Relative path to the dotfile (with dot)
+        :param is_dir: Whether the path points to a directory
+        """
+        path = os.path.normpath(path).replace(os.path.sep, '/')
+        if not self._match(path, is_dir):
+            return False
+        return not (self._negated and self._negated._match(path, is_dir))
+
+    def _match(self, path, is_dir):
+        """Check path against the positive patterns."""
+        segments = path.split('/')
+        last = len(segments) - 1
+
+        # literal file names can occur at any depth
+        for i, segment in enumerate(segments):
+            dir_only = self._names.get(segment)
+            if dir_only is not None and (not dir_only or i < last or is_dir):
+                return True
+
+        # literal paths are looked up in the trie, segment by segment
+        node = self._trie
+        for i, segment in enumerate(segments):
+            node = node.get(segment)
+            if node is None:
+                break
+            dir_only = node.get(None)
+            if dir_only is not None and (not dir_only or i < last or is_dir):
+                return True
+
+        if self._regex is not None:
+            return bool(self._regex.search(path + '/' if is_dir else path))
+        return False
+
+    # Python special methods
+
+    def __nonzero__(self):
+        """Casting to bool yields True if there are any patterns."""
+        return bool(self.patterns)
+    __bool__ = __nonzero__  # for Python 3.x
+
+    def __contains__(self, path):
+        """Operator `in` allows to check if a file path is ignored."""
+        return self.match(path)
+
+
+def _translate(pattern, anchored, dir_only):
+    """Translate glob pattern into regular expression which matches
+    paths to files covered by the pattern (including ones inside
+    matching directories).
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                charset = pattern[i + 1:end]
+                if charset.startswith('!'):
+                    charset = '^' + charset[1:]
+                parts.append('[%s]' % charset.replace('\\', '\\\\'))
+                i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+
+    prefix = '^' if anchored else '(?:^|/)'
+    suffix = '/' if dir_only else '(?:/|$)'
+    return '(?:%s%s%s)' % (prefix, ''.join(parts), suffix)
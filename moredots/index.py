@@ -0,0 +1,184 @@
+"""
+Module containing the :class:`ReverseIndex` class which maps files
+in home directory back to dotfiles stored within dotfile repository.
+"""
+import os
+
+from moredots.utils import temp_path
+
+
+__all__ = ['ReverseIndex']
+
+
+INDEX_FILE = 'mdots_index'
+
+
+class ReverseIndex(object):
+    """Represents the reverse index of dotfiles contained within repository.
+
+    Reverse index answers the question whether a file in $HOME is managed
+    by the repository (and as which dotfile), without walking either
+    of the directories. Files are looked up by their path in $HOME
+    or by the device & inode numbers of the files they resolve to,
+    which covers symlinks, hardlinks and folded dot-directories alike.
+
+    Additionally, the index remembers all directories in $HOME
+    which have ever held any dotfiles, so that looking for leftovers
+    of removed dotfiles can be limited to them.
+
+    The index is local to the machine (inode numbers wouldn't make sense
+    elsewhere), so it's stored inside the repo's .git directory.
+    Every line of the file holds a single record of dotfile path,
+    its path in $HOME, and device & inode numbers. Records of directories
+    have the dotfile path and inode numbers omitted.
+    """
+    def __init__(self, repo):
+        """Constructor.
+        :param repo: :class:`DotfileRepo` object
+        """
+        self.repo = repo
+
+        self._by_home_path = {}
+        self._by_inode = {}
+        self._inodes = {}  # path -> inode, for quick removal of records
+        self._dirs = set()
+        self._dirty = False
+        if os.path.exists(self.file):
+            self.load()
+
+    def load(self):
+        """Loads index records from ``self.file``."""
+        self._by_home_path = {}
+        self._by_inode = {}
+        self._inodes = {}
+        self._dirs = set()
+        with open(self.file) as f:
+            for line in f:
+                path, home_path, dev, ino = line.rstrip('\n').split('\t')
+                if not path:
+                    self._dirs.add(home_path)
+                    continue
+                self._by_home_path[home_path] = path
+                if dev and ino:
+                    self._by_inode[int(dev), int(ino)] = path
+                    self._inodes[path] = int(dev), int(ino)
+        self._dirty = False
+
+    def save(self):
+        """Saves index records to ``self.file``."""
+        temp_file = temp_path(self.file)
+        with open(temp_file, 'w') as f:
+            for home_path, path in sorted(self._by_home_path.iteritems()):
+                dev, ino = self._inodes.get(path, ('', ''))
+                print >>f, "\t".join((path, home_path, str(dev), str(ino)))
+            for home_dir in sorted(self._dirs):
+                print >>f, "\t".join(('', home_dir, '', ''))
+        os.rename(temp_file, self.file)
+
+        self._dirty = False
+
+    def update(self, dotfile):
+        """Adds or updates the index record for given dotfile.
+        :param dotfile: :class:`Dotfile` tuple
+        """
+        self.discard(dotfile)
+
+        self._by_home_path[dotfile.home_path] = dotfile.path
+        self._dirs.add(os.path.dirname(dotfile.home_path))
+        try:
+            st = os.stat(dotfile.repo_path)
+            self._by_inode[st.st_dev, st.st_ino] = dotfile.path
+            self._inodes[dotfile.path] = st.st_dev, st.st_ino
+        except OSError:
+            pass  # only path-based lookup will be possible
+        self._dirty = True
+
+    def discard(self, dotfile):
+        """Removes index record for given dotfile, if it exists.
+        :param dotfile: :class:`Dotfile` tuple
+        """
+        path = self._by_home_path.pop(dotfile.home_path, None)
+        if path is not None:
+            inode = self._inodes.pop(path, None)
+            if inode is not None:
+                self._by_inode.pop(inode, None)
+            self._dirty = True
+
+    def clear(self):
+        """Removes all records of dotfiles from the index.
+        Directories which held any of them are still remembered.
+        """
+        self._by_home_path.clear()
+        self._by_inode.clear()
+        self._inodes.clear()
+        self._dirty = True
+
+    def lookup(self, home_path):
+        """Finds the dotfile which given file in $HOME corresponds to.
+
+        :param home_path: Absolute path to a file
+        :return: Relative path to the dotfile (with dot), or ``None``
+                 if the file isn't managed by the repository
+        """
+        home_path = os.path.abspath(home_path)
+
+        path = self._by_home_path.get(home_path)
+        if path is not None:
+            return path
+
+        try:
+            st = os.stat(home_path)
+        except OSError:
+            st = None
+        if st is not None:
+            path = self._by_inode.get((st.st_dev, st.st_ino))
+            if path is not None:
+                return path
+
+        # file may be inside a folded dot-directory
+        parent = os.path.dirname(home_path)
+        while parent != os.path.dirname(parent):
+            path = self._by_home_path.get(parent)
+            if path is not None:
+                return os.path.join(path, os.path.relpath(home_path,
+                                                          start=parent))
+            parent = os.path.dirname(parent)
+
+        return None
+
+    @property
+    def dirs(self):
+        """Set of all directories in $HOME which have ever held
+        any dotfiles from the repository.
+        """
+        return frozenset(self._dirs)
+
+    @property
+    def file(self):
+        """Full path to the index data file."""
+        return os.path.join(self.repo.git_repo.git_dir, INDEX_FILE)
+
+    @property
+    def dirty(self):
+        """Flag indicating whether index was saved since last change."""
+        return self._dirty
+
+    # Python special methods
+
+    def __len__(self):
+        """Length of :class:`ReverseIndex` equals number of indexed dotfiles."""
+        return len(self._by_home_path)
+
+    def __contains__(self, home_path):
+        """Operator `in` allows to check if file in $HOME is managed."""
+        return self.lookup(home_path) is not None
+
+    def __enter__(self):
+        """Using :class:`ReverseIndex` as context manager ensures
+        :meth:`save` is called at the end of ``with`` block.
+        """
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """Exiting ``with`` block always calls :meth:`save`."""
+        self.save()
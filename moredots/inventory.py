@@ -3,9 +3,10 @@ Module containing the :class:`Inventory` class which contains
 meta-information about dotfiles stored within dotfile repository.
 """
 import os
+from bisect import bisect_left
 from itertools import imap
 
-from moredots.utils import relative_path
+from moredots.utils import relative_path, temp_path
 
 
 __all__ = ['Inventory']
@@ -13,6 +14,9 @@ __all__ = ['Inventory']
 
 INVENTORY_FILE = '.mdots_files'
 
+#: File inside .git with sorted paths of dotfiles, for shell completion
+COMPLETION_FILE = 'mdots_completion'
+
 
 class Inventory(object):
     """Represents the inventory list of dotfiles contained within repository.
@@ -22,7 +26,8 @@ class Inventory(object):
     correctly with respect to that dotfile.
 
     As an example, inventory will store whether the dotfile should be
-    symlinked or hardlinked from $HOME to repo directory.
+    symlinked, hardlinked or reflinked from $HOME to repo directory, or whether
+    a dot-directory is "folded", i.e. linked as a whole with a single symlink.
     """
     def __init__(self, repo):
         """Constructor.
@@ -31,6 +36,7 @@ class Inventory(object):
         self.repo = repo
 
         self._entries = {}
+        self._paths = None  # sorted list of paths, for prefix lookups
         if os.path.exists(self.file):
             self.load()
 
@@ -41,16 +47,34 @@ class Inventory(object):
                 (entry.path, entry)
                 for entry in imap(InventoryEntry, f.readlines())
             )
+            self._paths = None
             self._dirty = False
 
     def save(self):
         """Saves inventory records to ``self.file``."""
+        # entries are kept sorted, so that changes from different machines
+        # touch different lines (see :mod:`moredots.merge`)
         with open(self.file, 'w') as f:
-            for entry in self:
-                entry.dump(f)
+            for path in self._sorted_paths():
+                self._entries[path].dump(f)
 
-            self.repo.git_repo.index.add([INVENTORY_FILE])
-            self._dirty = False
+        self.repo.stage(add=INVENTORY_FILE)
+        self._dirty = False
+
+        self.save_completion()
+
+    def save_completion(self):
+        """Saves sorted paths of all dotfiles to ``self.completion_file``.
+
+        Paths are sorted bytewise, one per line, so that completion scripts
+        can find the ones with given prefix by binary search (``look``)
+        without starting Python or reading the whole inventory.
+        """
+        temp_file = temp_path(self.completion_file)
+        with open(temp_file, 'w') as f:
+            for path in self._sorted_paths():
+                print >>f, path
+        os.rename(temp_file, self.completion_file)
 
     def add(self, path, **kwargs):
         """Adds a dotfile to this inventory.
@@ -64,6 +88,7 @@ class Inventory(object):
         path = self._preprocess_path(path, existing=False)
 
         self._entries[path] = InventoryEntry(path, **kwargs)
+        self._paths = None
         self._dirty = True
 
     def update(self, path, **kwargs):
@@ -93,13 +118,58 @@ class Inventory(object):
         path = self._preprocess_path(path, existing=True)
 
         del self._entries[path]
+        self._paths = None
         self._dirty = True
 
+    def get(self, path, default=None):
+        """Retrieves :class:`InventoryEntry` for given dotfile,
+        or ``default`` if the dotfile isn't in the inventory.
+        """
+        return self._entries.get(path, default)
+
+    def with_prefix(self, prefix):
+        """Yields :class:`InventoryEntry` objects of dotfiles whose paths
+        start with given prefix, in order of their paths.
+
+        Entries are found by binary search in the sorted list of paths,
+        which is kept until dotfiles are added to or removed from inventory.
+        """
+        paths = self._sorted_paths()
+        for i in xrange(bisect_left(paths, prefix), len(paths)):
+            if not paths[i].startswith(prefix):
+                break
+            yield self._entries[paths[i]]
+
+    def profile_paths(self, profile):
+        """Returns set of paths to dotfiles that belong to given profile.
+        See :meth:`InventoryEntry.in_profile` for details.
+        """
+        return set(entry.path for entry in self if entry.in_profile(profile))
+
+    def folded_parent(self, path):
+        """Finds the folded dot-directory which contains given dotfile.
+
+        :param path: Path to the dotfile, relative to the repository root
+        :return: :class:`InventoryEntry` of the folded directory,
+                 or ``None`` if the dotfile isn't inside one
+        """
+        parent = os.path.dirname(path)
+        while parent:
+            entry = self._entries.get(parent)
+            if entry is not None and entry.get('fold'):
+                return entry
+            parent = os.path.dirname(parent)
+
     @property
     def file(self):
         """Full path to the inventory data file."""
         return os.path.join(self.repo.dir, INVENTORY_FILE)
 
+    @property
+    def completion_file(self):
+        """Full path to the completion cache file."""
+        return os.path.join(self.repo.git_repo.git_dir, COMPLETION_FILE)
+
     @property
     def dirty(self):
         """Flag indicating whether inventory was saved since last change."""
@@ -107,6 +177,12 @@ class Inventory(object):
 
     # Internal methods
 
+    def _sorted_paths(self):
+        """Sorted list of paths of all dotfiles in the inventory."""
+        if self._paths is None:
+            self._paths = sorted(self._entries)
+        return self._paths
+
     def _preprocess_path(self, path, existing):
         """Preprocess path given to add/update/remove methods.
 
@@ -168,7 +244,8 @@ class InventoryEntry(object):
     """Represents a single entry in the inventory that contains information
     about a dotfile stored within dotfile repository.
     """
-    __slots__ = ['path', 'hardlink']
+    __slots__ = ['path', 'hardlink', 'reflink', 'encrypt', 'template',
+                 'external', 'fold', 'tags']
 
     def __init__(self, *args, **kwargs):
         """Constructor.
@@ -220,6 +297,44 @@ class InventoryEntry(object):
         return "<%s %s %s>" % (self.__class__.__name__, self.path,
                                self.dumps(sep=" ", include_path=False))
 
+    @property
+    def link_type(self):
+        """Way in which the dotfile is linked from $HOME to the repo:
+        ``'symlink'``, ``'hardlink'``, ``'reflink'``, ``'encrypted'``
+        (plaintext copy of the encrypted file in repo), ``'template'``
+        (rendered copy of the template in repo) or ``'external'``
+        (copy of the file in object store, which repo has a pointer to).
+        """
+        for link_type in ('hardlink', 'reflink', 'template', 'external'):
+            if self.get(link_type):
+                return link_type
+        if self.get('encrypt'):
+            return 'encrypted'
+        return 'symlink'
+
+    @property
+    def tag_list(self):
+        """List of tags (names of profiles) the dotfile belongs to.
+        Tags are stored in the entry as comma-separated string.
+        """
+        tags = self.get('tags', None)
+        return tags.split(',') if tags else []
+
+    def in_profile(self, profile):
+        """Whether the dotfile should be installed for given profile.
+
+        Dotfiles without any tags belong to every profile,
+        while ``None`` profile encompasses all dotfiles.
+        """
+        tags = self.tag_list
+        return profile is None or not tags or profile in tags
+
+    def get(self, name, default=False):
+        """Retrieves value of given piece of entry data,
+        or ``default`` if it hasn't been set for this entry.
+        """
+        return getattr(self, name, default)
+
     def dump(self, f, sep=os.pathsep, include_path=True):
         """Dump the entry into its textual representation,
         writing it to specified file-like object.
@@ -271,8 +386,15 @@ class InventoryEntry(object):
             name, value = part.split('=')  # unpack errors slipping is fine here
             if name in data:
                 raise ValueError("duplicate value for '%s' key" % name)
-            data[name] = value
+            data[name] = self._parse_value(value)
 
         # parsing successful, copy values to self
         for name, value in data.iteritems():
             setattr(self, name, value)
+
+    @staticmethod
+    def _parse_value(value):
+        """Convert textual representation of entry value
+        back to its Python counterpart.
+        """
+        return {'True': True, 'False': False}.get(value, value)
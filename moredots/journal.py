@@ -0,0 +1,100 @@
+"""
+Module containing the :class:`Journal` class which records plans
+being applied, so that they can be resumed after being interrupted.
+"""
+import os
+
+from moredots.plan import Plan, Step
+from moredots.utils import temp_path
+
+
+__all__ = ['Journal']
+
+
+JOURNAL_FILE = 'mdots_journal'
+
+#: Marker of lines recording completed steps
+DONE = 'done'
+
+
+class Journal(object):
+    """Represents the journal of plan steps applied to dotfiles.
+
+    Before a plan is applied, all its steps are written to the journal.
+    Then, as each step is completed, a short line with its number
+    is appended. Once the whole plan is applied, journal file is removed,
+    so its presence means the last run of moredots has been interrupted.
+
+    Since steps can be applied again safely, the run can be resumed
+    by applying only the steps that weren't recorded as completed.
+
+    Journal refers to paths in this machine's $HOME and describes
+    a run that happened here, so it's kept in the repo's .git directory.
+    """
+    def __init__(self, repo):
+        """Constructor.
+        :param repo: :class:`DotfileRepo` object
+        """
+        self.repo = repo
+        self._file = None
+
+    def start(self, steps):
+        """Records the steps of a plan that's about to be applied.
+        :param steps: List of :class:`Step` tuples
+        """
+        temp_file = temp_path(self.file)
+        with open(temp_file, 'w') as f:
+            for step in steps:
+                print >>f, "\t".join((step.action, step.path,
+                                      step.target or '',
+                                      step.link_type or ''))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_file, self.file)
+
+        self._file = open(self.file, 'a')
+
+    def done(self, index):
+        """Records completion of the step with given index."""
+        print >>self._file, "%s\t%d" % (DONE, index)
+        self._file.flush()
+
+    def finish(self):
+        """Marks the whole plan as applied, removing the journal."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.unlink(self.file)
+
+    def load(self):
+        """Loads the steps of interrupted plan which haven't been completed.
+        :return: :class:`Plan` with remaining steps
+        """
+        steps = []
+        done = set()
+        with open(self.file) as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # line that was being written during the crash
+                fields = line.rstrip('\n').split('\t')
+                if fields[0] == DONE:
+                    done.add(int(fields[1]))
+                    continue
+                action, path, target, link_type = fields
+                steps.append(Step(action=action, path=path,
+                                  target=target or None,
+                                  link_type=link_type or None, reason=None))
+
+        plan = Plan()
+        plan.steps = [step for i, step in enumerate(steps) if i not in done]
+        return plan
+
+    @property
+    def file(self):
+        """Full path to the journal file."""
+        return os.path.join(self.repo.git_repo.git_dir, JOURNAL_FILE)
+
+    @property
+    def pending(self):
+        """Whether there is an interrupted plan recorded in the journal."""
+        return os.path.exists(self.file)
@@ -0,0 +1,104 @@
+"""
+Module containing the :class:`RepoLock` class which serializes
+modifications of dotfile repository.
+"""
+import fcntl
+import functools
+import os
+import threading
+
+
+__all__ = ['RepoLock', 'locked']
+
+
+LOCK_FILE = 'mdots_lock'
+
+
+class RepoLock(object):
+    """Lock which is held while the dotfile repository is being modified.
+
+    It excludes both other processes (through ``flock()`` on a file
+    inside repo's .git directory) and other threads of the same process,
+    such as ones serving requests in ``mdots server``. The lock is
+    reentrant, so locked methods can call each other freely.
+    """
+    def __init__(self, repo, on_acquire=None):
+        """Constructor.
+        :param repo: :class:`DotfileRepo` object
+        :param on_acquire: Optional function called whenever an operation
+                           acquires the lock (but not when it's reacquired
+                           reentrantly by the same operation)
+        """
+        self.repo = repo
+        self.on_acquire = on_acquire
+
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self, blocking=True):
+        """Acquires the lock.
+
+        :param blocking: Whether to wait for the lock to be released
+                         by its current holder
+        :return: Whether the lock has been acquired
+        """
+        if not self._lock.acquire(blocking):
+            return False
+        if self._depth == 0:
+            f = open(self.file, 'a')
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX |
+                            (0 if blocking else fcntl.LOCK_NB))
+            except IOError:
+                f.close()
+                self._lock.release()
+                return False
+            self._file = f
+            if self.on_acquire is not None:
+                self.on_acquire()
+        self._depth += 1
+        return True
+
+    def release(self):
+        """Releases the lock."""
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+    @property
+    def file(self):
+        """Full path to the lock file."""
+        return os.path.join(self.repo.git_repo.git_dir, LOCK_FILE)
+
+    @property
+    def locked(self):
+        """Whether the lock is held by this process."""
+        return self._depth > 0
+
+    # Python special methods
+
+    def __enter__(self):
+        """Using :class:`RepoLock` as context manager holds the lock
+        for the duration of ``with`` block.
+        """
+        self.acquire()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """Exiting ``with`` block releases the lock."""
+        self.release()
+
+
+def locked(method):
+    """Decorator for methods of :class:`DotfileRepo` which modify
+    the repository, making them hold its lock while they run.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -2,17 +2,25 @@
 """
 Main module, containing program's entry point.
 """
+import json
+import os
+import sys
+import time
 from contextlib import contextmanager
 
-from moredots import exc
-from moredots.cmdline import create_argument_parser
+from moredots import (bundle, completion, discover, exc, fsck, query,
+                      server)
+from moredots.cmdline import create_argument_parser, ALL_PROFILES
 from moredots.repo import DotfileRepo
 
 
-def main():
-    """Entry point."""
+def main(argv=None):
+    """Entry point.
+    :param argv: List of command line arguments (without program name).
+                 By default, ``sys.argv`` is used.
+    """
     parser = create_argument_parser()
-    args = vars(parser.parse_args())
+    args = vars(parser.parse_args(argv))
 
     # dispatch execution depending on what command was issued
     command = args.pop('command')
@@ -38,26 +46,173 @@ def handle_init(repo_dir, home_dir):
     DotfileRepo.init(repo_dir, home_dir)
 
 
-def handle_add(repo, filepath, hardlink):
+def handle_add(repo, filepath, hardlink, reflink, encrypt, template, tags,
+               dry_run):
     """Adds a dotfile to dotfiles repository."""
-    repo.add(filepath, hardlink)
+    plan = repo.add(filepath, hardlink, reflink, encrypt=encrypt,
+                    template=template, tags=tags, dry_run=dry_run)
+    if dry_run:
+        print plan.format()
 
 
-def handle_rm(repo, filepath):
+def handle_rm(repo, filepath, dry_run):
     """Remove dotfile from dotfiles repository and return it
     to home directory intact.
     """
-    repo.remove(filepath)
+    plan = repo.remove(filepath, dry_run=dry_run)
+    if dry_run:
+        print plan.format()
 
 
 def handle_sync(repo, remote_url):
-    """Synchronize dotfile repository with a remote one."""
-    repo.sync(remote_url)
+    """Synchronize dotfile repository with its remotes."""
+    results = repo.sync(remote_url)
+    for result in results:
+        if result.ok:
+            print "pushed to %s in %.2fs" % (result.remote, result.seconds)
+        else:
+            error = result.error.splitlines()[-1] if result.error else ""
+            print "failed to push to %s in %.2fs: %s" % (
+                result.remote, result.seconds, error)
+    return 0 if all(result.ok for result in results) else 1
+
 
+def handle_remote(repo, action, name, remote_url, role):
+    """List, add or remove remotes of dotfile repository."""
+    if action == 'list':
+        for remote in repo.remotes:
+            print "%s\t%s\t%s" % (remote.name, remote.url, remote.role)
+    elif action == 'add':
+        if not (name and remote_url):
+            print "fatal: both NAME and REMOTE_URL must be provided"
+            return 1
+        repo.add_remote(name, remote_url, role=role)
+    elif action == 'rm':
+        if not name:
+            print "fatal: NAME must be provided"
+            return 1
+        repo.remove_remote(name)
 
-def handle_install(remote_url, repo_dir, home_dir):
+
+def handle_install(remote_url, repo_dir, home_dir, profile, bundle_file):
     """Installs remote dotfiles repository on this machine."""
-    DotfileRepo.install(remote_url, repo_dir, home_dir)
+    if bundle_file:
+        DotfileRepo.install_bundle(bundle_file, repo_dir, home_dir,
+                                   profile=profile, url=remote_url)
+    elif remote_url:
+        DotfileRepo.install(remote_url, repo_dir, home_dir, profile=profile)
+    else:
+        print "fatal: either REMOTE_URL or --from-bundle must be provided"
+        return 1
+
+
+def handle_fsck(repo, repair, output_json):
+    """Check consistency of dotfile repository, optionally repairing
+    the problems found.
+    """
+    problems = fsck.check(repo)
+    repaired = set(fsck.repair(repo, problems) if repair else ())
+
+    for problem in problems:
+        if output_json:
+            data = problem._asdict()
+            data['repaired'] = problem in repaired
+            print json.dumps(data, sort_keys=True)
+        else:
+            suffix = " (repaired)" if problem in repaired else ""
+            print "%s\t%s\t%s%s" % (problem.kind, problem.path,
+                                   problem.detail, suffix)
+
+    return 1 if len(problems) > len(repaired) else 0
+
+
+def handle_which(repo, filepath):
+    """Show which dotfile the file in home directory corresponds to."""
+    path = repo.reverse_index.lookup(repo.dotfile(filepath).home_path)
+    if path is None:
+        return 1
+    print path
+
+
+def handle_gc(repo, dry_run):
+    """Remove orphaned links from home directory."""
+    for orphan in repo.gc(dry_run=dry_run):
+        print orphan
+
+
+def handle_discover(repo, ignore, max_depth, time_budget, output_json):
+    """Find dotfiles which aren't tracked by dotfile repository yet."""
+    candidates = discover.discover(repo, ignore=ignore, max_depth=max_depth,
+                                   time_budget=time_budget)
+    for candidate in candidates:
+        if output_json:
+            print json.dumps(candidate._asdict(), sort_keys=True)
+        else:
+            mtime = time.strftime('%Y-%m-%d %H:%M',
+                                  time.localtime(candidate.mtime))
+            print "%12d %8d%s %s %s%s" % (
+                candidate.size, candidate.files,
+                "" if candidate.complete else "+", mtime, candidate.path,
+                os.path.sep if candidate.is_dir else "")
+
+
+def handle_list(repo, pattern, link_type, tag, profile, modified_since,
+                output_json):
+    """List dotfiles tracked by dotfile repository."""
+    if profile == ALL_PROFILES:
+        profile = None
+
+    listings = query.query(repo, pattern, link_type=link_type, tag=tag,
+                           profile=profile, modified_since=modified_since)
+    for listing in listings:
+        if output_json:
+            print json.dumps(listing._asdict(), sort_keys=True)
+        else:
+            print "%s\t%s\t%s" % (listing.path, listing.link_type,
+                                  ",".join(listing.tags))
+
+
+def handle_switch(repo, profile, dry_run):
+    """Switch dotfile repository to different profile."""
+    if profile == ALL_PROFILES:
+        profile = None
+
+    uninstalled, installed = repo.switch(profile, dry_run=dry_run)
+    for path in uninstalled:
+        print "-" + path
+    for path in installed:
+        print "+" + path
+
+
+def handle_relocate(repo, repo_dir, home_dir, relative):
+    """Move dotfile repository and/or its home directory."""
+    plan = repo.relocate(repo_dir, home_dir, relative=relative)
+    for step in plan:
+        if step.action == 'link':
+            print step.path
+
+
+def handle_bundle(repo, action, bundle_file):
+    """Export dotfile repository into a bundle file."""
+    if action == 'create':
+        manifest = bundle.create(repo, bundle_file)
+        print "%s: %d dotfile(s) at %s" % (bundle_file, manifest['dotfiles'],
+                                           manifest['commit'][:7])
+
+
+def handle_server(socket_path):
+    """Run resident server executing moredots commands."""
+    server.serve(socket_path)
+
+
+def handle_completion(repo, shell):
+    """Print shell completion script."""
+    if not os.path.exists(repo.inventory.completion_file):
+        repo.inventory.save_completion()  # repo predating completion cache
+
+    commands = [name[len('handle_'):] for name in globals()
+                if name.startswith('handle_')]
+    print completion.script(shell, repo, commands)
 
 
 # Error handling
@@ -81,9 +236,40 @@ def error_handler(command):
         print "fatal: file %s already exists in the repository" % e.path
     except exc.DotfileNotFoundError, e:
         print "fatal: file %s does not exist in the repository" % e.path
+    except exc.IgnoredDotfileError, e:
+        print "fatal: file %s is ignored by .mdotsignore" % e.path
+    except exc.CrossDeviceLinkError, e:
+        print ("fatal: file %s cannot be hardlinked "
+               "across different filesystems" % e.path)
+    except exc.InvalidLinkTypeError, e:
+        print "fatal: file %s cannot be linked that way" % e.path
+    except exc.EncryptionError, e:
+        print ("fatal: file %s cannot be encrypted or decrypted "
+               "(see moredots.encrypt and moredots.decrypt "
+               "in repository's Git config)" % e.path)
+    except exc.ObjectNotFoundError, e:
+        print ("fatal: content of file %s is not available "
+               "in local or remote store" % e.path)
+    except exc.TemplateError, e:
+        print "fatal: template %s uses undefined variable %s" % (e.path,
+                                                                 e.variable)
     except exc.NoRemoteError:
         print "fatal: no remote to sync the repository with"
+    except exc.MergeConflictError, e:
+        print ("fatal: changes pulled from %s conflict with local ones; "
+               "resolve them in %s, commit and sync again" % (e.remote,
+                                                              e.repo.dir))
+    except exc.UnrelatedRemoteError, e:
+        print "fatal: remote %s has unrelated history" % e.remote
+    except exc.PullError, e:
+        print "fatal: cannot pull from %s: %s" % (e.remote, e.error)
+    except exc.UnknownRemoteError, e:
+        print "fatal: no such remote: %s" % e.remote
+    except exc.InvalidBundleError, e:
+        print "fatal: %s is not a valid moredots bundle" % e.path
+    except exc.ServerRunningError, e:
+        print "fatal: mdots server is already running on " + e.socket_path
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Module containing the :class:`Maintenance` class which keeps
+the dotfile repository's Git database in good shape.
+"""
+import json
+import os
+import subprocess
+import time
+
+from moredots.utils import temp_path
+
+
+__all__ = ['Maintenance']
+
+
+MAINTENANCE_FILE = 'mdots_maintenance'
+
+#: Defaults of the heuristics triggering maintenance; each of them
+#: can be overridden by option of Git config with the same name
+DEFAULTS = {
+    # minimum number of seconds between two maintenance runs
+    'maintenanceinterval': 24 * 60 * 60,
+    # estimated number of loose objects (same as Git's ``gc.auto``)
+    'maintenancelooseobjects': 6700,
+    # number of moredots commits since the last maintenance
+    'maintenancecommits': 200,
+}
+
+#: Git commands run (in this order) during maintenance.
+#: Failure of repack stops the run, while the others are independent.
+COMMANDS = (
+    'git repack -d -l -q && git prune --expire=2.weeks.ago',
+    'git commit-graph write --reachable',
+)
+
+
+class Maintenance(object):
+    """Represents the schedule of maintenance of the dotfile repository.
+
+    Every moredots operation creates a commit, whose objects are written
+    to the Git database as loose files. Since nothing else maintains the
+    repository, they would pile up and slow down all Git operations.
+    Hence, after committing, it's checked whether the repository needs
+    maintenance (repacking, pruning and writing commit-graph), which is
+    then run in the background so that it doesn't delay the command.
+
+    Maintenance runs no more often than every ``maintenanceinterval``
+    seconds, and can be disabled by setting ``moredots.maintenance``
+    option of Git config to false.
+
+    Schedule tracks this clone's own Git database, which other machines
+    maintain separately, so it's kept in the repo's .git directory.
+    """
+    def __init__(self, repo):
+        """Constructor.
+        :param repo: :class:`DotfileRepo` object
+        """
+        self.repo = repo
+
+    def note_commit(self):
+        """Records that a commit has been made, and schedules maintenance
+        if the repository needs it.
+        :return: Whether maintenance has been started
+        """
+        state = self._load()
+        state['commits'] = state.get('commits', 0) + 1
+        self._save(state)
+
+        if not self.is_due(state):
+            return False
+        self.run()
+        return True
+
+    def is_due(self, state=None):
+        """Checks whether the repository needs maintenance.
+        :param state: Schedule state, to avoid reading it again
+        """
+        enabled = self.repo.get_config('maintenance', True)
+        if str(enabled).lower() in ('false', 'no', 'off', '0'):
+            return False
+
+        state = self._load() if state is None else state
+        last_run = state.get('last_run')
+        if last_run is not None and \
+                time.time() - last_run < self._option('maintenanceinterval'):
+            return False
+
+        return (state.get('commits', 0) >=
+                self._option('maintenancecommits') or
+                self.loose_objects() >=
+                self._option('maintenancelooseobjects'))
+
+    def run(self, wait=False):
+        """Runs maintenance of the repository, recording it in the schedule.
+
+        :param wait: If ``False``, maintenance is run in the background
+                     and this method returns immediately
+        """
+        self._save({'last_run': time.time(), 'commits': 0})
+
+        script = "; ".join("(%s)" % command for command in COMMANDS)
+        if not wait:
+            # the shell exits right away, leaving no zombie process behind
+            # while the actual commands are adopted by init
+            script = "(%s) </dev/null >/dev/null 2>&1 &" % script
+        with open(os.devnull, 'w') as devnull:
+            subprocess.call(script, shell=True, cwd=self.repo.dir,
+                            stdout=devnull, stderr=devnull)
+
+    def loose_objects(self):
+        """Estimates the number of loose objects in Git database,
+        the same way Git does it: by counting them in one of the 256
+        subdirectories of objects and extrapolating.
+        """
+        sample_dir = os.path.join(self.repo.git_repo.git_dir, 'objects', '17')
+        try:
+            return len(os.listdir(sample_dir)) * 256
+        except OSError:
+            return 0
+
+    @property
+    def file(self):
+        """Full path to the schedule file."""
+        return os.path.join(self.repo.git_repo.git_dir, MAINTENANCE_FILE)
+
+    def _option(self, option):
+        """Read numeric maintenance setting from Git config."""
+        return float(self.repo.get_config(option, DEFAULTS[option]))
+
+    def _load(self):
+        """Read the schedule state."""
+        try:
+            with open(self.file) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _save(self, state):
+        """Write the schedule state."""
+        temp_file = temp_path(self.file)
+        with open(temp_file, 'w') as f:
+            json.dump(state, f)
+        os.rename(temp_file, self.file)
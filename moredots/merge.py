@@ -0,0 +1,154 @@
+"""
+Merge driver for the inventory file, used by Git when pulling changes
+of dotfile repository made on different machines.
+
+Git runs it as::
+
+    python -m moredots.merge %O %A %B
+
+with paths to the common ancestor's, our and their version of inventory.
+Merged inventory is written over our version.
+"""
+import sys
+
+from moredots.inventory import InventoryEntry
+
+
+__all__ = ['merge', 'merge_files']
+
+
+#: Name of the merge driver in Git config and attributes
+DRIVER_NAME = 'mdots'
+
+#: Size of conflict markers, same as Git's default
+MARKER_SIZE = 7
+
+
+def merge(base, ours, theirs):
+    """Merges three versions of inventory, entry by entry.
+
+    Entries are matched by path and merged field by field, so that
+    changes made on different machines (like adding different dotfiles,
+    or changing different settings of the same one) merge cleanly.
+    Conflict happens only when both sides changed the same field of an
+    entry differently, or one side removed an entry that the other changed.
+
+    :param base: Lines of the common ancestor's version of inventory
+    :param ours: Lines of our version of inventory
+    :param theirs: Lines of their version of inventory
+    :return: Tuple of lines of merged inventory, sorted by path,
+             and a list of paths of conflicting entries, for which
+             both versions are included between conflict markers
+    """
+    base, ours, theirs = map(_parse, (base, ours, theirs))
+
+    lines = []
+    conflicts = []
+    for path in sorted(set(base) | set(ours) | set(theirs)):
+        merged = _merge_entry(base.get(path), ours.get(path),
+                              theirs.get(path))
+        if merged is _CONFLICT:
+            conflicts.append(path)
+            lines.append('<' * MARKER_SIZE + ' ours')
+            if path in ours:
+                lines.append(_format(path, ours[path]))
+            lines.append('=' * MARKER_SIZE)
+            if path in theirs:
+                lines.append(_format(path, theirs[path]))
+            lines.append('>' * MARKER_SIZE + ' theirs')
+        elif merged is not None:
+            lines.append(_format(path, merged))
+    return lines, conflicts
+
+
+def merge_files(base_file, ours_file, theirs_file):
+    """Merges three versions of inventory file, like a Git merge driver,
+    writing the result to ``ours_file``.
+    :return: List of paths of conflicting entries
+    """
+    versions = []
+    for path in (base_file, ours_file, theirs_file):
+        with open(path) as f:
+            versions.append(f.readlines())
+
+    lines, conflicts = merge(*versions)
+    with open(ours_file, 'w') as f:
+        for line in lines:
+            print >>f, line
+    return conflicts
+
+
+def main(argv=None):
+    """Entry point of the merge driver.
+    :return: Exit code for Git: 0 if merge is clean, 1 if it has conflicts
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3:
+        print >>sys.stderr, "usage: python -m moredots.merge BASE OURS THEIRS"
+        return 2
+    return 1 if merge_files(*argv) else 0
+
+
+# Internal functions
+
+#: Marker of conflicting entries, as result of :func:`_merge_entry`
+_CONFLICT = object()
+
+
+def _parse(lines):
+    """Parse lines of inventory into dictionary mapping paths
+    to dictionaries of entries' fields.
+    """
+    entries = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = InventoryEntry(line)
+        entries[entry.path] = dict(
+            (name, getattr(entry, name)) for name in InventoryEntry.__slots__
+            if name != 'path' and hasattr(entry, name))
+    return entries
+
+
+def _merge_entry(base, ours, theirs):
+    """Three-way merge of fields of single inventory entry.
+    :return: Merged fields, ``None`` if entry is removed,
+             or ``_CONFLICT`` if it cannot be merged
+    """
+    if ours == theirs:
+        return ours
+    if ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+    if ours is None or theirs is None:
+        return _CONFLICT  # removed on one side, changed on the other
+
+    base = base or {}
+    merged = {}
+    for name in set(base) | set(ours) | set(theirs):
+        value = _merge_value(base.get(name), ours.get(name),
+                             theirs.get(name))
+        if value is _CONFLICT:
+            return _CONFLICT
+        if value is not None:
+            merged[name] = value
+    return merged
+
+
+def _merge_value(base, ours, theirs):
+    """Three-way merge of a single value."""
+    if ours == theirs or theirs == base:
+        return ours
+    if ours == base:
+        return theirs
+    return _CONFLICT
+
+
+def _format(path, fields):
+    """Format inventory entry with given fields as a line of inventory."""
+    return InventoryEntry(path, **fields).dumps()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""
+Module containing the :class:`Plan` class, which describes changes
+to the filesystem as a list of steps that can be previewed before
+they are applied.
+"""
+import errno
+import os
+import shutil
+import stat
+import threading
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from moredots.utils import clone_file, copy_file, copy_tree, temp_path
+
+
+__all__ = ['Step', 'Plan']
+
+
+#: Default number of worker threads applying the steps
+WORKERS = 8
+
+#: Tuple describing a single change to the filesystem:
+#: - ``action`` is one of the constants below
+#: - ``path`` is the absolute path being changed
+#: - ``target`` is the destination of move/copy/backup, or the file
+#:   which the link points to (relative to the link's directory,
+#:   in case of relative symlinks; cached rendered file, in case of
+#:   ``RENDERED_LINK_TYPES``); ``None`` for other actions
+#: - ``link_type`` is one of ``LINK_TYPES`` for links; ``None`` otherwise
+#: - ``reason`` is human-readable explanation why the step is skipped
+Step = namedtuple('Step', ['action', 'path', 'target', 'link_type',
+                           'reason'])
+
+MKDIR = 'mkdir'    # create directory (along with its parents)
+RMDIR = 'rmdir'    # remove empty directory
+MOVE = 'move'      # rename file or directory to target
+COPY = 'copy'      # copy file or directory to target
+LINK = 'link'      # create link to target, replacing any file at path
+UNLINK = 'unlink'  # remove file or link
+BACKUP = 'backup'  # move file or directory out of the way, to target
+SKIP = 'skip'      # leave the path alone
+
+#: Actions whose steps also change the target path, not just their own
+TARGET_ACTIONS = (MOVE, COPY, BACKUP)
+
+#: Link types whose "links" are copies of files rendered from the repo
+#: (decrypted plaintexts, filled templates or contents of pointer files),
+#: rather than repo files
+RENDERED_LINK_TYPES = ('encrypted', 'template', 'external')
+
+
+class Plan(object):
+    """List of steps which, when applied, perform an operation
+    on dotfiles repository and its home directory.
+
+    Steps are planned against the current state of filesystem,
+    as changed by steps that were planned before them. To that end,
+    :class:`Plan` offers ``os.path``-like methods (e.g. :meth:`lexists`)
+    which take planned steps into account.
+
+    When applied, steps which don't touch each other's paths are run
+    concurrently, while the others are run in the order they were planned.
+    Every step can be applied again after it's been (partially) applied,
+    so that plans interrupted by a crash can be resumed.
+    """
+    def __init__(self):
+        self.steps = []
+        self._state = {}  # path -> kind of file there after planned steps
+
+    def add(self, action, path, target=None, link_type=None, reason=None):
+        """Adds a step to the plan.
+        :return: Added :class:`Step`
+        """
+        step = Step(action=action, path=os.path.normpath(path),
+                    target=target and os.path.normpath(target),
+                    link_type=link_type, reason=reason)
+
+        if action == MKDIR:
+            self._state[step.path] = stat.S_IFDIR
+        elif action in (RMDIR, UNLINK):
+            self._state[step.path] = None
+        elif action in (MOVE, BACKUP):
+            self._state[step.target] = self._kind(step.path)
+            self._state[step.path] = None
+        elif action == COPY:
+            self._state[step.target] = self._kind(step.path)
+        elif action == LINK:
+            self._state[step.path] = stat.S_IFLNK \
+                if link_type in (None, 'symlink') else stat.S_IFREG
+
+        self.steps.append(step)
+        return step
+
+    def apply(self, workers=WORKERS, journal=None):
+        """Applies all the steps of the plan.
+
+        :param workers: Number of worker threads to use
+        :param journal: Optional :class:`Journal` to record the steps in,
+                        so that the plan can be resumed if it's interrupted
+        """
+        steps = [step for step in self.steps if step.action != SKIP]
+        if not steps:
+            return
+
+        if journal is None:
+            apply = lambda i: apply_step(steps[i])
+        else:
+            journal.start(steps)
+            lock = threading.Lock()
+
+            def apply(i):
+                apply_step(steps[i])
+                with lock:
+                    journal.done(i)
+
+        waves = _waves(steps)
+        pool = ThreadPool(workers) if max(map(len, waves)) > 1 else None
+        try:
+            for wave in waves:
+                if pool is not None and len(wave) > 1:
+                    pool.map(apply, wave)
+                else:
+                    for i in wave:
+                        apply(i)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if journal is not None:
+            journal.finish()
+
+    def format(self):
+        """Textual representation of the plan, one step per line."""
+        return "\n".join(map(format_step, self.steps))
+
+    # Querying planned state of filesystem
+
+    def lexists(self, path):
+        """Whether path will exist (as anything, including broken link)."""
+        return self._kind(path) is not None
+
+    def islink(self, path):
+        """Whether path will be a symbolic link."""
+        return self._kind(path) == stat.S_IFLNK
+
+    def isdir(self, path):
+        """Whether path will be a real directory (not a link to one)."""
+        return self._kind(path) == stat.S_IFDIR
+
+    def isfile(self, path):
+        """Whether path will be a regular file (not a link to one)."""
+        return self._kind(path) == stat.S_IFREG
+
+    def listdir(self, path):
+        """Names of entries that will exist in given directory."""
+        path = os.path.normpath(path)
+        names = set()
+        if path not in self._state and self._kind(path) == stat.S_IFDIR:
+            names.update(os.listdir(path))
+        names.update(os.path.basename(p) for p in self._state
+                     if os.path.dirname(p) == path)
+        return sorted(name for name in names
+                      if self.lexists(os.path.join(path, name)))
+
+    def _kind(self, path):
+        """File type (``stat.S_IF*`` constant) that will be found
+        at given path, or ``None`` if nothing will be there.
+        """
+        path = os.path.normpath(path)
+        if path in self._state:
+            return self._state[path]
+
+        # contents of directories that were created, removed or replaced
+        # by the plan are only what the plan has put there
+        parent = os.path.dirname(path)
+        while parent != os.path.dirname(parent):
+            if parent in self._state:
+                return None
+            parent = os.path.dirname(parent)
+
+        try:
+            return stat.S_IFMT(os.lstat(path).st_mode)
+        except OSError:
+            return None
+
+    # Python special methods
+
+    def __len__(self):
+        """Length of :class:`Plan` equals number of its steps."""
+        return len(self.steps)
+
+    def __iter__(self):
+        """Iterating over :class:`Plan` yields its steps."""
+        return iter(self.steps)
+
+    def __nonzero__(self):
+        """Plan is truthy if it changes anything."""
+        return any(step.action != SKIP for step in self.steps)
+    __bool__ = __nonzero__  # for Python 3.x
+
+
+def apply_step(step):
+    """Perform the change to filesystem described by given step.
+
+    Steps which have already been applied (e.g. before a crash)
+    are either no-ops or get simply applied again.
+    """
+    if step.action == MKDIR:
+        if not os.path.isdir(step.path):
+            os.makedirs(step.path)
+    elif step.action == RMDIR:
+        if os.path.isdir(step.path):
+            os.rmdir(step.path)
+    elif step.action in (MOVE, BACKUP):
+        if not os.path.lexists(step.path) and os.path.lexists(step.target):
+            return  # already moved
+        if step.action == BACKUP:
+            _move_aside(step.path, step.target)
+        else:
+            os.rename(step.path, step.target)
+    elif step.action == COPY:
+        if os.path.isdir(step.path):
+            if os.path.isdir(step.target):
+                shutil.rmtree(step.target)  # partial copy
+            copy_tree(step.path, step.target)
+        else:
+            copy_file(step.path, step.target)
+    elif step.action == LINK:
+        # link is created under temporary name and renamed over the path,
+        # so that any file that's already there is replaced atomically
+        temp_link_path = temp_path(step.path)
+        if os.path.lexists(temp_link_path):
+            os.unlink(temp_link_path)  # left over by interrupted step
+        if step.link_type == 'hardlink':
+            os.link(step.target, temp_link_path)
+        elif step.link_type == 'reflink':
+            clone_file(step.target, temp_link_path)
+        elif step.link_type in RENDERED_LINK_TYPES:
+            copy_file(step.target, temp_link_path)
+        else:
+            os.symlink(step.target, temp_link_path)
+        os.rename(temp_link_path, step.path)
+    elif step.action == UNLINK:
+        if os.path.isdir(step.path) and not os.path.islink(step.path):
+            shutil.rmtree(step.path)
+        elif os.path.lexists(step.path):
+            os.unlink(step.path)
+
+
+def format_step(step):
+    """Textual representation of a single step."""
+    text = "%-6s %s" % (step.action, step.path)
+    if step.target is not None:
+        text += " -> %s" % step.target
+    if step.link_type not in (None, 'symlink'):
+        text += " (%s)" % step.link_type
+    if step.reason:
+        text += " (%s)" % step.reason
+    return text
+
+
+def _waves(steps):
+    """Split steps into waves which can be applied one after another,
+    with all steps of a single wave applied concurrently.
+
+    A step has to wait for all earlier steps which change the same path,
+    any of its parent directories, or anything inside it. Links
+    also wait for changes to their targets, but many links to the same
+    target can be created at once.
+    """
+    own_wave = {}      # path -> last wave of steps with that path
+    subtree_wave = {}  # path -> last wave of steps at or below it
+    waves = []
+
+    for i, step in enumerate(steps):
+        paths = [step.path]
+        if step.action in TARGET_ACTIONS:
+            paths.append(step.target)
+        read_paths = [os.path.join(os.path.dirname(step.path), step.target)]\
+            if step.action == LINK else []
+
+        wave = 0
+        for path in paths + read_paths:
+            wave = max(wave, subtree_wave.get(path, -1) + 1)
+            for parent in _parents(path):
+                wave = max(wave, own_wave.get(parent, -1) + 1)
+
+        for path in paths:
+            own_wave[path] = max(own_wave.get(path, -1), wave)
+            for p in [path] + _parents(path):
+                subtree_wave[p] = max(subtree_wave.get(p, -1), wave)
+
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(i)
+
+    return waves
+
+
+def _move_aside(path, target):
+    """Move file or directory to given path, creating its parent
+    directories and falling back to copying if it's on another filesystem.
+
+    Existing file at target path is never replaced, except for a partial
+    copy left behind by interrupted move across filesystems.
+    """
+    target_dir = os.path.dirname(target)
+    if not os.path.isdir(target_dir):
+        os.makedirs(target_dir)
+    if os.path.lexists(target) and \
+            os.stat(target_dir).st_dev == os.lstat(path).st_dev:
+        raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), target)
+    try:
+        os.rename(path, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        if os.path.isdir(path) and not os.path.islink(path):
+            if os.path.isdir(target):
+                shutil.rmtree(target)  # partial copy
+            copy_tree(path, target)
+            shutil.rmtree(path)
+        else:
+            copy_file(path, target)
+            os.unlink(path)
+
+
+def _parents(path):
+    """List of all parent directories of given path."""
+    parents = []
+    parent = os.path.dirname(path)
+    while parent != os.path.dirname(parent):
+        parents.append(parent)
+        parent = os.path.dirname(parent)
+    return parents
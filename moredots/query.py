@@ -0,0 +1,83 @@
+"""
+Module for querying the inventory of dotfile repository.
+"""
+import os
+from collections import namedtuple
+from fnmatch import fnmatchcase
+
+
+__all__ = ['Listing', 'query']
+
+
+#: Characters which make a path pattern into a glob
+GLOB_CHARS = '*?['
+
+#: Tuple describing a dotfile tracked by the repository:
+#: - ``path`` is the relative path to dotfile (with dot)
+#: - ``link_type`` is how it's linked from $HOME (one of ``LINK_TYPES``)
+#: - ``tags`` is the list of profiles it belongs to (empty for all)
+#: - ``folded`` tells whether it's a dot-directory linked as a whole
+#: - ``mtime`` is the modification time of dotfile in the repository,
+#:   or ``None`` if it's not there (e.g. due to sparse checkout)
+Listing = namedtuple('Listing', ['path', 'link_type', 'tags', 'folded',
+                                 'mtime'])
+
+
+def query(repo, pattern=None, link_type=None, tag=None, profile=None,
+          modified_since=None):
+    """Finds dotfiles in the repository's inventory which match
+    all given criteria.
+
+    Dotfiles are yielded one by one, in order of their paths, so that
+    even huge inventories can be listed without holding all the results.
+
+    :param repo: :class:`DotfileRepo` object
+    :param pattern: Prefix of dotfile paths or, if it contains wildcards,
+                    a shell-style pattern (where ``*`` also matches ``/``)
+    :param link_type: One of ``LINK_TYPES``
+    :param tag: Profile which dotfiles have to be explicitly tagged with
+    :param profile: Profile which dotfiles have to be installed for
+                    (including the untagged ones)
+    :param modified_since: Timestamp which dotfiles have to be modified after
+    :return: Iterable of :class:`Listing` tuples
+    """
+    prefix, glob = _split_pattern(pattern or '')
+
+    # only the literal part of glob is looked up in inventory,
+    # so that it can be narrowed down without scanning all the entries
+    for entry in repo.inventory.with_prefix(prefix):
+        if glob and not fnmatchcase(entry.path, glob):
+            continue
+        if link_type is not None and entry.link_type != link_type:
+            continue
+        tags = entry.tag_list
+        if tag is not None and tag not in tags:
+            continue
+        if profile is not None and not entry.in_profile(profile):
+            continue
+
+        mtime = _mtime(repo.dotfile(entry.path).repo_path)
+        if modified_since is not None and \
+                (mtime is None or mtime < modified_since):
+            continue
+
+        yield Listing(path=entry.path, link_type=entry.link_type, tags=tags,
+                      folded=bool(entry.get('fold')), mtime=mtime)
+
+
+def _split_pattern(pattern):
+    """Split path pattern into literal prefix and glob.
+    :return: Tuple of prefix and glob (``None`` if pattern has no wildcards)
+    """
+    for i, char in enumerate(pattern):
+        if char in GLOB_CHARS:
+            return pattern[:i], pattern
+    return pattern, None
+
+
+def _mtime(path):
+    """Modification time of given file, or ``None`` if it doesn't exist."""
+    try:
+        return os.lstat(path).st_mtime
+    except OSError:
+        return None
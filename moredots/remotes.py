@@ -0,0 +1,76 @@
+"""
+Module handling the remotes which dotfile repository is synced with.
+"""
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+
+__all__ = ['Remote', 'PushResult', 'ROLES', 'pulls', 'pushes', 'push_all']
+
+
+#: Roles of remotes: ``pull`` remotes are pulled from during sync,
+#: ``push`` ones are pushed to, and ``both`` are pulled from and pushed to
+ROLES = ('pull', 'push', 'both')
+
+#: Option in remote's section of Git config holding its role
+ROLE_OPTION = 'mdotsrole'
+
+#: Remote which is used in both roles even if it has no role set
+DEFAULT_REMOTE = 'origin'
+
+#: Tuple describing a remote of dotfile repository
+Remote = namedtuple('Remote', ['name', 'url', 'role'])
+
+#: Tuple with the outcome of pushing to a remote:
+#: - ``remote`` is the name of remote
+#: - ``ok`` tells whether push succeeded
+#: - ``seconds`` is how long it took
+#: - ``error`` is the error message from Git, if the push failed
+PushResult = namedtuple('PushResult', ['remote', 'ok', 'seconds', 'error'])
+
+
+def pulls(remote):
+    """Whether the remote is pulled from during sync."""
+    return remote.role in ('pull', 'both')
+
+
+def pushes(remote):
+    """Whether the remote is pushed to during sync."""
+    return remote.role in ('push', 'both')
+
+
+def push_all(repo_dir, remotes, branch):
+    """Pushes branch to all given remotes at the same time.
+
+    Each push is a separate ``git push`` process, so a slow or unreachable
+    remote doesn't hold back the others, and failure of one push
+    doesn't stop the rest.
+
+    :param repo_dir: Directory of the Git repository
+    :param remotes: Iterable of :class:`Remote` tuples
+    :param branch: Name of the branch to push
+    :return: List of :class:`PushResult` tuples, in order of ``remotes``
+    """
+    remotes = list(remotes)
+    results = [None] * len(remotes)
+
+    def push(i, remote):
+        start = time.time()
+        process = subprocess.Popen(
+            ['git', 'push', '--porcelain', remote.name, branch],
+            cwd=repo_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, stderr = process.communicate()
+        ok = process.returncode == 0
+        results[i] = PushResult(remote=remote.name, ok=ok,
+                                seconds=time.time() - start,
+                                error=None if ok else stderr.strip())
+
+    threads = [threading.Thread(target=push, args=(i, remote))
+               for i, remote in enumerate(remotes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
@@ -2,14 +2,35 @@
 Module containing the :class:`DotfileRepo` class.
 """
 import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
 from collections import namedtuple
+from pipes import quote
 
 import git
 
-from moredots import exc
-from moredots.inventory import Inventory
+import moredots
+from moredots import bundle, exc
+from moredots.encryption import DecryptionCache
+from moredots.ignore import IgnoreRules, IGNORE_FILE
+from moredots.index import ReverseIndex
+from moredots.inventory import Inventory, INVENTORY_FILE
+from moredots.journal import Journal, JOURNAL_FILE
+from moredots.lock import RepoLock, locked
+from moredots.maintenance import Maintenance
+from moredots.merge import DRIVER_NAME
+from moredots.remotes import (Remote, ROLES, ROLE_OPTION, DEFAULT_REMOTE,
+                              pulls, pushes, push_all)
+from moredots.store import ObjectStore, read_pointer, write_pointer
+from moredots.template import TemplateCache
+from moredots.plan import (Plan, MKDIR, RMDIR, MOVE, COPY, LINK, UNLINK,
+                           BACKUP, SKIP, RENDERED_LINK_TYPES)
 from moredots.utils import (objectproperty, normalize_path,
-                            remove_dot, restore_dot)
+                            remove_dot, restore_dot, clone_file, copy_file,
+                            same_content, temp_path, iter_symlinks)
 
 
 __all__ = ['DotfileRepo']
@@ -24,6 +45,23 @@ Dotfile = namedtuple('Dotfile', ['path', 'home_path', 'repo_path'])
 
 HOME_FILE = 'mdots_home'
 
+#: Directory inside .git where files displaced from $HOME are moved
+BACKUP_DIR = 'mdots_backup'
+
+#: Section of repo's Git config holding moredots settings
+CONFIG_SECTION = 'moredots'
+
+#: Ways in which a dotfile in $HOME can be linked to its copy in the repo
+LINK_TYPES = ('symlink', 'hardlink', 'reflink', 'encrypted', 'template',
+              'external')
+
+#: Prefix of messages of commits made by moredots
+COMMIT_PREFIX = '[moredots] '
+
+#: Parts of Git error messages telling why pulling from remote has failed
+EMPTY_REMOTE_ERROR = "couldn't find remote ref"
+UNRELATED_HISTORIES_ERROR = "refusing to merge unrelated histories"
+
 DEFAULT_REPO_DIR = os.path.expanduser('~/dotfiles')
 DEFAULT_HOME_DIR = os.path.expanduser('~/')
 
@@ -45,6 +83,16 @@ class DotfileRepo(object):
 
         self.git_repo = repo
         self.inventory = Inventory(self)
+        self.reverse_index = ReverseIndex(self)
+        self.journal = Journal(self)
+        self.lock = RepoLock(self, on_acquire=self._start_operation)
+        self.decryption_cache = DecryptionCache(self)
+        self.template_cache = TemplateCache(self)
+        self.object_store = ObjectStore(self)
+        self.maintenance = Maintenance(self)
+        self.ignore_rules = IgnoreRules.load(os.path.join(self.dir,
+                                                          IGNORE_FILE))
+        self._backup_dir = None
 
     def __repr__(self):
         """Textual representation of repo object."""
@@ -65,120 +113,741 @@ class DotfileRepo(object):
 
         repo = cls(git.Repo.init(repo_dir, mkdir=True))
         repo.home_dir = home_dir
+        repo._register_merge_driver()
         return repo
 
     @classmethod
-    def install(cls, url, repo_dir=DEFAULT_REPO_DIR, home_dir=DEFAULT_HOME_DIR):
+    def install(cls, url, repo_dir=DEFAULT_REPO_DIR, home_dir=DEFAULT_HOME_DIR,
+                profile=None):
         """Installs remote dotfile repository on this machine.
 
         :param url: URL to the remote repository which will be git-clone'd.
         :param repo_dir: Directory for the repo. If it exists, it must be empty.
         :param home_dir: Driectory to be considered $HOME for the new repo.
+        :param profile: Optional name of the profile to install.
+                        If provided, the repo will use Git sparse checkout,
+                        so that only dotfiles belonging to the profile
+                        are present on disk.
+
+        If previous installation into the same directory was interrupted
+        while linking the dotfiles, it is resumed instead.
         """
+        journal_file = os.path.join(repo_dir, '.git', JOURNAL_FILE)
+        if os.path.exists(journal_file):
+            repo = cls(repo_dir)
+            repo._install_dotfiles()
+            return repo
+
         cls._check_dirs(repo_dir, home_dir)
 
-        repo = cls(git.Repo.clone_from(url, repo_dir))
-        repo.home_dir = home_dir
+        if profile is None:
+            repo = cls(git.Repo.clone_from(url, repo_dir))
+            repo.home_dir = home_dir
+        else:
+            repo = cls(git.Repo.clone_from(url, repo_dir, no_checkout=True))
+            repo.home_dir = home_dir
+            repo.profile = profile
+
+            # inventory has to be checked out first,
+            # so that we know which paths belong to the profile
+            repo._set_sparse_checkout(())
+            if repo.git_repo.head.is_valid():
+                repo.git_repo.git.checkout(repo.git_repo.head.ref.name)
+            repo.inventory.load()
+            repo._update_sparse_checkout()
+
+        repo._register_merge_driver()
         repo._install_dotfiles()
 
         return repo
 
-    def add(self, path, hardlink=False):
+    @classmethod
+    def install_bundle(cls, path, repo_dir=DEFAULT_REPO_DIR,
+                       home_dir=DEFAULT_HOME_DIR, profile=None, url=None):
+        """Installs dotfile repository from a bundle file
+        (see :func:`moredots.bundle.create`), without network access.
+
+        :param path: Path to the bundle file
+        :param url: Optional URL of the remote repository to use as origin
+                    for subsequent syncs. By default, it's the origin
+                    of the repository the bundle has been created from.
+
+        For description of other parameters, see :meth:`install`.
+        """
+        cls._check_dirs(repo_dir, home_dir)
+
+        temp_dir = tempfile.mkdtemp(prefix='mdots-bundle-')
+        try:
+            manifest, bundle_file = bundle.extract(path, temp_dir)
+            repo = cls.install(bundle_file, repo_dir, home_dir,
+                               profile=profile)
+        finally:
+            shutil.rmtree(temp_dir)
+
+        # point origin at the real remote, keeping the remote branch
+        # from bundle so that the next sync only needs to fetch new commits
+        url = url or manifest['remote']
+        if url:
+            repo.git_repo.git.remote('set-url', 'origin', url)
+        else:
+            repo.git_repo.delete_remote('origin')
+
+        return repo
+
+    @locked
+    def add(self, path, hardlink=False, reflink=False, encrypt=False,
+            template=False, tags=None, dry_run=False):
         """Moves the dotfile from specified filepath into the dotfile repository.
 
         :param path: Path to the source dotfile. It will be replaced with
                      a (sym)link to the file in repo
         :param hardlink: Whether the file should be hardlinked
                          instead of symlinked. ``False`` by default.
+        :param reflink: Whether the file should be replaced with
+                        a copy-on-write clone instead of symlink.
+                        ``False`` by default.
+        :param encrypt: Whether the file should be stored in the repo
+                        only in encrypted form, while $HOME keeps
+                        its plaintext. ``False`` by default.
+        :param template: Whether the file is a template, which $HOME
+                         should hold rendered version of.
+                         ``False`` by default.
+        :param tags: Optional list of tags, i.e. names of profiles
+                     the dotfile should be installed for.
+                     By default, it will be installed for all of them.
+        :param dry_run: If ``True``, nothing will be changed,
+                        only the plan of changes returned.
+        :return: :class:`Plan` of changes to the filesystem
+
+        If the path points to a dot-directory, it is added as a *folded* one:
+        the whole directory is moved to the repo and replaced with
+        a single symlink, regardless of how many files it contains.
+
+        If $HOME and the repo are on different filesystems, the dotfile
+        is copied to the repo instead of being moved, and then replaced
+        with a link.
+
+        Files larger than ``moredots.externalthreshold`` (from Git config)
+        which would be symlinked are kept in the :class:`ObjectStore`
+        instead, with only a pointer to them committed to the repo.
 
         :raise: ``exc.DuplicateDotfileError`` if the file already exists
+        :raise: ``exc.IgnoredDotfileError`` if the file matches patterns
+                in repo's .mdotsignore
+        :raise: ``exc.CrossDeviceLinkError`` if hardlink was requested
+                but the file is on a different filesystem than the repo
+        :raise: ``exc.EncryptionError`` if encryption was requested
+                but the file couldn't be encrypted
+        :raise: ``exc.TemplateError`` if file is a template which uses
+                undefined variables
         """
-        dotfile = self._dotfile(path)
+        dotfile = self.dotfile(path)
         if not os.path.exists(dotfile.home_path):
             raise exc.DotfileNotFoundError(dotfile.path, repo=self)
-        if os.path.exists(dotfile.repo_path):
+        if os.path.exists(dotfile.repo_path) or dotfile.path in self.inventory:
             raise exc.DuplicateDotfileError(dotfile.path, repo=self)
+        if self.ignore_rules.match(dotfile.path,
+                                   is_dir=os.path.isdir(dotfile.home_path)):
+            raise exc.IgnoredDotfileError(dotfile.path, repo=self)
+
+        if hardlink + reflink + encrypt + template > 1:
+            raise ValueError("dotfile can only be linked in a single way")
+
+        fold = os.path.isdir(dotfile.home_path)
+        if fold and (hardlink or reflink or encrypt or template):
+            raise exc.InvalidLinkTypeError(dotfile.path, repo=self)
+
+        external = not (fold or hardlink or reflink or encrypt or template) \
+            and os.path.isfile(dotfile.home_path) \
+            and not os.path.islink(dotfile.home_path) \
+            and os.path.getsize(dotfile.home_path) >= \
+            self.object_store.threshold
+
+        same_filesystem = self._same_filesystem(dotfile)
+        if hardlink and not same_filesystem:
+            raise exc.CrossDeviceLinkError(dotfile.path, repo=self)
+
+        plan = Plan()
 
         # ensure all leading directories (if any) exist in the repository
         if os.path.sep in dotfile.path:
             dotdir_path, _ = os.path.split(dotfile.repo_path)
-            os.makedirs(dotdir_path)
+            if not plan.isdir(dotdir_path):
+                plan.add(MKDIR, dotdir_path)
 
         # perform replacement, producing (sym)link in place of actual file
-        link_func = os.link if hardlink else os.symlink
-        os.rename(dotfile.home_path, dotfile.repo_path)
-        link_func(dotfile.repo_path, dotfile.home_path)  # order like shell `ln`
-
+        link_type = 'hardlink' if hardlink else \
+            'reflink' if reflink else 'symlink'
+        if encrypt:
+            # ciphertext is written to repo outside of the plan,
+            # as it's produced by external filter command
+            plan.add(SKIP, dotfile.home_path, reason="encrypted into repo")
+        elif external:
+            # pointer is written to repo outside of the plan,
+            # once the file has been put into the store
+            plan.add(SKIP, dotfile.home_path, reason="kept in object store")
+        elif template:
+            # file in $HOME becomes the template, so it can be rendered
+            # before it's even copied to the repo
+            rendered = self.template_cache.render(dotfile,
+                                                  source=dotfile.home_path)
+            plan.add(COPY, dotfile.home_path, dotfile.repo_path)
+            plan.add(LINK, dotfile.home_path, rendered, 'template')
+        elif same_filesystem:
+            plan.add(MOVE, dotfile.home_path, dotfile.repo_path)
+            self._plan_link(plan, dotfile, link_type)
+        else:
+            self._plan_copy_and_link(plan, dotfile, link_type)
+
+        if dry_run:
+            return plan
+        plan.apply()
+        if encrypt:
+            self.decryption_cache.encrypt(dotfile)
+        if external:
+            write_pointer(dotfile.repo_path,
+                          *self.object_store.put(dotfile.home_path))
+
+        flags = dict(hardlink=hardlink)
+        if fold:
+            flags['fold'] = True
+        if reflink:
+            flags['reflink'] = True
+        if encrypt:
+            flags['encrypt'] = True
+        if template:
+            flags['template'] = True
+        if external:
+            flags['external'] = True
+        if tags:
+            flags['tags'] = ','.join(tags)
         with self.inventory as inv:
-            inv.add(dotfile.path, hardlink=hardlink)
-
-        self._commit("add %s" % dotfile.path, add=dotfile.repo_path)
-
-    def remove(self, path):
+            inv.add(dotfile.path, **flags)
+        with self.reverse_index as idx:
+            idx.update(dotfile)
+
+        # files ignored inside folded directories still live in the repo,
+        # but they aren't committed; inventory always is, even if
+        # the folded directory has no files to commit
+        self.commit("add %s" % dotfile.path,
+                    add=[INVENTORY_FILE] + (list(self.walk_files(dotfile))
+                                            if fold else [dotfile.repo_path]))
+
+        # keep the new dotfile on disk even if it's outside the profile,
+        # until the sparse checkout is updated on next sync or switch
+        if self.is_sparse:
+            self.git_repo.git.sparse_checkout('add', _sparse_pattern(
+                os.path.relpath(dotfile.repo_path, start=self.dir)))
+
+        return plan
+
+    @locked
+    def remove(self, path, dry_run=False):
         """Removes dotfile from the dotfile repository.
 
         :param path: Path to the dotfile inside the repo (either absolute
                      or relative to the repo's working directory)
+        :param dry_run: If ``True``, nothing will be changed,
+                        only the plan of changes returned.
+        :return: :class:`Plan` of changes to the filesystem
+
+        Removing a file from inside of a folded dot-directory unfolds
+        the directory in $HOME first, so that it can hold both the tracked
+        files (as individual links) and the removed one.
 
         :raise: ``exc.DotfileNotFoundError`` if dotfile is not in the repo
         """
-        dotfile = self._dotfile(path)
+        dotfile = self.dotfile(path)
         if not os.path.exists(dotfile.repo_path):
             raise exc.DotfileNotFoundError(dotfile.path, repo=self)
 
+        plan = Plan()
+
+        folded_parent = self.inventory.folded_parent(dotfile.path)
+        if folded_parent:
+            self._plan_unfold_to(plan, dotfile,
+                                 self.dotfile(folded_parent.path))
+
         # restore the dotfile back into $HOME directory
-        if os.path.exists(dotfile.home_path):
-            os.unlink(dotfile.home_path)  # TODO: also check if it's symlink
-                                          # when symlink is expected
-        os.rename(dotfile.repo_path, dotfile.home_path)
+        self._plan_restore(plan, dotfile)
 
-        with self.inventory as inv:
-            inv.remove(dotfile.path)
+        if dry_run:
+            return plan
+        plan.apply()
 
-        self._commit("remove %s" % dotfile.path, remove=dotfile.repo_path)
+        if dotfile.path in self.inventory:
+            with self.inventory as inv:
+                inv.remove(dotfile.path)
+        with self.reverse_index as idx:
+            idx.discard(dotfile)
 
+        self.commit("remove %s" % dotfile.path, remove=dotfile.repo_path)
+        return plan
+
+    @locked
     def sync(self, url=None):
-        """Synchronizes dotfiles repository with a remote one.
+        """Synchronizes dotfiles repository with its remotes.
 
         URL will be set as 'origin' remote for the moredots Git repository.
         In case origin already exists, it will be replaced with one
         pointing to given URL.
+
+        Changes are first pulled from all remotes with ``pull`` role
+        (in order of their names, origin first), and then pushed to all
+        remotes with ``push`` role at the same time. Failure of a push
+        doesn't prevent the others; it's only reported in results.
+
+        Inventory is merged entry by entry (see :mod:`moredots.merge`),
+        so dotfiles added on different machines don't conflict.
+
+        Before pushing, moredots commits which haven't been pushed yet
+        may be folded into one (see ``moredots.coalescewindow`` option).
+
+        :return: List of :class:`PushResult` tuples, one for every remote
+                 which has been pushed to
+        :raise: ``exc.MergeConflictError`` if pulled changes conflict
+                with local ones, ``exc.UnrelatedRemoteError`` if remote
+                has unrelated history, or ``exc.PullError`` if pulling
+                fails for other reason (e.g. remote is unreachable)
         """
-        existing_origin = getattr(self.git_repo.remotes, 'origin', None)
-        if not (existing_origin or url):
+        if url:
+            self.add_remote(DEFAULT_REMOTE, url)
+        remotes = self.remotes
+        if not remotes:
             raise exc.NoRemoteError(repo=self)
+        self._resume()
+        self._register_merge_driver()  # for repos which predate it
 
-        if url and existing_origin:
-            self.git_repo.delete_remote('origin')
-            existing_origin = None
-
-        origin = existing_origin or self.git_repo.create_remote('origin', url)
+        # bring local changes of dotfiles that aren't links back into the repo
+        changed = self.repair_hardlinks() + self.collect_changes()
+        if changed:
+            self.commit("update %s" % ", ".join(df.path for df in changed),
+                        add=[df.repo_path for df in changed])
+        self._coalesce_commits()
 
         # TODO: implement git.RemoteProgress subclass
         # to track progress of long running git operations
         master = self.git_repo.head.ref.name
-        try:
-            origin.pull(master)  # TODO: merging?...
-            was_empty = False
-        except git.GitCommandError:
-            was_empty = True  # remote has nothing yet, so we just push
-        origin.push(master)
-
-        if was_empty:
-            return
-
-        # check if we actually pulled something for the specified remote
-        origin_refs = list(git.refs.remote.RemoteReference.iter_items(
-            self.git_repo, remote=origin))
-        if not origin_refs:
-            raise exc.UnrelatedRemoteError(repo=self, remote=origin)
+        old_head = self.git_repo.head.commit.hexsha \
+            if self.git_repo.head.is_valid() else None
+        # merge commits are made with the same identity as moredots commits,
+        # so that pulling doesn't fail on machines without one configured
+        identity = self._identity()
+
+        pulled = []
+        for remote in filter(pulls, remotes):
+            git_remote = self.git_repo.remote(remote.name)
+            try:
+                with self.git_repo.git.custom_environment(**identity):
+                    git_remote.pull(master, no_rebase=True)
+            except git.GitCommandError as e:
+                stderr = str(e.stderr)
+                if EMPTY_REMOTE_ERROR in stderr:
+                    continue  # remote has nothing yet, so we just push
+                if os.path.exists(os.path.join(self.git_repo.git_dir,
+                                               'MERGE_HEAD')):
+                    raise exc.MergeConflictError(repo=self,
+                                                 remote=remote.name)
+                if UNRELATED_HISTORIES_ERROR in stderr:
+                    raise exc.UnrelatedRemoteError(repo=self,
+                                                   remote=remote.name)
+                raise exc.PullError(repo=self, remote=remote.name,
+                                    error=_last_line(stderr))
+            pulled.append(git_remote)
+        self._push_objects()
+        results = push_all(self.dir, filter(pushes, remotes), master)
+
+        if not pulled:
+            return results
+
+        # check if we actually pulled something for the specified remotes
+        for git_remote in pulled:
+            remote_refs = list(git.refs.remote.RemoteReference.iter_items(
+                self.git_repo, remote=git_remote))
+            if not remote_refs:
+                raise exc.UnrelatedRemoteError(repo=self, remote=git_remote)
 
         # set up remote branch tracking for subsequent `mdots sync`
-        self.git_repo.head.ref.set_tracking_branch(origin.refs.master)
+        self.git_repo.head.ref.set_tracking_branch(pulled[0].refs.master)
 
         self.inventory.load()
+        if self.is_sparse:
+            self._update_sparse_checkout()
         self._install_dotfiles()
 
+        # remove links to dotfiles that have been deleted by the pull
+        if old_head:
+            deleted = self.git_repo.git.diff(
+                old_head, 'HEAD', name_only=True, diff_filter='D')
+            self._remove_orphans(
+                self.dotfile(os.path.join(self.dir, path)).home_path
+                for path in deleted.splitlines())
+        return results
+
+    def add_remote(self, name, url, role='both'):
+        """Adds remote to sync the repository with,
+        or changes URL and role of an existing one.
+
+        Remote whose URL changes is replaced with a new one, since its
+        remote-tracking branches refer to a different repository.
+
+        :param role: One of ``ROLES``
+        """
+        if role not in ROLES:
+            raise ValueError("invalid remote role: %r" % (role,))
+
+        existing = getattr(self.git_repo.remotes, name, None)
+        if existing is not None and existing.url != url:
+            self.git_repo.delete_remote(name)
+            existing = None
+        if existing is None:
+            self.git_repo.create_remote(name, url)
+
+        writer = self.git_repo.config_writer()
+        try:
+            writer.set_value('remote "%s"' % name, ROLE_OPTION, role)
+        finally:
+            writer.release()
+
+    def remove_remote(self, name):
+        """Removes remote, so that the repository is no longer synced with it.
+        :raise: ``exc.UnknownRemoteError`` if there is no such remote
+        """
+        if getattr(self.git_repo.remotes, name, None) is None:
+            raise exc.UnknownRemoteError(repo=self, remote=name)
+        self.git_repo.delete_remote(name)
+
+    @property
+    def remotes(self):
+        """Remotes that the repository is synced with, origin first.
+
+        Git remotes without a role are ignored by moredots,
+        except for origin which is used in both roles.
+
+        :return: List of :class:`Remote` tuples
+        """
+        reader = self.git_repo.config_reader()
+        remotes = []
+        for git_remote in self.git_repo.remotes:
+            section = 'remote "%s"' % git_remote.name
+            role = (reader.get_value(section, ROLE_OPTION)
+                    if reader.has_option(section, ROLE_OPTION) else
+                    'both' if git_remote.name == DEFAULT_REMOTE else None)
+            if role in ROLES:
+                remotes.append(Remote(name=git_remote.name,
+                                      url=git_remote.url, role=role))
+        return sorted(remotes, key=lambda r: (r.name != DEFAULT_REMOTE,
+                                              r.name))
+
+    @locked
+    def switch(self, profile, dry_run=False):
+        """Switches the repository to different profile,
+        installing and uninstalling dotfiles as necessary.
+
+        Only the dotfiles which differ between current and new profile
+        are touched, so switching is quick even for large repositories.
+
+        :param profile: Name of the profile, or ``None`` for all dotfiles
+        :param dry_run: If ``True``, nothing will be changed,
+                        only the dotfiles to (un)install returned.
+        :return: Tuple of lists of paths to dotfiles which were,
+                 respectively, uninstalled and installed
+        """
+        current = self.inventory.profile_paths(self.profile)
+        target = self.inventory.profile_paths(profile)
+        uninstalled = sorted(current - target)
+        installed = sorted(target - current)
+        if dry_run:
+            return uninstalled, installed
+
+        self._resume()
+
+        plan = Plan()
+        for path in uninstalled:
+            dotfile = self.dotfile(path)
+            self._plan_uninstall(plan, dotfile)
+            self.reverse_index.discard(dotfile)
+        plan.apply(journal=self.journal)
+
+        # in sparse checkout, dotfiles of the new profile only appear
+        # in the repo now (paths are passed explicitly, since ``None``
+        # profile means all dotfiles here but current profile there)
+        if self.is_sparse:
+            self._set_sparse_checkout(self.dotfile(path).repo_path
+                                      for path in target)
+
+        plan = Plan()
+        for path in installed:
+            dotfile = self.dotfile(path)
+            if os.path.lexists(dotfile.repo_path):
+                self._plan_install(plan, dotfile, self.inventory[path])
+                self.reverse_index.update(dotfile)
+        plan.apply(journal=self.journal)
+
+        self.reverse_index.save()
+        self.profile = profile
+        return uninstalled, installed
+
+    @locked
+    def relocate(self, repo_dir=None, home_dir=None, relative=None):
+        """Moves the repository and/or changes its home directory,
+        rewriting the links in $HOME which no longer point to the repo.
+
+        Only the links that actually need it are rewritten, which,
+        for relative links, is none of them if the repo and home directory
+        have been moved together.
+
+        :param repo_dir: New directory for the repo. If it's the current
+                         directory (e.g. because the repo has been moved
+                         already), the repo isn't moved.
+        :param home_dir: New home directory for the repo
+        :param relative: Whether to switch to relative (``True``)
+                         or absolute (``False``) symlinks. By default,
+                         the current setting is kept.
+        :return: :class:`Plan` of changes to the links in $HOME
+
+        :raise: ``exc.RepositoryExistsError`` if new repo directory
+                is not empty
+        :raise: ``exc.InvalidHomeDirError`` if home directory is invalid
+        :raise: ``exc.CrossDeviceLinkError`` if hardlinked dotfiles
+                would end up on different filesystem than the repo
+        """
+        repo_dir = os.path.abspath(repo_dir or self.dir)
+        home_dir = os.path.abspath(home_dir or self.home_dir)
+        if not os.path.isdir(home_dir) or home_dir == repo_dir:
+            raise exc.InvalidHomeDirError(repo_dir, home_dir)
+
+        # hardlinks cannot span filesystems, so this has to be checked
+        # before anything is moved (and the links broken by copying)
+        repo_device = _device(repo_dir)
+        for entry in self.inventory:
+            if entry.link_type != 'hardlink':
+                continue
+            home_path = os.path.join(home_dir, entry.path)
+            if _device(home_path) != repo_device:
+                raise exc.CrossDeviceLinkError(home_path, repo=self)
+
+        if repo_dir != os.path.abspath(self.dir):
+            if os.path.isdir(repo_dir):
+                if os.listdir(repo_dir):
+                    raise exc.RepositoryExistsError(repo_dir)
+                os.rmdir(repo_dir)
+            shutil.move(self.dir, repo_dir)
+            self.git_repo = git.Repo(repo_dir, odbt=git.GitCmdObjectDB)
+
+        if home_dir != os.path.abspath(self.home_dir):
+            self.home_dir = home_dir
+        if relative is not None:
+            self.relative_links = relative
+
+        return self._install_dotfiles()
+
+    @locked
+    def collect_changes(self):
+        """Copies changes made to reflinked dotfiles in $HOME
+        back into the repository, encrypts changed plaintexts
+        of encrypted dotfiles into it, and puts changed dotfiles
+        kept in the object store there.
+
+        Files are compared using their size and modification time first,
+        so that only the ones which may have changed need to be hashed.
+
+        :return: List of :class:`Dotfile` objects that were updated
+        """
+        changed = []
+        for entry in self.inventory:
+            if entry.link_type not in ('reflink', 'encrypted', 'external'):
+                continue
+
+            dotfile = self.dotfile(entry.path)
+            if not (os.path.isfile(dotfile.home_path)
+                    and os.path.isfile(dotfile.repo_path)):
+                continue
+
+            if entry.link_type == 'encrypted':
+                plaintext = self.decryption_cache.render(dotfile)
+                if not same_content(dotfile.home_path, plaintext):
+                    self.decryption_cache.encrypt(dotfile)
+                    changed.append(dotfile)
+            elif entry.link_type == 'external':
+                try:
+                    stored = self._rendered_file(dotfile, 'external')
+                    is_changed = not same_content(dotfile.home_path, stored)
+                except exc.ObjectNotFoundError:
+                    is_changed = True  # file in $HOME is the only copy
+                if is_changed:
+                    write_pointer(dotfile.repo_path,
+                                  *self.object_store.put(dotfile.home_path))
+                    changed.append(dotfile)
+            elif not same_content(dotfile.home_path, dotfile.repo_path):
+                clone_file(dotfile.home_path, dotfile.repo_path)
+                changed.append(dotfile)
+
+        return changed
+
+    def check_hardlinks(self):
+        """Finds hardlinked dotfiles which are no longer hardlinks
+        to files in the repo, e.g. because some editor saved them by writing
+        a new file and renaming it over the old one.
+
+        :return: List of :class:`Dotfile` objects which drifted apart
+                 from their copies in the repository
+        """
+        drifted = []
+        for entry in self.inventory:
+            if not entry.get('hardlink'):
+                continue
+
+            dotfile = self.dotfile(entry.path)
+            try:
+                home_stat = os.lstat(dotfile.home_path)
+                repo_stat = os.lstat(dotfile.repo_path)
+            except OSError:
+                continue  # missing files are not a matter of drift
+
+            if (home_stat.st_dev, home_stat.st_ino) != \
+                    (repo_stat.st_dev, repo_stat.st_ino):
+                drifted.append(dotfile)
+
+        return drifted
+
+    @locked
+    def repair_hardlinks(self, drifted=None):
+        """Restores hardlinks for dotfiles which drifted apart
+        from their copies in the repository.
+
+        If the file in $HOME is newer than the one in repo, it replaces
+        the latter. Otherwise, the one in $HOME is replaced with a new link.
+
+        :param drifted: List of drifted dotfiles, as returned by
+                        :meth:`check_hardlinks`. By default, it is obtained
+                        by calling that method.
+        :return: List of :class:`Dotfile` objects whose files
+                 in the repository have been updated
+        """
+        if drifted is None:
+            drifted = self.check_hardlinks()
+
+        updated = []
+        for dotfile in drifted:
+            home_stat = os.lstat(dotfile.home_path)
+            repo_stat = os.lstat(dotfile.repo_path)
+
+            # links are created under temporary names and then renamed,
+            # so that both files are present at all times
+            is_newer = home_stat.st_mtime > repo_stat.st_mtime
+            if stat.S_ISREG(home_stat.st_mode) and is_newer:
+                temp_repo_path = temp_path(dotfile.repo_path)
+                os.link(dotfile.home_path, temp_repo_path)
+                os.rename(temp_repo_path, dotfile.repo_path)
+                updated.append(dotfile)
+            else:
+                temp_home_path = temp_path(dotfile.home_path)
+                os.link(dotfile.repo_path, temp_home_path)
+                os.rename(temp_home_path, dotfile.home_path)
+
+        if updated:
+            with self.reverse_index as idx:
+                for dotfile in updated:
+                    idx.update(dotfile)
+        return updated
+
+    @locked
+    def relink(self, path):
+        """(Re)creates the link to given dotfile from home directory,
+        according to its inventory entry.
+
+        Existing links in $HOME are replaced, but regular files
+        and directories are never overwritten.
+
+        :param path: Path to the dotfile
+        :return: Whether the link has been created
+        """
+        dotfile = self.dotfile(path)
+        entry = self.inventory.get(dotfile.path)
+        if entry is None or not os.path.lexists(dotfile.repo_path):
+            return False
+
+        if os.path.lexists(dotfile.home_path):
+            if not os.path.islink(dotfile.home_path):
+                return False
+            os.unlink(dotfile.home_path)
+        else:
+            home_parent = os.path.dirname(dotfile.home_path)
+            if not os.path.isdir(home_parent):
+                os.makedirs(home_parent)
+
+        self._link(dotfile, entry.link_type)
+        with self.reverse_index as idx:
+            idx.update(dotfile)
+        return True
+
+    @locked
+    def gc(self, dry_run=False):
+        """Removes orphaned links from home directory, i.e. symlinks
+        which point into the repository but whose targets no longer exist.
+
+        Only the directories which have ever held any dotfiles are scanned,
+        without descending into their subdirectories.
+
+        :param dry_run: If ``True``, orphans will only be found
+                        but not removed
+        :return: List of paths to orphaned links
+        """
+        directories = set(self.reverse_index.dirs)
+        directories.add(self.home_dir)
+
+        candidates = []
+        for directory in directories:
+            if os.path.isdir(directory):
+                candidates.extend(iter_symlinks(directory))
+
+        return self._remove_orphans(candidates, dry_run=dry_run)
+
+    def dotfile(self, filepath):
+        """Given a path to a dotfile, returns a complete tuple of all relevant
+        paths to this dotfile, including the relative one, the one inside
+        repo's $HOME directory, and the one inside repo itself.
+
+        :param filepath: Either of the two (absolute) paths or equivalent
+                         relative path
+
+        :return: ``Dotfile`` named tuple
+
+        .. note;: Existence of either of files involved is not checked.
+        """
+        if not filepath:
+            raise ValueError("empty dotfile path")
+
+        # case 1: relative path
+        if not os.path.isabs(filepath):
+            return Dotfile(
+                path=normalize_path(filepath),
+                home_path=os.path.join(self.home_dir, filepath),
+                repo_path=os.path.join(self.dir, remove_dot(filepath)),
+            )
+
+        # case 2: absolute path inside $HOME
+        if os.path.commonprefix([filepath, self.home_dir]) == self.home_dir:
+            relative_path = os.path.relpath(filepath, start=self.home_dir)
+            return Dotfile(
+                path=normalize_path(relative_path),
+                home_path=filepath,
+                repo_path=os.path.join(self.dir, remove_dot(relative_path)),
+            )
+
+        # case 3: absolute path inside repo's directory
+        if os.path.commonprefix([filepath, self.dir]) == self.dir:
+            relative_path = restore_dot(os.path.relpath(filepath,
+                                                        start=self.dir))
+            return Dotfile(
+                path=normalize_path(relative_path),
+                home_path=os.path.join(self.home_dir, relative_path),
+                repo_path=filepath,
+            )
+
+        raise ValueError("invalid dotfile path")
+
     @property
     def dir(self):
         """Path to directory where the dotfile repository resides."""
@@ -188,17 +857,55 @@ class DotfileRepo(object):
     def dotfiles(self):
         """Iterable of all dotfiles stored within this repository.
         Yields :class:`Dotfile` objects.
+
+        Folded dot-directories are yielded as single dotfiles,
+        without descending into them. Files and directories matching
+        patterns in repo's .mdotsignore are skipped.
         """
         for directory, subdirs, filenames in os.walk(self.dir):
             for skipdir in ('.git',):
                 if skipdir in subdirs:
                     subdirs.remove(skipdir)
 
+            for subdir in list(subdirs):
+                dotfile = self.dotfile(os.path.join(directory, subdir))
+                if self.ignore_rules.match(dotfile.path, is_dir=True):
+                    subdirs.remove(subdir)
+                    continue
+
+                entry = self.inventory.get(dotfile.path)
+                if entry is not None and entry.get('fold'):
+                    subdirs.remove(subdir)
+                    yield dotfile
+
             for filename in filenames:
                 if filename.startswith('.'):  # these are repo's own dotfiles,
                     continue                  # such as .gitignore
 
-                yield self._dotfile(os.path.join(directory, filename))
+                dotfile = self.dotfile(os.path.join(directory, filename))
+                if not self.ignore_rules.match(dotfile.path):
+                    yield dotfile
+
+    def walk_files(self, dotfile):
+        """Iterable of paths to all files inside the repo
+        which make up given dotfile: either just its own file
+        or, for folded dot-directory, all non-ignored files inside it.
+        """
+        if not os.path.isdir(dotfile.repo_path) or \
+                os.path.islink(dotfile.repo_path):
+            yield dotfile.repo_path
+            return
+
+        for directory, subdirs, filenames in os.walk(dotfile.repo_path):
+            for subdir in list(subdirs):
+                path = self.dotfile(os.path.join(directory, subdir)).path
+                if self.ignore_rules.match(path, is_dir=True):
+                    subdirs.remove(subdir)
+
+            for filename in filenames:
+                repo_path = os.path.join(directory, filename)
+                if not self.ignore_rules.match(self.dotfile(repo_path).path):
+                    yield repo_path
 
     @objectproperty
     def home_dir():
@@ -230,15 +937,143 @@ class DotfileRepo(object):
 
         return locals()
 
+    @objectproperty
+    def profile():
+        """Name of the profile which this dotfiles repository is using,
+        or ``None`` if all the dotfiles are installed.
+
+        Profile decides which dotfiles are installed on this machine,
+        based on tags in their inventory entries.
+        """
+        def get(self):
+            profile = self.get_config('profile')
+            return str(profile) if profile else None
+
+        def set(self, value):
+            self.set_config('profile', value or None)
+
+        return locals()
+
+    @objectproperty
+    def relative_links():
+        """Whether symlinks from home directory to the repo are relative
+        rather than absolute. Relative links stay valid when both
+        the repo and home directory are moved together.
+        """
+        def get(self):
+            return self.get_config('relativelinks') is True
+
+        def set(self, value):
+            self.set_config('relativelinks', True if value else None)
+
+        return locals()
+
+    @property
+    def is_sparse(self):
+        """Whether the repository uses Git sparse checkout,
+        i.e. only dotfiles belonging to its profile are present on disk.
+        """
+        # Git may keep the setting in per-worktree config,
+        # which GitPython doesn't read
+        try:
+            value = self.git_repo.git.config('core.sparseCheckout',
+                                             type='bool', get=True)
+        except git.GitCommandError:
+            return False  # option is not set
+        return value == 'true'
+
     @property
     def is_valid(self):
         """Whether repository is a valid one, i.e. contains all the necessary
         files and information.
         """
-        home_file = os.path.join(self.dir, HOME_FILE)
+        home_file = os.path.join(self.git_repo.git_dir, HOME_FILE)
         return all([git.repo.fun.is_git_dir(self.git_repo.git_dir),
                     os.path.exists(home_file)])
 
+    # Settings & commits
+
+    def get_config(self, option, default=None):
+        """Read moredots setting from the repo's Git config.
+        :return: Value of the setting, or ``default`` if it's not set
+        """
+        reader = self.git_repo.config_reader()
+        if not reader.has_option(CONFIG_SECTION, option):
+            return default
+        return reader.get_value(CONFIG_SECTION, option)
+
+    def set_config(self, option, value):
+        """Write moredots setting to the repo's Git config.
+        :param value: New value of the setting, or ``None`` to remove it
+        """
+        writer = self.git_repo.config_writer()
+        try:
+            if value is not None:
+                writer.set_value(CONFIG_SECTION, option, value)
+            elif writer.has_option(CONFIG_SECTION, option):
+                writer.remove_option(CONFIG_SECTION, option)
+        finally:
+            writer.release()
+
+    def commit(self, message=None, add=None, remove=None):
+        """Commits files to the dotfile Git repository.
+
+        :param message: Commit message.
+                        If omitted, it is constructed based on changed files.
+        :param add: Files to be added with the commit
+        :param remove: Files to be removed with the commit
+        """
+        if not (add or remove):
+            return
+
+        add = [add] if isinstance(add, basestring) else add
+        remove = [remove] if isinstance(remove, basestring) else remove
+        self.stage(add=add, remove=remove)
+
+        message = message or "; ".join(filter(None, (
+            "add %s" % ", ".join(add) if add else "",
+            "remove %s" % ", ".join(remove) if remove else "",
+        )))
+        message = COMMIT_PREFIX + message.capitalize()
+        if self.is_sparse:
+            with self.git_repo.git.custom_environment(**self._identity()):
+                self.git_repo.git.commit('-q', '--allow-empty', '-m', message)
+        else:
+            self.git_repo.index.commit(message)
+        self.maintenance.note_commit()
+
+    def stage(self, add=None, remove=None):
+        """Updates Git index of the dotfile repository.
+
+        :param add: Files to be added to the index
+        :param remove: Files to be removed from the index
+
+        Sparse checkout needs a newer format of the index than GitPython
+        can read, so in sparse repos it's updated via Git commands.
+        """
+        # handle given paths smartly
+        def convert_paths(paths):
+            paths = [paths] if isinstance(paths, basestring) else paths
+            return [os.path.relpath(path, start=self.dir)
+                    if os.path.isabs(path) else path for path in paths]
+
+        if self.is_sparse:
+            # like GitPython, stage files regardless of any .gitignore
+            # (e.g. one inside a folded directory), and also outside
+            # of the profile's sparse checkout
+            if add:
+                self.git_repo.git.add('-f', '--sparse', '--',
+                                      *convert_paths(add))
+            if remove:
+                self.git_repo.git.rm('-q', '-r', '--cached', '--sparse', '--',
+                                     *convert_paths(remove))
+            return
+
+        if add:
+            self.git_repo.index.add(convert_paths(add))
+        if remove:
+            self.git_repo.index.remove(convert_paths(remove), r=True)
+
     # Internal methods
 
     @classmethod
@@ -255,88 +1090,582 @@ class DotfileRepo(object):
         if not home_dir_exists or home_dir == repo_dir:
             raise exc.InvalidHomeDirError(repo_dir, home_dir)
 
-    def _install_dotfiles(self):
-        """Install all tracked dotfiles from the repo, (sym)linking
-        to them from home directory.
+    @locked
+    def _install_dotfiles(self, dry_run=False):
+        """Install all tracked dotfiles from the repo which belong
+        to current profile, (sym)linking to them from home directory.
+
+        If previous installation has been interrupted,
+        only its remaining steps are applied.
+
+        :param dry_run: If ``True``, nothing will be changed,
+                        only the plan of changes returned.
+        :return: :class:`Plan` of changes to the filesystem
         """
+        profile = self.profile
+
+        installed = []
         for dotfile in self.dotfiles:
-            if os.path.exists(dotfile.home_path):
-                os.unlink(dotfile.home_path)
+            entry = self.inventory.get(dotfile.path)
+            if entry is None or entry.in_profile(profile):
+                installed.append((dotfile, entry))
+
+        if self.journal.pending:
+            plan = self.journal.load()
+        else:
+            plan = Plan()
+            for dotfile, entry in installed:
+                self._plan_install(plan, dotfile, entry)
+
+        if dry_run:
+            return plan
+        plan.apply(journal=self.journal)
+
+        self.reverse_index.clear()
+        for dotfile, _ in installed:
+            self.reverse_index.update(dotfile)
+        self.reverse_index.save()
+
+        # inventory may have come from elsewhere, e.g. the remote repo
+        self.inventory.save_completion()
+        self.decryption_cache.prune(
+            dotfile for dotfile, entry in installed
+            if entry is not None and entry.link_type == 'encrypted')
+        self.template_cache.prune(
+            dotfile for dotfile, entry in installed
+            if entry is not None and entry.link_type == 'template')
+        return plan
+
+    def _plan_install(self, plan, dotfile, entry=None):
+        """Plan the installation of a single dotfile from the repo,
+        (sym)linking to it from home directory.
+
+        :param entry: :class:`InventoryEntry` for the dotfile, if any
+        """
+        is_folded = entry is not None and entry.get('fold')
 
-            # install the dotfile, creating a (sym)link from home directory
-            is_hardlink = (self.inventory[dotfile.path].hardlink
-                           if dotfile.path in self.inventory else False)
-            link_func = os.link if is_hardlink else os.symlink
-            link_func(dotfile.repo_path, dotfile.home_path)
+        # folded dot-directory that already exists in $HOME as a real one
+        # (because it holds some untracked files) cannot be linked
+        # as a whole, so it has to be unfolded instead
+        if is_folded and plan.isdir(dotfile.home_path):
+            self._plan_unfold(plan, dotfile)
+            return
 
-    def _dotfile(self, filepath):
-        """Given a path to a dotfile, returns a complete tuple of all relevant
-        paths to this dotfile, including the relative one, the one inside
-        repo's $HOME directory, and the one inside repo itself.
+        link_type = entry.link_type if entry is not None else 'symlink'
+        if plan.lexists(dotfile.home_path):
+            if self._is_installed(dotfile, link_type):
+                plan.add(SKIP, dotfile.home_path, reason="installed")
+                return
+            if not plan.islink(dotfile.home_path):
+                self._plan_displace(plan, dotfile)
+        else:
+            home_parent = os.path.dirname(dotfile.home_path)
+            if not plan.lexists(home_parent):
+                plan.add(MKDIR, home_parent)
+
+        # install the dotfile, creating a (sym)link from home directory
+        self._plan_link(plan, dotfile, link_type)
+
+    def _plan_uninstall(self, plan, dotfile):
+        """Plan the uninstallation of a single dotfile from home directory,
+        removing the (sym)link to the file in repo.
+
+        Files in $HOME that are not links to the dotfile (or unmodified
+        copies of it, in case of reflinks) are left intact.
+
+        :return: Whether the dotfile will be removed from $HOME
+        """
+        home_path, repo_path = dotfile.home_path, dotfile.repo_path
+
+        if plan.isdir(home_path):
+            # unfolded directory; uninstall its children
+            if os.path.isdir(repo_path):
+                for name in os.listdir(repo_path):
+                    self._plan_uninstall(
+                        plan, self.dotfile(os.path.join(repo_path, name)))
+            if plan.listdir(home_path):
+                plan.add(SKIP, home_path, reason="not empty")
+                return False
+            plan.add(RMDIR, home_path)
+            return True
+
+        if plan.islink(home_path):
+            is_ours = self._links_to(home_path, repo_path)
+        elif os.path.isfile(home_path) and os.path.isfile(repo_path):
+            link_type = self._link_type(dotfile)
+            if link_type in RENDERED_LINK_TYPES:
+                repo_path = self._rendered_file(dotfile, link_type)
+            is_ours = (os.path.samefile(home_path, repo_path)
+                       or same_content(home_path, repo_path))
+        else:
+            is_ours = False
+
+        if is_ours:
+            plan.add(UNLINK, home_path)
+        elif plan.lexists(home_path):
+            plan.add(SKIP, home_path, reason="not a link to repo")
+        return is_ours
+
+    def _is_installed(self, dotfile, link_type):
+        """Whether the dotfile in $HOME is already linked to the repo
+        in given way, so that installing it wouldn't change anything.
+        """
+        home_path, repo_path = dotfile.home_path, dotfile.repo_path
+        if link_type == 'symlink':
+            return self._is_linked(dotfile)
+        if os.path.islink(home_path) or not os.path.isfile(home_path):
+            return False
+        if link_type == 'hardlink':
+            return os.path.samefile(home_path, repo_path)
+        if link_type in RENDERED_LINK_TYPES:
+            repo_path = self._rendered_file(dotfile, link_type)
+        return same_content(home_path, repo_path)
+
+    def _link_type(self, dotfile):
+        """Way in which dotfile is linked, according to its inventory entry.
+        """
+        entry = self.inventory.get(dotfile.path)
+        return entry.link_type if entry is not None else 'symlink'
 
-        :param filepath: Either of the two (absolute) paths or equivalent
-                         relative path
+    def _rendered_file(self, dotfile, link_type):
+        """Path to the file which is copied into $HOME for dotfiles
+        that are rendered rather than linked (e.g. encrypted ones).
+        """
+        if link_type == 'encrypted':
+            return self.decryption_cache.render(dotfile)
+        if link_type == 'external':
+            pointer = read_pointer(dotfile.repo_path)
+            if pointer is None:
+                raise exc.ObjectNotFoundError(dotfile.path, repo=self)
+            return self.object_store.get(pointer[0], path=dotfile.path,
+                                         candidate=dotfile.home_path)
+        return self.template_cache.render(dotfile)
+
+    def _push_objects(self):
+        """Upload contents of dotfiles kept in object store
+        to the remote store, if there is one.
+        """
+        if self.object_store.remote_dir is None:
+            return
 
-        :return: ``Dotfile`` named tuple
+        digests = []
+        for entry in self.inventory:
+            if entry.link_type != 'external':
+                continue
+            pointer = read_pointer(self.dotfile(entry.path).repo_path)
+            if pointer and os.path.exists(self.object_store.file(pointer[0])):
+                digests.append(pointer[0])
+        self.object_store.push(digests)
+
+    def _link(self, dotfile, link_type='symlink'):
+        """Link the dotfile from home directory to its copy in the repo.
+
+        Reflinked dotfiles are not really links but copy-on-write clones
+        of the repo files, so they share storage with them (on filesystems
+        which support it) while being independent files otherwise.
+        Encrypted and templated dotfiles are copies of decrypted
+        or rendered files in repo.
+        """
+        if link_type == 'hardlink':
+            os.link(dotfile.repo_path, dotfile.home_path)
+        elif link_type == 'reflink':
+            clone_file(dotfile.repo_path, dotfile.home_path)
+        elif link_type in RENDERED_LINK_TYPES:
+            copy_file(self._rendered_file(dotfile, link_type),
+                      dotfile.home_path)
+        else:
+            os.symlink(self._link_target(dotfile), dotfile.home_path)
+
+    def _plan_link(self, plan, dotfile, link_type):
+        """Plan linking the dotfile from home directory
+        to its copy in the repo.
+        """
+        if link_type == 'symlink':
+            target = self._link_target(dotfile)
+        elif link_type in RENDERED_LINK_TYPES:
+            target = self._rendered_file(dotfile, link_type)
+        else:
+            target = dotfile.repo_path
+        plan.add(LINK, dotfile.home_path, target, link_type)
+
+    def _link_target(self, dotfile):
+        """Target of the symlink to dotfile, i.e. either absolute path
+        to the file in repo or, if repo uses relative links,
+        path relative to the symlink's directory.
+        """
+        if not self.relative_links:
+            return dotfile.repo_path
+
+        # symlinks are resolved relative to their real parent directories
+        repo_dir, name = os.path.split(dotfile.repo_path)
+        return os.path.relpath(
+            os.path.join(os.path.realpath(repo_dir), name),
+            start=os.path.realpath(os.path.dirname(dotfile.home_path)))
+
+    def _is_linked(self, dotfile):
+        """Whether dotfile in $HOME is a symlink to the file in repo,
+        exactly as one would be created now.
+        """
+        try:
+            return os.readlink(dotfile.home_path) == self._link_target(dotfile)
+        except OSError:
+            return False
 
-        .. note;: Existence of either of files involved is not checked.
+    def _remove_orphans(self, paths, dry_run=False):
+        """Removes orphaned links to the repo from among given paths,
+        as well as from among their parent directories in $HOME
+        (which may be links to folded dot-directories).
+
+        :return: List of paths to orphaned links
         """
-        if not filepath:
-            raise ValueError("empty dotfile path")
+        home_dir = os.path.normpath(self.home_dir)
+
+        orphans = set()
+        for path in paths:
+            while path.startswith(home_dir) and path != home_dir:
+                if self._is_orphan(path):
+                    orphans.add(path)
+                    break
+                path = os.path.dirname(path)
+
+        if not dry_run:
+            for orphan in orphans:
+                os.unlink(orphan)
+                self.reverse_index.discard(self.dotfile(orphan))
+            if self.reverse_index.dirty:
+                self.reverse_index.save()
+
+        return sorted(orphans)
+
+    def _is_orphan(self, path):
+        """Whether given path is a dangling symlink into the repo."""
+        if not os.path.islink(path) or os.path.exists(path):
+            return False
+
+        target = os.path.join(os.path.dirname(path), os.readlink(path))
+        repo_dir = os.path.join(os.path.normpath(self.dir), '')
+        return os.path.normpath(target).startswith(repo_dir)
+
+    def _same_filesystem(self, dotfile):
+        """Whether dotfile in $HOME is on the same filesystem as the repo,
+        and thus can be simply moved there (or hardlinked).
+        """
+        return os.lstat(dotfile.home_path).st_dev == os.stat(self.dir).st_dev
 
-        # case 1: relative path
-        if not os.path.isabs(filepath):
-            return Dotfile(
-                path=normalize_path(filepath),
-                home_path=os.path.join(self.home_dir, filepath),
-                repo_path=os.path.join(self.dir, remove_dot(filepath)),
-            )
+    def _plan_copy_and_link(self, plan, dotfile, link_type):
+        """Plan copying dotfile from $HOME to the repo on another filesystem,
+        and replacing the original with a (sym)link to the copy.
 
-        # case 2: absolute path inside $HOME
-        if os.path.commonprefix([filepath, self.home_dir]) == self.home_dir:
-            relative_path = os.path.relpath(filepath, start=self.home_dir)
-            return Dotfile(
-                path=normalize_path(relative_path),
-                home_path=filepath,
-                repo_path=os.path.join(self.dir, remove_dot(relative_path)),
-            )
+        Links replace existing files atomically, so the dotfile
+        is always present in $HOME.
+        """
+        plan.add(COPY, dotfile.home_path, dotfile.repo_path)
+        if plan.isdir(dotfile.home_path):
+            # symlink cannot be renamed over a directory,
+            # so the directory has to be moved out of the way first
+            temp_home_path = temp_path(dotfile.home_path, 'old')
+            plan.add(MOVE, dotfile.home_path, temp_home_path)
+            self._plan_link(plan, dotfile, 'symlink')
+            plan.add(UNLINK, temp_home_path)
+        else:
+            self._plan_link(plan, dotfile, link_type)
+
+    def _plan_unfold(self, plan, dotfile):
+        """Plan unfolding a dot-directory in $HOME, replacing a single
+        symlink to the whole directory (if any) with a real directory
+        that contains symlinks to its individual children.
+
+        Children that are directories themselves remain folded,
+        unless they also exist in $HOME as real directories.
+        """
+        if plan.islink(dotfile.home_path):
+            plan.add(UNLINK, dotfile.home_path)
+        if not plan.isdir(dotfile.home_path):
+            plan.add(MKDIR, dotfile.home_path)
+
+        for name in plan.listdir(dotfile.repo_path):
+            child = self.dotfile(os.path.join(dotfile.repo_path, name))
+            if plan.isdir(child.repo_path) and plan.isdir(child.home_path):
+                self._plan_unfold(plan, child)
+                continue
+
+            if plan.lexists(child.home_path):
+                if plan.islink(child.home_path) and self._is_linked(child):
+                    plan.add(SKIP, child.home_path, reason="installed")
+                    continue
+                if not plan.islink(child.home_path):
+                    self._plan_displace(plan, child)
+            self._plan_link(plan, child, 'symlink')
+
+    def _plan_unfold_to(self, plan, dotfile, folded_dir):
+        """Plan unfolding all directories from given folded one
+        down to the parent directory of given dotfile.
+        """
+        relative_dir = os.path.relpath(os.path.dirname(dotfile.repo_path),
+                                       start=folded_dir.repo_path)
+
+        current = folded_dir.repo_path
+        self._plan_unfold(plan, folded_dir)
+        for part in relative_dir.split(os.path.sep):
+            if part in ('', '.'):
+                continue
+            current = os.path.join(current, part)
+            self._plan_unfold(plan, self.dotfile(current))
+
+    def _plan_restore(self, plan, dotfile):
+        """Plan moving dotfile from the repository back to home directory,
+        replacing any links to it.
+        """
+        if plan.isdir(dotfile.home_path) and plan.isdir(dotfile.repo_path):
+            # unfolded directory; restore its children one by one
+            for name in plan.listdir(dotfile.repo_path):
+                self._plan_restore(
+                    plan, self.dotfile(os.path.join(dotfile.repo_path, name)))
+            plan.add(RMDIR, dotfile.repo_path)
+            return
 
-        # case 3: absolute path inside repo's directory
-        if os.path.commonprefix([filepath, self.dir]) == self.dir:
-            relative_path = restore_dot(os.path.relpath(filepath,
-                                                        start=self.dir))
-            return Dotfile(
-                path=normalize_path(relative_path),
-                home_path=os.path.join(self.home_dir, relative_path),
-                repo_path=filepath,
-            )
+        link_type = self._link_type(dotfile)
+        if link_type in RENDERED_LINK_TYPES + ('reflink',) and \
+                plan.isfile(dotfile.home_path):
+            # $HOME already holds a copy of the dotfile, possibly changed
+            # since it has been last synced, so it's kept as it is
+            # while the file in repo is simply removed
+            plan.add(UNLINK, dotfile.repo_path)
+            return
+        if link_type in RENDERED_LINK_TYPES:
+            # rendered file is put back into $HOME instead of its source
+            if plan.lexists(dotfile.home_path):
+                self._plan_displace(plan, dotfile)
+            plan.add(COPY, self._rendered_file(dotfile, link_type),
+                     dotfile.home_path)
+            plan.add(UNLINK, dotfile.repo_path)
+            return
 
-        raise ValueError("invalid dotfile path")
+        if plan.lexists(dotfile.home_path):
+            self._plan_displace(plan, dotfile)
+        plan.add(MOVE, dotfile.repo_path, dotfile.home_path)
 
-    def _commit(self, message=None, add=None, remove=None):
-        """Commits files to the dotfile Git repository.
+    def _plan_displace(self, plan, dotfile):
+        """Plan removing whatever is in place of the dotfile in $HOME,
+        to make room for it.
 
-        :param message: Commit message.
-                        If omitted, it is constructed based on changed files.
-        :param add: Files to be added with the commit
-        :param remove: Files to be removed with the commit
+        Links and hardlinks to the dotfile are simply removed, but other
+        files are moved to backup area inside repo's .git directory,
+        so that nothing is ever lost.
         """
-        if not (add or remove):
-            return
+        home_path = dotfile.home_path
+        if plan.islink(home_path) or (
+                os.path.isfile(home_path) and os.path.isfile(dotfile.repo_path)
+                and os.path.samefile(home_path, dotfile.repo_path)):
+            plan.add(UNLINK, home_path)
+        else:
+            plan.add(BACKUP, home_path, self._backup_path(home_path))
+
+    def _identity(self):
+        """Environment for Git commands which create commits, making them
+        use the same identity as commits created by GitPython.
+        """
+        author = git.Actor.author(self.git_repo.config_reader())
+        committer = git.Actor.committer(self.git_repo.config_reader())
+        return {
+            'GIT_AUTHOR_NAME': author.name, 'GIT_AUTHOR_EMAIL': author.email,
+            'GIT_COMMITTER_NAME': committer.name,
+            'GIT_COMMITTER_EMAIL': committer.email,
+        }
+
+    def _start_operation(self):
+        """Prepare for an operation which modifies the repository.
+        Called whenever the repo's lock is acquired, since the same
+        :class:`DotfileRepo` object may serve many operations
+        (e.g. in ``mdots server``).
+        """
+        self._backup_dir = None  # every run backs up into its own directory
 
-        # modify Git index for the repo, handling given paths smartly
-        def convert_path(path):
-            return (os.path.relpath(path, start=self.dir)
-                    if os.path.isabs(path) else path)
-        if add:
-            add = [add] if isinstance(add, basestring) else add
-            self.git_repo.index.add(map(convert_path, add))
-        if remove:
-            remove = [remove] if isinstance(remove, basestring) else remove
-            self.git_repo.index.remove(map(convert_path, remove))
+    def _backup_path(self, path):
+        """Path inside the backup area where given file from $HOME
+        is moved to. Every run of moredots uses separate directory,
+        named after the time of the run but unique even if many runs
+        happen at once.
+        """
+        if self._backup_dir is None:
+            backup_root = os.path.join(self.git_repo.git_dir, BACKUP_DIR)
+            if not os.path.isdir(backup_root):
+                os.mkdir(backup_root)
+            self._backup_dir = tempfile.mkdtemp(
+                prefix=time.strftime('%Y%m%d-%H%M%S-'), dir=backup_root)
+        return os.path.join(self._backup_dir,
+                            os.path.relpath(path, start=self.home_dir))
+
+    def _resume(self):
+        """Finish applying the plan which has been interrupted, if any.
+        :return: Whether such plan has been found
+        """
+        if not self.journal.pending:
+            return False
+        self.journal.load().apply(journal=self.journal)
+        return True
+
+    @staticmethod
+    def _is_real_dir(path):
+        """Whether given path is a directory but not a symlink to one."""
+        return os.path.isdir(path) and not os.path.islink(path)
+
+    @staticmethod
+    def _links_to(link_path, target):
+        """Whether given path is a symlink pointing to specified target."""
+        return (os.path.islink(link_path)
+                and os.path.realpath(link_path) == os.path.realpath(target))
+
+    def _update_sparse_checkout(self, profile=None):
+        """Update the set of paths checked out in sparse repository,
+        so that it contains all dotfiles belonging to given profile.
+
+        :param profile: Name of the profile. By default, it's the profile
+                        the repository is currently using.
+        """
+        if profile is None:
+            profile = self.profile
+        self._set_sparse_checkout(
+            self.dotfile(path).repo_path
+            for path in self.inventory.profile_paths(profile))
+
+    def _set_sparse_checkout(self, paths):
+        """Set the paths checked out in the repository via Git sparse
+        checkout. Files required by moredots itself, like the inventory,
+        are always checked out.
+
+        :param paths: Iterable of absolute paths inside the repo
+        """
+        paths = [INVENTORY_FILE, IGNORE_FILE] + sorted(
+            os.path.relpath(path, start=self.dir) for path in paths)
+        self.git_repo.git.sparse_checkout(
+            'set', '--no-cone', *map(_sparse_pattern, paths))
+
+    def _register_merge_driver(self):
+        """Make Git merge the inventory with :mod:`moredots.merge`,
+        so that dotfiles added or changed on different machines
+        don't conflict on its lines.
+
+        Driver is registered in repo's Git config and .git/info/attributes,
+        since it depends on where moredots is installed on this machine.
+        """
+        package_dir = os.path.dirname(os.path.dirname(moredots.__file__))
+        driver = "PYTHONPATH=%s %s -m moredots.merge %%O %%A %%B" % (
+            quote(package_dir), quote(sys.executable))
+
+        section = 'merge "%s"' % DRIVER_NAME
+        reader = self.git_repo.config_reader()
+        if not (reader.has_option(section, 'driver') and
+                reader.get_value(section, 'driver') == driver):
+            writer = self.git_repo.config_writer()
+            try:
+                writer.set_value(section, 'name', "moredots inventory merge")
+                writer.set_value(section, 'driver', driver)
+            finally:
+                writer.release()
+
+        attribute = "/%s merge=%s" % (INVENTORY_FILE, DRIVER_NAME)
+        info_dir = os.path.join(self.git_repo.git_dir, 'info')
+        attributes_file = os.path.join(info_dir, 'attributes')
+        lines = []
+        if os.path.exists(attributes_file):
+            with open(attributes_file) as f:
+                lines = f.read().splitlines()
+        if attribute not in lines:
+            if not os.path.isdir(info_dir):
+                os.mkdir(info_dir)
+            with open(attributes_file, 'a') as f:
+                print >>f, attribute
+
+    def _coalesce_commits(self):
+        """Fold consecutive moredots commits at the tip of the branch
+        into a single one, if they haven't been pushed to any remote yet.
+
+        Only commits made within ``moredots.coalescewindow`` seconds
+        before the last one are folded. Coalescing is disabled
+        if the option is not set.
+
+        :return: Number of commits that have been folded
+        """
+        window = float(self.get_config('coalescewindow', 0))
+        if window <= 0 or not self.git_repo.head.is_valid():
+            return 0
+
+        # commits reachable from any remote have been pushed somewhere,
+        # e.g. only to a mirror, so they must stay as they are
+        head = self.git_repo.head.commit
+        unpushed = set(self.git_repo.git.rev_list(
+            'HEAD', '--not', '--remotes').split())
+
+        commits = []
+        commit = head
+        while (commit.hexsha in unpushed and len(commit.parents) <= 1 and
+               commit.message.startswith(COMMIT_PREFIX) and
+               head.committed_date - commit.committed_date <= window):
+            commits.append(commit)
+            if not commit.parents:
+                break
+            commit = commit.parents[0]
+        if len(commits) < 2:
+            return 0
+
+        commits.reverse()
+        subjects = [c.message.splitlines()[0][len(COMMIT_PREFIX):]
+                    for c in commits]
+        message = "%s%s\n\n%s\n" % (
+            COMMIT_PREFIX, _summarize(subjects),
+            "\n".join("* %s" % subject for subject in subjects))
+
+        # new commit has the same tree as HEAD,
+        # so neither index nor working tree need to change
+        git.Commit.create_from_tree(self.git_repo, head.tree, message,
+                                    parent_commits=commits[0].parents,
+                                    head=True)
+        return len(commits)
+
+
+def _summarize(subjects):
+    """Combine subjects of moredots commits, like ``Add .vimrc``
+    or ``Add .a; remove .b``, into one listing all the touched paths.
+    """
+    verbs = []
+    paths = {}
+    for subject in subjects:
+        for part in subject.split('; '):
+            verb, _, part_paths = part.partition(' ')
+            verb = verb.lower()
+            if verb not in paths:
+                verbs.append(verb)
+                paths[verb] = []
+            for path in part_paths.split(', '):
+                if path and path not in paths[verb]:
+                    paths[verb].append(path)
+
+    summary = "; ".join("%s %s" % (verb, ", ".join(paths[verb]))
+                        for verb in verbs)
+    return summary[:1].upper() + summary[1:]
+
+
+def _device(path):
+    """Device of the filesystem which given path is (or would be) on,
+    i.e. of the path itself or its closest existing parent directory.
+    """
+    while not os.path.lexists(path):
+        path = os.path.dirname(path)
+    return os.lstat(path).st_dev
 
-        message = message or "; ".join(filter(None, (
-            "add %s" % ", ".join(add) if add else "",
-            "remove %s" % ", ".join(remove) if remove else "",
-        )))
-        self.git_repo.index.commit("[moredots] %s" % message.capitalize())
+
+def _last_line(text):
+    """Last non-empty line of text, e.g. the actual error in Git's output."""
+    lines = [line.strip(" '") for line in text.splitlines() if line.strip()]
+    return lines[-1] if lines else ""
+
+
+def _sparse_pattern(path):
+    """Convert relative path inside the repo into sparse checkout pattern
+    that matches exactly that file or directory.
+    """
+    path = path.replace(os.path.sep, '/')
+    for char in '\\*?[':
+        path = path.replace(char, '\\' + char)
+    return '/' + path
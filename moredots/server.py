@@ -0,0 +1,181 @@
+"""
+Resident ``mdots server`` which executes commands sent by clients
+over a Unix socket.
+
+Server keeps :class:`DotfileRepo` objects (with their loaded inventory,
+reverse index and ignore rules) between commands, so that neither
+the interpreter startup nor loading of repository data is paid
+on every invocation of ``mdots``.
+"""
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+from SocketServer import StreamRequestHandler, UnixStreamServer
+from StringIO import StringIO
+
+from moredots import cmdline, exc
+from moredots.client import socket_path
+from moredots.ignore import IGNORE_FILE
+from moredots.repo import DotfileRepo, HOME_FILE
+from moredots.utils import stamp
+
+
+__all__ = ['Server', 'RepoCache', 'serve']
+
+
+def serve(path=None):
+    """Runs the server until it's interrupted.
+    :param path: Path to the socket to listen on. By default, it's obtained
+                 by calling :func:`moredots.client.socket_path`
+    """
+    server = Server(path or socket_path())
+
+    # make termination also go through cleanup below, removing the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class Server(UnixStreamServer):
+    """Server executing moredots commands.
+
+    Commands are executed one at a time, as they share the process'
+    working directory and standard output. Modifications of repositories
+    are additionally serialized with other processes by repository lock.
+    """
+    def __init__(self, path):
+        """Constructor.
+
+        :param path: Path to the socket to listen on
+        :raise: ``exc.ServerRunningError`` if another server
+                is listening on that socket already
+        """
+        if os.path.exists(path):
+            if _is_listening(path):
+                raise exc.ServerRunningError(path)
+            os.unlink(path)  # left over by server that was killed
+
+        # socket is only accessible to the user running the server
+        old_umask = os.umask(0o077)
+        try:
+            UnixStreamServer.__init__(self, path, RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+        self.repo_cache = RepoCache()
+
+    def server_close(self):
+        """Stops listening and removes the socket file."""
+        UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+    def execute(self, argv, cwd):
+        """Executes moredots command.
+
+        :param argv: List of command line arguments
+        :param cwd: Working directory of the client
+        :return: Dictionary with ``stdout``, ``stderr`` and ``exit`` code
+        """
+        from moredots.main import main
+
+        old_cwd = os.getcwd()
+        old_stdout, old_stderr = sys.stdout, sys.stderr
+        stdout, stderr = StringIO(), StringIO()
+
+        sys.stdout, sys.stderr = stdout, stderr
+        cmdline.repo_cache = self.repo_cache
+        try:
+            os.chdir(cwd)
+            code = main(argv)
+        except SystemExit as e:
+            code = e.code
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            cmdline.repo_cache = None
+            sys.stdout, sys.stderr = old_stdout, old_stderr
+            os.chdir(old_cwd)
+
+        if not isinstance(code, int):
+            if code is not None:
+                print >>stderr, code
+            code = 0 if code is None else 1
+        return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(),
+                'exit': code}
+
+
+class RequestHandler(StreamRequestHandler):
+    """Handler of a single request from client.
+
+    Request is a line with JSON object holding the command line arguments
+    (``argv``) and working directory (``cwd``) of the client.
+    Response is a JSON object with command's output and exit code.
+    """
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline())
+            argv, cwd = message['argv'], message['cwd']
+        except (ValueError, KeyError, TypeError):
+            return  # not a moredots client
+
+        response = self.server.execute(argv, cwd)
+        self.wfile.write(json.dumps(response) + '\n')
+
+
+class RepoCache(object):
+    """Cache of :class:`DotfileRepo` objects used by the server.
+
+    Cached repo is reused as long as the files its data was loaded from
+    haven't changed. Otherwise, e.g. after the repo has been modified
+    by a command run without the server, it's opened again.
+    """
+    def __init__(self):
+        self._repos = {}  # repo_dir -> (stamp, repo)
+
+    def get(self, repo_dir):
+        """Returns :class:`DotfileRepo` for given directory."""
+        repo_dir = os.path.realpath(repo_dir)
+
+        stamp, repo = self._repos.get(repo_dir, (None, None))
+        if repo is None or _stamp(repo) != stamp:
+            repo = DotfileRepo(repo_dir)
+            self._repos[repo_dir] = (_stamp(repo), repo)
+        return repo
+
+    def clear(self):
+        """Removes all repos from the cache."""
+        self._repos.clear()
+
+    def __len__(self):
+        return len(self._repos)
+
+
+def _stamp(repo):
+    """Identifies the version of files which :class:`DotfileRepo`
+    loads its data from.
+    """
+    return stamp((repo.inventory.file, repo.reverse_index.file,
+                  os.path.join(repo.dir, IGNORE_FILE),
+                  os.path.join(repo.git_repo.git_dir, HOME_FILE),
+                  os.path.join(repo.git_repo.git_dir, 'config')))
+
+
+def _is_listening(path):
+    """Whether any server is listening on given Unix socket."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
@@ -0,0 +1,194 @@
+"""
+Module containing the :class:`ObjectStore` class which keeps contents
+of large dotfiles outside of the Git repository.
+"""
+import errno
+import hashlib
+import os
+
+from moredots import exc
+from moredots.utils import CHUNK_SIZE, copy_file
+
+
+__all__ = ['ObjectStore', 'read_pointer', 'write_pointer']
+
+
+#: Files of at least this size (in bytes) are stored outside of the repo,
+#: unless ``moredots.externalthreshold`` option of Git config says otherwise
+DEFAULT_THRESHOLD = 1024 * 1024
+
+#: First line of pointer files, which the repo holds instead of large files
+POINTER_HEADER = 'moredots-external 1'
+
+#: Maximum size of pointer files
+POINTER_MAX_SIZE = 256
+
+
+class ObjectStore(object):
+    """Represents the content-addressed store of large dotfiles.
+
+    Instead of large dotfiles, the repository only holds small pointer
+    files with SHA256 hashes of their contents. The contents themselves
+    (objects) are kept in a local store, shared by all repositories
+    on the machine, so that identical files are stored only once.
+
+    Optionally, objects are also uploaded to remote store (a directory,
+    e.g. on network filesystem) when the repo is synced, and downloaded
+    from it only when dotfiles which need them are installed.
+    """
+    def __init__(self, repo):
+        """Constructor.
+        :param repo: :class:`DotfileRepo` object
+        """
+        self.repo = repo
+
+    def put(self, path):
+        """Puts given file into the local store.
+        :return: Tuple of SHA256 hash and size of the file
+        """
+        digest = file_sha256(path)
+        object_path = self.file(digest)
+        if not os.path.exists(object_path):
+            _store(path, object_path)
+        return digest, os.path.getsize(object_path)
+
+    def get(self, digest, path=None, candidate=None):
+        """Provides the object with given hash, downloading it
+        from remote store if it's not in the local one.
+
+        :param path: Path to the dotfile, used in error reports
+        :param candidate: Path to a file which may already have
+                          the content of object (e.g. dotfile in $HOME),
+                          which is used instead of downloading it
+        :return: Path to the object in local store
+
+        :raise: ``exc.ObjectNotFoundError`` if object isn't available
+        """
+        object_path = self.file(digest)
+        if os.path.exists(object_path):
+            return object_path
+
+        if candidate and os.path.isfile(candidate) and \
+                file_sha256(candidate) == digest:
+            _store(candidate, object_path)
+            return object_path
+
+        remote_path = self.remote_file(digest)
+        if remote_path is None or not os.path.exists(remote_path):
+            raise exc.ObjectNotFoundError(path or digest, repo=self.repo)
+        _store(remote_path, object_path)
+        if file_sha256(object_path) != digest:
+            os.unlink(object_path)  # corrupted in transit
+            raise exc.ObjectNotFoundError(path or digest, repo=self.repo)
+        return object_path
+
+    def push(self, digests):
+        """Uploads objects with given hashes to remote store,
+        skipping the ones that are there already.
+        :return: List of hashes of uploaded objects
+        """
+        if self.remote_dir is None:
+            return []
+
+        pushed = []
+        for digest in digests:
+            remote_path = self.remote_file(digest)
+            if os.path.exists(remote_path):
+                continue
+            _store(self.get(digest), remote_path)
+            pushed.append(digest)
+        return pushed
+
+    def file(self, digest):
+        """Full path to the object with given hash in local store."""
+        return os.path.join(self.dir, digest[:2], digest[2:])
+
+    def remote_file(self, digest):
+        """Full path to the object with given hash in remote store,
+        or ``None`` if there is no remote store.
+        """
+        if self.remote_dir is None:
+            return None
+        return os.path.join(self.remote_dir, digest[:2], digest[2:])
+
+    @property
+    def dir(self):
+        """Directory of local store. It's taken from ``moredots.store``
+        option of Git config or, by default, is inside $XDG_CACHE_HOME.
+        """
+        store_dir = self.repo.get_config('store')
+        if store_dir:
+            return os.path.expanduser(store_dir)
+        cache_dir = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.expanduser('~/.cache')
+        return os.path.join(cache_dir, 'moredots', 'objects')
+
+    @property
+    def remote_dir(self):
+        """Directory of remote store, taken from ``moredots.remotestore``
+        option of Git config, or ``None`` if it's not set.
+        """
+        remote_dir = self.repo.get_config('remotestore')
+        if not remote_dir:
+            return None
+        if remote_dir.startswith('file://'):
+            remote_dir = remote_dir[len('file://'):]
+        return os.path.expanduser(remote_dir)
+
+    @property
+    def threshold(self):
+        """Size (in bytes) of files which are stored outside of repo."""
+        return int(self.repo.get_config('externalthreshold',
+                                        DEFAULT_THRESHOLD))
+
+
+def read_pointer(path):
+    """Reads pointer file.
+    :return: Tuple of SHA256 hash and size of the file it points to,
+             or ``None`` if given file isn't a pointer
+    """
+    try:
+        if os.path.getsize(path) > POINTER_MAX_SIZE:
+            return None
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return None
+
+    if len(lines) != 3 or lines[0] != POINTER_HEADER:
+        return None
+    try:
+        fields = dict(line.split(' ', 1) for line in lines[1:])
+        return fields['sha256'], int(fields['size'])
+    except (KeyError, ValueError):
+        return None
+
+
+def write_pointer(path, digest, size):
+    """Writes pointer file to object with given hash and size."""
+    with open(path, 'w') as f:
+        print >>f, POINTER_HEADER
+        print >>f, 'sha256 %s' % digest
+        print >>f, 'size %d' % size
+
+
+def file_sha256(path):
+    """Computes SHA256 digest of file's content, reading it chunk by chunk.
+    :return: Hex digest of the file
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _store(source, object_path):
+    """Copy file into a store, creating the object's directory."""
+    object_dir = os.path.dirname(object_path)
+    try:
+        os.makedirs(object_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    copy_file(source, object_path)
@@ -0,0 +1,193 @@
+"""
+Module containing the :class:`TemplateCache` class which renders
+templated dotfiles with facts about the host they're installed on.
+"""
+import getpass
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+
+from moredots import exc
+from moredots.utils import stamp, stat_key, temp_path
+
+
+__all__ = ['TemplateCache', 'render', 'variables']
+
+
+CACHE_DIR = 'mdots_templates'
+
+#: Section of Git config holding variables for templates. Variables
+#: specific to a profile are in subsection named ``vars.<profile>``.
+VARS_SECTION = 'moredots "vars"'
+
+#: Reference to variable inside template, e.g. ``{{ hostname }}``
+VARIABLE_RE = re.compile(r'\{\{\s*([A-Za-z_][\w.-]*)\s*\}\}')
+
+
+def render(text, values, path=None):
+    """Renders template text, substituting values of variables
+    for references to them.
+
+    :param values: Dictionary with values of variables
+    :param path: Path to the template, used in error reports
+    :raise: ``exc.TemplateError`` if template uses undefined variable
+    """
+    def substitute(match):
+        name = match.group(1)
+        if name not in values:
+            raise exc.TemplateError(path, variable=name)
+        return values[name]
+    return VARIABLE_RE.sub(substitute, text)
+
+
+def variables(text):
+    """Names of variables used by template text, sorted."""
+    return sorted(set(VARIABLE_RE.findall(text)))
+
+
+class TemplateCache(object):
+    """Represents the cache of rendered templated dotfiles.
+
+    Templated dotfiles are kept in the repository as templates, while
+    $HOME holds their versions rendered with host facts (like hostname
+    or OS) and variables from Git config. Rendered files are cached under
+    the hash of template's content and values of variables it uses,
+    so they're only rendered again once either of those changes.
+
+    Renderings depend on the host, so they're never committed;
+    the cache lives in the repo's .git directory instead.
+    """
+    def __init__(self, repo):
+        """Constructor.
+        :param repo: :class:`DotfileRepo` object
+        """
+        self.repo = repo
+
+        self._templates = {}  # path -> (stat key, render key, variables)
+        self._facts = None
+        self._facts_stamp = None
+
+    def render(self, dotfile, source=None):
+        """Provides the rendered version of templated dotfile,
+        rendering it only if it's not in the cache yet.
+
+        :param dotfile: :class:`Dotfile` tuple
+        :param source: Path to the template. By default,
+                       it's the dotfile's file in repo
+        :return: Path to cached file with rendered template
+
+        :raise: ``exc.TemplateError`` if template uses undefined variable
+        """
+        source = source or dotfile.repo_path
+        path = self.file(source, dotfile.path)
+        if os.path.exists(path):
+            return path
+
+        with open(source, 'rb') as f:
+            text = render(f.read(), self.facts, path=dotfile.path)
+
+        if not os.path.isdir(self.dir):
+            os.mkdir(self.dir)
+        temp_file = temp_path(path)
+        with open(temp_file, 'wb') as f:
+            f.write(text)
+        shutil.copymode(source, temp_file)
+        os.rename(temp_file, path)
+        return path
+
+    def prune(self, dotfiles):
+        """Removes all rendered files from the cache, except for
+        current versions of given dotfiles.
+
+        :param dotfiles: Iterable of templated :class:`Dotfile` tuples
+        """
+        if not os.path.isdir(self.dir):
+            return
+
+        keep = set()
+        for dotfile in dotfiles:
+            try:
+                keep.add(os.path.basename(self.file(dotfile.repo_path,
+                                                    dotfile.path)))
+            except (OSError, IOError, exc.TemplateError):
+                continue
+        for name in os.listdir(self.dir):
+            if name not in keep:
+                os.unlink(os.path.join(self.dir, name))
+
+    def file(self, source, path=None):
+        """Full path to the cached rendering of given template.
+
+        Templates are only read once (until they change)
+        to find the variables they use.
+
+        :param source: Path to the template
+        :param path: Path to the dotfile, used in error reports
+        :raise: ``exc.TemplateError`` if template uses undefined variable
+        """
+        key = stat_key(source)
+
+        cached = self._templates.get(source)
+        if cached is None or cached[0] != key:
+            with open(source, 'rb') as f:
+                text = f.read()
+            content_hash = hashlib.sha1(text).hexdigest()
+            cached = (key, content_hash, variables(text))
+            self._templates[source] = cached
+
+        _, content_hash, names = cached
+        facts = self.facts
+        for name in names:
+            if name not in facts:
+                raise exc.TemplateError(path or source, variable=name)
+
+        key = hashlib.sha1(json.dumps(
+            [content_hash] + [(name, facts[name]) for name in names]))
+        return os.path.join(self.dir, key.hexdigest())
+
+    @property
+    def facts(self):
+        """Values of variables available to templates: facts about
+        the host, and user-defined variables from Git config.
+
+        Facts are computed once and kept until Git config changes.
+        """
+        # Git config files which user-defined variables are read from
+        config_stamp = stamp((
+            os.path.join(self.repo.git_repo.git_dir, 'config'),
+            os.path.expanduser('~/.gitconfig')))
+        if self._facts is None or config_stamp != self._facts_stamp:
+            self._facts = self._collect_facts()
+            self._facts_stamp = config_stamp
+        return self._facts
+
+    @property
+    def dir(self):
+        """Full path to the cache directory."""
+        return os.path.join(self.repo.git_repo.git_dir, CACHE_DIR)
+
+    def _collect_facts(self):
+        """Compute values of all template variables."""
+        profile = self.repo.profile
+        facts = {
+            'hostname': socket.gethostname(),
+            'os': platform.system().lower(),
+            'arch': platform.machine(),
+            'user': getpass.getuser(),
+            'home': self.repo.home_dir,
+            'profile': profile or '',
+        }
+
+        reader = self.repo.git_repo.config_reader()
+        sections = [VARS_SECTION]
+        if profile:
+            sections.append('moredots "vars.%s"' % profile)
+        for section in sections:
+            if reader.has_section(section):
+                facts.update((name, str(value))
+                             for name, value in reader.items(section))
+        return facts
@@ -1,7 +1,19 @@
 """
 Various utility code.
 """
+import errno
+import fcntl
+import hashlib
 import os
+import shutil
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 
 def objectproperty(func):
@@ -46,6 +58,24 @@ def relative_path(path, base):
     return path
 
 
+def iter_symlinks(directory):
+    """Yields paths to all symlinks directly inside given directory.
+
+    Uses ``scandir()`` if available, which avoids a separate lstat() call
+    for every directory entry on most filesystems.
+    """
+    if scandir is not None:
+        for entry in scandir(directory):
+            if entry.is_symlink():
+                yield entry.path
+        return
+
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.islink(path):
+            yield path
+
+
 def normalize_path(path):
     """Normalizes relative path, removing superficial differences
     such as `./` segments.
@@ -54,6 +84,14 @@ def normalize_path(path):
     return os.path.normpath(os.path.join('.', path))
 
 
+def temp_path(path, suffix='tmp'):
+    """Returns path for a temporary file placed next to the given one,
+    e.g. for the purpose of atomically replacing it afterwards.
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, '.%s.mdots-%s' % (name, suffix))
+
+
 def remove_dot(path):
     """Removes the leading dot from the childmost path fragment.
     :return: Modified path
@@ -90,3 +128,160 @@ def restore_dot(path):
             break
 
     return os.path.sep.join(parts)
+
+
+# File operations
+
+#: ioctl() request for cloning file contents on copy-on-write filesystems
+#: (such as btrfs or XFS); equal to _IOW(0x94, 9, int) from <linux/fs.h>
+FICLONE = 0x40049409
+
+#: Size of chunks used when files are copied or hashed piece by piece
+CHUNK_SIZE = 1024 * 1024
+
+#: Error codes indicating that reflinking is not possible between given files,
+#: e.g. because filesystem doesn't support it or they're on different ones
+REFLINK_UNSUPPORTED = frozenset(filter(None, (
+    getattr(errno, name, None)
+    for name in ('EOPNOTSUPP', 'ENOTSUP', 'EXDEV',
+                 'EINVAL', 'ENOTTY', 'ENOSYS')
+)))
+
+
+def clone_file(source, target):
+    """Creates a copy-on-write clone of ``source`` file at ``target`` path,
+    falling back to regular copy where filesystem doesn't support cloning.
+
+    File mode and timestamps are preserved in both cases.
+    """
+    with open(source, 'rb') as src:
+        with open(target, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except (IOError, OSError) as e:
+                if e.errno not in REFLINK_UNSUPPORTED:
+                    raise
+                copy_stream(src, dst)
+    shutil.copystat(source, target)
+
+
+def copy_stream(src, dst):
+    """Copies the whole content of one file object into another,
+    without ever holding more than a single chunk of it in memory.
+
+    Uses ``os.copy_file_range`` or ``os.sendfile`` to avoid copying data
+    through userspace, if any of them is available.
+    """
+    dst.flush()
+    for name in ('copy_file_range', 'sendfile'):
+        if hasattr(os, name) and _copy_in_kernel(name, src, dst):
+            return
+
+    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def _copy_in_kernel(name, src, dst):
+    """Copies file content using given in-kernel copy function
+    (``os.copy_file_range`` or ``os.sendfile``).
+    :return: Whether copying was possible
+    """
+    offset = 0
+    while True:
+        try:
+            if name == 'sendfile':
+                copied = os.sendfile(dst.fileno(), src.fileno(),
+                                     offset, CHUNK_SIZE)
+            else:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(),
+                                            CHUNK_SIZE, offset)
+        except OSError as e:
+            if offset == 0 and e.errno in REFLINK_UNSUPPORTED:
+                return False  # not supported for these files
+            raise
+        if copied == 0:
+            return True
+        offset += copied
+
+
+def copy_file(source, target):
+    """Copies a file, preserving its mode and timestamps.
+
+    Data is streamed into a temporary file next to ``target``,
+    which is then atomically renamed, so that no partially written
+    file is ever visible under the ``target`` path.
+    """
+    temp_target = temp_path(target)
+    try:
+        with open(source, 'rb') as src:
+            with open(temp_target, 'wb') as dst:
+                copy_stream(src, dst)
+        shutil.copystat(source, temp_target)
+        os.rename(temp_target, target)
+    except:
+        if os.path.exists(temp_target):
+            os.unlink(temp_target)
+        raise
+
+
+def copy_tree(source, target):
+    """Copies a directory tree, preserving modes and timestamps
+    of files and directories, as well as any symlinks inside it.
+    """
+    os.mkdir(target)
+    for name in os.listdir(source):
+        source_path = os.path.join(source, name)
+        target_path = os.path.join(target, name)
+        if os.path.islink(source_path):
+            os.symlink(os.readlink(source_path), target_path)
+        elif os.path.isdir(source_path):
+            copy_tree(source_path, target_path)
+        else:
+            copy_file(source_path, target_path)
+    shutil.copystat(source, target)
+
+
+def file_digest(path):
+    """Computes SHA1 digest of file's content, reading it chunk by chunk.
+    :return: Hex digest of the file
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def stat_key(path):
+    """Identifies the version of file by its inode number, size and mtime,
+    so that data derived from it can be reused until it changes.
+
+    :raise: ``OSError`` if file doesn't exist
+    """
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime
+
+
+def stamp(paths):
+    """Identifies the versions of all given files.
+    :return: Tuple of :func:`stat_key` values, with ``None`` for files
+             which don't exist
+    """
+    keys = []
+    for path in paths:
+        try:
+            keys.append(stat_key(path))
+        except OSError:
+            keys.append(None)
+    return tuple(keys)
+
+
+def same_content(path1, path2):
+    """Checks whether two files have the same content, using quick
+    comparison of their stat() data before falling back to hashing.
+    """
+    stat1, stat2 = os.stat(path1), os.stat(path2)
+    if stat1.st_size != stat2.st_size:
+        return False
+    if stat1.st_mtime == stat2.st_mtime:
+        return True
+    return file_digest(path1) == file_digest(path2)
@@ -38,6 +38,6 @@ setup(
 
     packages=find_packages(),
     entry_points={
-        'console_scripts': ['mdots=moredots.main:main'],
+        'console_scripts': ['mdots=moredots.client:main'],
     }
 )
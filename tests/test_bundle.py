@@ -0,0 +1,64 @@
+"""
+Tests for exporting repositories into bundle files.
+"""
+import os
+
+import pytest
+
+from moredots import bundle, exc
+from moredots.repo import DotfileRepo
+
+
+class TestBundle(object):
+
+    def test_create(self, filled_repo, bundle_file):
+        manifest = bundle.create(filled_repo, bundle_file)
+
+        assert os.path.isfile(bundle_file)
+        assert manifest['commit'] == filled_repo.git_repo.head.commit.hexsha
+        assert manifest['dotfiles'] == len(filled_repo.inventory)
+        assert manifest['remote'] is None
+
+    def test_read_manifest(self, filled_repo, bundle_file):
+        manifest = bundle.create(filled_repo, bundle_file)
+        assert bundle.read_manifest(bundle_file) == manifest
+
+    def test_invalid_bundle(self, tmpdir):
+        path = tmpdir.join('invalid')
+        path.write("definitely not a tarball")
+
+        with pytest.raises(exc.InvalidBundleError):
+            bundle.read_manifest(str(path))
+        with pytest.raises(exc.InvalidBundleError):
+            bundle.extract(str(path), str(tmpdir))
+
+    def test_install_from_bundle(self, filled_repo, bundle_file, tmpdir):
+        bundle.create(filled_repo, bundle_file)
+        home_dir = str(tmpdir.mkdir('other_home'))
+        repo_dir = str(tmpdir.join('other_repo'))
+
+        repo = DotfileRepo.install_bundle(bundle_file, repo_dir, home_dir)
+
+        assert repo.git_repo.head.commit == filled_repo.git_repo.head.commit
+        assert not repo.git_repo.remotes
+        for dotfile in repo.dotfiles:
+            assert os.path.islink(dotfile.home_path)
+
+    def test_install_from_bundle_keeps_remote(self, filled_repo,
+                                              filled_remote_url,
+                                              bundle_file, tmpdir):
+        filled_repo.git_repo.create_remote('origin', filled_remote_url)
+        bundle.create(filled_repo, bundle_file)
+
+        repo = DotfileRepo.install_bundle(
+            bundle_file, str(tmpdir.join('other_repo')),
+            str(tmpdir.mkdir('other_home')))
+
+        assert repo.git_repo.remotes.origin.url == filled_remote_url
+
+
+# Fixtures / resources
+
+@pytest.fixture
+def bundle_file(tmpdir):
+    return str(tmpdir.join('dotfiles.mdots'))
@@ -1,6 +1,8 @@
 """
 Unit tests for command line parser.
 """
+import time
+
 import git
 
 import pytest
@@ -36,6 +38,44 @@ class TestAdd(object):
         assert args.filepath == self.FILEPATH
         assert args.hardlink
 
+    def test_with_filepath_and_reflink_arg(self, argparser):
+        args = argparser.parse_args(['add', self.FILEPATH, '--reflink'])
+        assert args.filepath == self.FILEPATH
+        assert args.reflink
+        assert not args.hardlink
+
+    def test_with_hardlink_and_reflink_args(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(
+                ['add', self.FILEPATH, '--hardlink', '--reflink'])
+
+    def test_with_filepath_and_encrypt_arg(self, argparser):
+        args = argparser.parse_args(['add', self.FILEPATH, '--encrypt'])
+        assert args.encrypt
+        assert not args.hardlink
+        assert not args.reflink
+
+    def test_with_filepath_and_template_arg(self, argparser):
+        args = argparser.parse_args(['add', self.FILEPATH, '--template'])
+        assert args.template
+        assert not args.encrypt
+
+    def test_with_encrypt_and_hardlink_args(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(
+                ['add', self.FILEPATH, '--encrypt', '--hardlink'])
+
+    def test_with_filepath_and_dry_run_args(self, argparser):
+        args = argparser.parse_args(['add', self.FILEPATH, '--dry-run'])
+        assert args.filepath == self.FILEPATH
+        assert args.dry_run
+
+    def test_with_filepath_and_tag_args(self, argparser):
+        args = argparser.parse_args(
+            ['add', self.FILEPATH, '--tag', 'foo', '--tag', 'bar'])
+        assert args.filepath == self.FILEPATH
+        assert args.tags == ['foo', 'bar']
+
     def test_with_all_args(self, argparser, git_repo):
         args = argparser.parse_args([
             'add', self.FILEPATH, git_repo.working_dir, '--hardlink'])
@@ -45,6 +85,53 @@ class TestAdd(object):
         assert args.hardlink
 
 
+class TestDiscover(object):
+
+    def test_without_args(self, argparser):
+        args = argparser.parse_args(['discover'])
+        assert args.ignore == []
+        assert not args.output_json
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args([
+            'discover', git_repo.working_dir, '--ignore', '.foo',
+            '--ignore', '.bar', '--max-depth', '3', '--time-budget', '0.5',
+            '--json'])
+
+        assert args.repo.dir == git_repo.working_dir
+        assert args.ignore == ['.foo', '.bar']
+        assert args.max_depth == 3
+        assert args.time_budget == 0.5
+        assert args.output_json
+
+
+class TestFsck(object):
+
+    def test_without_args(self, argparser):
+        args = argparser.parse_args(['fsck'])
+        assert not args.repair
+        assert not args.output_json
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(
+            ['fsck', git_repo.working_dir, '--repair', '--json'])
+        assert args.repo.dir == git_repo.working_dir
+        assert args.repair
+        assert args.output_json
+
+
+class TestGc(object):
+
+    def test_without_args(self, argparser):
+        args = argparser.parse_args(['gc'])
+        assert not args.dry_run
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(['gc', git_repo.working_dir, '--dry-run'])
+        assert args.repo.dir == git_repo.working_dir
+        assert args.dry_run
+
+
 class TestInit(object):
 
     REPO_DIR = "./foo/bar"
@@ -72,8 +159,11 @@ class TestInstall(object):
     HOME_DIR = "./baz/qux"
 
     def test_without_args(self, argparser):
-        with pytest.raises(SystemExit):
-            argparser.parse_args(['install'])
+        # URL can be omitted if installing from bundle,
+        # so it's the command handler that reports the error
+        args = argparser.parse_args(['install'])
+        assert args.remote_url is None
+        assert args.bundle_file is None
 
     def test_with_url_arg(self, argparser):
         args = argparser.parse_args(['install', self.URL])
@@ -99,6 +189,18 @@ class TestInstall(object):
         assert args.repo_dir == self.REPO_DIR
         assert args.home_dir == self.HOME_DIR
 
+    def test_with_bundle_arg(self, argparser):
+        args = argparser.parse_args(['install', '--from-bundle', './foo'])
+        assert args.remote_url is None
+        assert args.bundle_file == './foo'
+
+    def test_with_url_and_profile_args(self, argparser):
+        args = argparser.parse_args(
+            ['install', self.URL, '--profile', 'foo'])
+
+        assert args.remote_url == self.URL
+        assert args.profile == 'foo'
+
 
 class TestRm(object):
 
@@ -113,9 +215,133 @@ class TestRm(object):
         assert args.filepath == self.FILEPATH
 
     def test_with_all_args(self, argparser, git_repo):
-        args = argparser.parse_args(['rm', self.FILEPATH, git_repo.working_dir])
+        args = argparser.parse_args(
+            ['rm', self.FILEPATH, git_repo.working_dir, '-n'])
         assert args.filepath == self.FILEPATH
         assert args.repo.dir == git_repo.working_dir
+        assert args.dry_run
+
+
+class TestSwitch(object):
+
+    def test_without_args(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['switch'])
+
+    def test_with_profile_arg(self, argparser):
+        args = argparser.parse_args(['switch', 'foo'])
+        assert args.profile == 'foo'
+        assert not args.dry_run
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(
+            ['switch', 'foo', git_repo.working_dir, '--dry-run'])
+        assert args.profile == 'foo'
+        assert args.repo.dir == git_repo.working_dir
+        assert args.dry_run
+
+
+class TestRelocate(object):
+
+    def test_without_args(self, argparser):
+        args = argparser.parse_args(['relocate'])
+        assert args.repo_dir is None
+        assert args.home_dir is None
+        assert args.relative is None
+
+    def test_with_relative_and_absolute_args(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['relocate', '--relative', '--absolute'])
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(
+            ['relocate', git_repo.working_dir, '--to', './foo',
+             '--home', './bar', '--absolute'])
+        assert args.repo.dir == git_repo.working_dir
+        assert args.repo_dir == './foo'
+        assert args.home_dir == './bar'
+        assert args.relative is False
+
+
+class TestBundle(object):
+
+    def test_without_args(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['bundle'])
+
+    def test_with_invalid_action(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['bundle', 'destroy', './foo'])
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(
+            ['bundle', 'create', './foo', git_repo.working_dir])
+        assert args.action == 'create'
+        assert args.bundle_file == './foo'
+        assert args.repo.dir == git_repo.working_dir
+
+
+class TestCompletion(object):
+
+    def test_without_args(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['completion'])
+
+    def test_with_invalid_shell(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['completion', 'cmd.exe'])
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(
+            ['completion', 'zsh', git_repo.working_dir])
+        assert args.shell == 'zsh'
+        assert args.repo.dir == git_repo.working_dir
+
+
+class TestList(object):
+
+    def test_without_args(self, argparser):
+        args = argparser.parse_args(['list'])
+        assert args.pattern is None
+        assert args.modified_since is None
+        assert not args.output_json
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(
+            ['list', '.config/*', git_repo.working_dir, '--link-type',
+             'hardlink', '--tag', 'work', '--profile', 'home',
+             '--modified-since', '1500000000', '--json'])
+        assert args.pattern == '.config/*'
+        assert args.repo.dir == git_repo.working_dir
+        assert args.link_type == 'hardlink'
+        assert args.tag == 'work'
+        assert args.profile == 'home'
+        assert args.modified_since == 1500000000
+        assert args.output_json
+
+    def test_with_date(self, argparser):
+        args = argparser.parse_args(['list', '--modified-since', '2017-07-14'])
+        assert args.modified_since == time.mktime((2017, 7, 14, 0, 0, 0,
+                                                   0, 0, -1))
+
+    def test_with_invalid_date(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['list', '--modified-since', 'yesterday'])
+
+    def test_with_invalid_link_type(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['list', '--link-type', 'softlink'])
+
+
+class TestServer(object):
+
+    def test_without_args(self, argparser):
+        args = argparser.parse_args(['server'])
+        assert args.socket_path is None
+
+    def test_with_socket_arg(self, argparser):
+        args = argparser.parse_args(['server', '--socket', '/tmp/foo.sock'])
+        assert args.socket_path == '/tmp/foo.sock'
 
 
 class TestSync(object):
@@ -135,6 +361,49 @@ class TestSync(object):
         assert args.repo.dir == git_repo.working_dir
 
 
+class TestRemote(object):
+
+    URL = "file:///tmp/foo"
+
+    def test_without_args(self, argparser):
+        args = argparser.parse_args(['remote'])
+        assert args.action == 'list'
+
+    def test_with_invalid_action(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['remote', 'rename', 'backup'])
+
+    def test_with_invalid_role(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['remote', 'add', 'backup', self.URL,
+                                  '--role', 'fetch'])
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(['remote', 'add', 'backup', self.URL,
+                                     '--role', 'push',
+                                     '--repo', git_repo.working_dir])
+        assert args.action == 'add'
+        assert args.name == 'backup'
+        assert args.remote_url == self.URL
+        assert args.role == 'push'
+        assert args.repo.dir == git_repo.working_dir
+
+
+class TestWhich(object):
+
+    FILEPATH = "./.foobar"
+
+    def test_without_args(self, argparser):
+        with pytest.raises(SystemExit):
+            argparser.parse_args(['which'])
+
+    def test_with_all_args(self, argparser, git_repo):
+        args = argparser.parse_args(
+            ['which', self.FILEPATH, git_repo.working_dir])
+        assert args.filepath == self.FILEPATH
+        assert args.repo.dir == git_repo.working_dir
+
+
 # Fixtures / resources
 
 @pytest.fixture
@@ -0,0 +1,73 @@
+"""
+Tests for shell completion of dotfile paths.
+"""
+import os
+import subprocess
+from distutils.spawn import find_executable
+
+import pytest
+
+from moredots import completion
+
+from tests.conftest import dotfile_in_home
+
+
+class TestCompletionCache(object):
+
+    def test_written_on_add(self, empty_repo, home_dir):
+        for name in ('.zshrc', '.bashrc', '.vimrc'):
+            empty_repo.add(dotfile_in_home(home_dir, name))
+
+        assert read_cache(empty_repo) == ['.bashrc', '.vimrc', '.zshrc']
+
+    def test_written_on_remove(self, empty_repo, home_dir):
+        for name in ('.bashrc', '.vimrc'):
+            empty_repo.add(dotfile_in_home(home_dir, name))
+        empty_repo.remove('.vimrc')
+
+        assert read_cache(empty_repo) == ['.bashrc']
+
+    def test_written_on_install(self, empty_repo, home_dir):
+        empty_repo.add(dotfile_in_home(home_dir, '.bashrc'))
+        os.unlink(empty_repo.inventory.completion_file)
+
+        empty_repo._install_dotfiles()
+        assert read_cache(empty_repo) == ['.bashrc']
+
+
+class TestScript(object):
+
+    @pytest.mark.parametrize('shell', sorted(completion.SHELLS))
+    def test_script(self, empty_repo, shell):
+        script = completion.script(shell, empty_repo, ['add', 'rm'])
+        assert empty_repo.inventory.completion_file in script
+        assert 'add rm' in script
+
+    @pytest.mark.skipif(not find_executable('bash'), reason="requires bash")
+    def test_bash_completes_dotfiles(self, empty_repo, home_dir):
+        for name in ('.vimrc', '.viminfo', '.bashrc'):
+            empty_repo.add(dotfile_in_home(home_dir, name))
+        script = completion.script('bash', empty_repo, ['add', 'rm'])
+
+        assert complete_bash(script, ['mdots', 'rm', '.vi']) == \
+            ['.viminfo', '.vimrc']
+        assert complete_bash(script, ['mdots', 'r']) == ['rm']
+
+
+# Utility functions
+
+def read_cache(repo):
+    with open(repo.inventory.completion_file) as f:
+        return f.read().splitlines()
+
+
+def complete_bash(script, words):
+    """Runs bash completion function from given script for given words."""
+    command = script + "\n".join((
+        "COMP_WORDS=(%s)" % " ".join("'%s'" % word for word in words),
+        "COMP_CWORD=%d" % (len(words) - 1),
+        "_mdots",
+        'printf "%s\\n" "${COMPREPLY[@]}"',
+    ))
+    output = subprocess.check_output(['bash', '-c', command])
+    return output.splitlines()
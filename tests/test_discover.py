@@ -0,0 +1,80 @@
+"""
+Tests for discovering untracked dotfiles.
+"""
+import errno
+import os
+
+from moredots import discover as discover_module
+from moredots.discover import discover
+
+
+class TestDiscover(object):
+
+    def test_empty_home(self, empty_repo):
+        assert discover(empty_repo) == []
+
+    def test_untracked_file(self, empty_repo, home_dir, dotfile_in_home):
+        candidates = discover(empty_repo)
+
+        assert [c.path for c in candidates] == [
+            os.path.relpath(dotfile_in_home, start=home_dir)]
+        assert not candidates[0].is_dir
+        assert candidates[0].size == os.path.getsize(dotfile_in_home)
+
+    def test_untracked_dotdir(self, empty_repo, home_dir, dotdir_file_in_home):
+        candidates = discover(empty_repo)
+
+        assert len(candidates) == 1
+        assert candidates[0].is_dir
+        assert candidates[0].files == 1
+        assert candidates[0].complete
+
+    def test_tracked_files(self, filled_repo):
+        assert discover(filled_repo) == []
+
+    def test_tracked_hardlink(self, empty_repo, dotfile_in_home):
+        empty_repo.add(dotfile_in_home, hardlink=True)
+        assert discover(empty_repo) == []
+
+    def test_ignored_by_default(self, empty_repo, home_dir):
+        os.makedirs(os.path.join(home_dir, '.cache', 'foo'))
+        assert discover(empty_repo) == []
+
+    def test_ignored_explicitly(self, empty_repo, home_dir, dotfile_in_home):
+        name = os.path.basename(dotfile_in_home)
+        assert discover(empty_repo, ignore=[name]) == []
+
+    def test_max_depth(self, empty_repo, home_dir):
+        deep_dir = os.path.join(home_dir, '.deep', 'a', 'b', 'c')
+        os.makedirs(deep_dir)
+        with open(os.path.join(deep_dir, 'file'), 'w') as f:
+            f.write("deep")
+
+        candidate, = discover(empty_repo, max_depth=2)
+        assert candidate.files == 0
+        assert not candidate.complete
+
+    def test_time_budget(self, empty_repo, dotdir_file_in_home):
+        candidate, = discover(empty_repo, time_budget=-1)
+        assert not candidate.complete
+
+    def test_vanished_entry(self, empty_repo, home_dir, monkeypatch):
+        dotdir = os.path.join(home_dir, '.dir')
+        os.mkdir(dotdir)
+        for name in ('a', 'b', 'c'):
+            with open(os.path.join(dotdir, name), 'w') as f:
+                f.write(name)
+
+        # simulate 'b' being deleted right after the directory is listed
+        lstat = os.lstat
+
+        def vanishing_lstat(path):
+            if path == os.path.join(dotdir, 'b'):
+                raise OSError(errno.ENOENT, "No such file or directory")
+            return lstat(path)
+        monkeypatch.setattr(discover_module, 'scandir', None)
+        monkeypatch.setattr(os, 'lstat', vanishing_lstat)
+
+        candidate, = discover(empty_repo)
+        assert candidate.files == 2
+        assert candidate.complete
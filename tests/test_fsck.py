@@ -0,0 +1,122 @@
+"""
+Tests for consistency checks of dotfile repositories.
+"""
+import os
+
+from moredots import fsck
+
+
+class TestCheck(object):
+
+    def test_empty_repo(self, empty_repo):
+        assert fsck.check(empty_repo) == []
+
+    def test_filled_repo(self, filled_repo):
+        assert fsck.check(filled_repo) == []
+
+    def test_missing_link(self, filled_repo):
+        dotfile = next(filled_repo.dotfiles)
+        os.unlink(dotfile.home_path)
+        assert kinds(fsck.check(filled_repo)) == [fsck.MISSING_LINK]
+
+    def test_broken_link(self, filled_repo, tmpdir):
+        dotfile = next(filled_repo.dotfiles)
+        os.unlink(dotfile.home_path)
+        os.symlink(str(tmpdir.join('nonexistent')), dotfile.home_path)
+        assert kinds(fsck.check(filled_repo)) == [fsck.BROKEN_LINK]
+
+    def test_wrong_link_type(self, filled_repo):
+        dotfile = next(filled_repo.dotfiles)
+        os.unlink(dotfile.home_path)
+        open(dotfile.home_path, 'w').close()
+        assert kinds(fsck.check(filled_repo)) == [fsck.WRONG_LINK_TYPE]
+
+    def test_missing_file(self, filled_repo):
+        dotfile = next(filled_repo.dotfiles)
+        os.unlink(dotfile.repo_path)
+        assert set(kinds(fsck.check(filled_repo))) == set([
+            fsck.MISSING_FILE, fsck.DELETED])
+
+    def test_untracked_file(self, filled_repo):
+        with open(os.path.join(filled_repo.dir, 'untracked'), 'w') as f:
+            f.write("untracked")
+        assert set(kinds(fsck.check(filled_repo))) == set([
+            fsck.UNTRACKED_FILE, fsck.MISSING_LINK, fsck.NOT_INDEXED])
+
+    def test_other_profile(self, empty_repo, home_dir):
+        repo = empty_repo
+        for name, tags in (('.server', ['server']),
+                           ('.workstation', ['workstation'])):
+            path = os.path.join(home_dir, name)
+            with open(path, 'w') as f:
+                f.write(name)
+            repo.add(path, tags=tags)
+        repo.switch('server')
+
+        assert fsck.check(repo) == []
+        assert fsck.repair(repo, fsck.check(repo)) == []
+        assert not os.path.lexists(os.path.join(home_dir, '.workstation'))
+
+
+class TestRepair(object):
+
+    def test_repair_links(self, filled_repo, tmpdir):
+        repo = filled_repo
+        dotfiles = list(repo.dotfiles)
+        os.unlink(dotfiles[0].home_path)
+        os.unlink(dotfiles[-1].home_path)
+        os.symlink(str(tmpdir.join('nonexistent')), dotfiles[-1].home_path)
+
+        problems = fsck.check(repo)
+        assert fsck.repair(repo, problems) == problems
+        assert fsck.check(repo) == []
+
+    def test_repair_untracked_file(self, filled_repo):
+        repo = filled_repo
+        with open(os.path.join(repo.dir, 'untracked'), 'w') as f:
+            f.write("untracked")
+
+        fsck.repair(repo, fsck.check(repo))
+
+        assert '.untracked' in repo.inventory
+        assert fsck.check(repo) == []
+
+    def test_repair_missing_file(self, filled_repo):
+        repo = filled_repo
+        dotfile = next(repo.dotfiles)
+        os.unlink(dotfile.repo_path)
+
+        fsck.repair(repo, fsck.check(repo))
+
+        assert dotfile.path not in repo.inventory
+        assert fsck.check(repo) == []
+
+    def test_repair_holds_lock(self, filled_repo, monkeypatch):
+        repo = filled_repo
+        os.unlink(next(repo.dotfiles).repo_path)
+        observed = []
+        commit = repo.commit
+        monkeypatch.setattr(repo, 'commit', lambda *args, **kwargs: (
+            observed.append(repo.lock.locked), commit(*args, **kwargs)))
+
+        fsck.repair(repo, fsck.check(repo))
+
+        assert observed == [True]
+        assert not repo.lock.locked
+
+    def test_repair_keeps_real_files(self, filled_repo):
+        repo = filled_repo
+        dotfile = next(repo.dotfiles)
+        os.unlink(dotfile.home_path)
+        with open(dotfile.home_path, 'w') as f:
+            f.write("precious")
+
+        assert fsck.repair(repo, fsck.check(repo)) == []
+        with open(dotfile.home_path) as f:
+            assert f.read() == "precious"
+
+
+# Utility functions
+
+def kinds(problems):
+    return [problem.kind for problem in problems]
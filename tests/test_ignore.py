@@ -0,0 +1,109 @@
+"""
+Tests for the :class:`IgnoreRules` class and its use in :class:`DotfileRepo`.
+"""
+import os
+
+import pytest
+
+from moredots import exc
+from moredots.ignore import IgnoreRules, IGNORE_FILE
+from moredots.repo import DotfileRepo
+
+
+class TestIgnoreRules(object):
+
+    def test_empty(self):
+        rules = IgnoreRules()
+        assert not rules
+        assert not rules.match('.foo')
+
+    def test_comments_and_blank_lines(self):
+        rules = IgnoreRules(['# comment', '', '   '])
+        assert not rules
+
+    def test_literal_name(self):
+        rules = IgnoreRules(['.netrwhist'])
+        assert rules.match('.netrwhist')
+        assert rules.match('.vim/.netrwhist')
+        assert not rules.match('.vim/netrwhist')
+
+    def test_literal_path(self):
+        rules = IgnoreRules(['.config/foo'])
+        assert rules.match('.config/foo')
+        assert rules.match('.config/foo/bar')
+        assert not rules.match('.other/.config/foo')
+
+    def test_anchored_name(self):
+        rules = IgnoreRules(['/.foo'])
+        assert rules.match('.foo')
+        assert not rules.match('.bar/.foo')
+
+    def test_directory_only(self):
+        rules = IgnoreRules(['cache/'])
+        assert rules.match('.app/cache', is_dir=True)
+        assert rules.match('.app/cache/file')
+        assert not rules.match('.app/cache')
+
+    def test_glob(self):
+        rules = IgnoreRules(['*.swp'])
+        assert rules.match('.foo.swp')
+        assert rules.match('.vim/foo.swp')
+        assert not rules.match('.vim/foo.swo')
+
+    def test_glob_star_doesnt_match_slash(self):
+        rules = IgnoreRules(['.config/*/secret'])
+        assert rules.match('.config/app/secret')
+        assert not rules.match('.config/app/sub/secret')
+
+    def test_glob_double_star(self):
+        rules = IgnoreRules(['.config/**/secret'])
+        assert rules.match('.config/secret')
+        assert rules.match('.config/app/sub/secret')
+
+    def test_negation(self):
+        rules = IgnoreRules(['*.log', '!keep.log'])
+        assert rules.match('.app/debug.log')
+        assert not rules.match('.app/keep.log')
+
+    def test_load_nonexistent(self, tmpdir):
+        assert not IgnoreRules.load(str(tmpdir.join(IGNORE_FILE)))
+
+
+class TestRepoIgnore(object):
+
+    def test_add_ignored_file(self, ignoring_repo, home_dir):
+        path = os.path.join(home_dir, '.foo.swp')
+        open(path, 'w').close()
+
+        with pytest.raises(exc.IgnoredDotfileError):
+            ignoring_repo.add(path)
+
+    def test_add_dotdir_skips_ignored(self, ignoring_repo, home_dir,
+                                      dotdir_file_in_home):
+        repo = ignoring_repo
+        dotdir = os.path.dirname(dotdir_file_in_home)
+        open(os.path.join(dotdir, 'file.swp'), 'w').close()
+
+        top_dotdir = os.path.relpath(dotdir, start=home_dir).split(os.sep)[0]
+        repo.add(os.path.join(home_dir, top_dotdir))
+
+        indexed = [path for path, _ in repo.git_repo.index.entries]
+        assert not any(path.endswith('.swp') for path in indexed)
+        assert any(path.endswith(os.path.basename(dotdir_file_in_home))
+                   for path in indexed)
+
+    def test_dotfiles_skip_ignored(self, ignoring_repo):
+        repo = ignoring_repo
+        open(os.path.join(repo.dir, 'foo.swp'), 'w').close()
+        assert list(repo.dotfiles) == []
+
+
+# Fixtures / resources
+
+@pytest.fixture
+def ignoring_repo(repo_dir, home_dir):
+    """Empty moredots repository with .mdotsignore file."""
+    DotfileRepo.init(repo_dir, home_dir)
+    with open(os.path.join(repo_dir, IGNORE_FILE), 'w') as f:
+        f.write("*.swp\n")
+    return DotfileRepo(repo_dir)
@@ -0,0 +1,60 @@
+"""
+Tests for the :class:`ReverseIndex` class.
+"""
+import os
+
+from moredots.index import ReverseIndex
+from moredots.repo import DotfileRepo
+
+
+class TestReverseIndex(object):
+
+    def test_empty(self, empty_repo, dotfile_in_home):
+        assert len(empty_repo.reverse_index) == 0
+        assert empty_repo.reverse_index.lookup(dotfile_in_home) is None
+
+    def test_lookup_after_add(self, empty_repo, home_dir, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home)
+
+        path = os.path.relpath(dotfile_in_home, start=home_dir)
+        assert repo.reverse_index.lookup(dotfile_in_home) == path
+
+    def test_lookup_after_remove(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home)
+        repo.remove(dotfile_in_home)
+        assert repo.reverse_index.lookup(dotfile_in_home) is None
+
+    def test_lookup_by_inode(self, empty_repo, tmpdir, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, hardlink=True)
+
+        # another hardlink to the same file, outside of $HOME
+        other_path = str(tmpdir.join('other'))
+        os.link(dotfile_in_home, other_path)
+
+        assert repo.reverse_index.lookup(other_path) is not None
+
+    def test_lookup_inside_folded_dotdir(self, empty_repo, home_dir,
+                                         dotdir_file_in_home):
+        repo = empty_repo
+        relative_path = os.path.relpath(dotdir_file_in_home, start=home_dir)
+        repo.add(os.path.join(home_dir, relative_path.split(os.path.sep)[0]))
+
+        assert repo.reverse_index.lookup(dotdir_file_in_home) == relative_path
+
+    def test_persisted(self, empty_repo, dotfile_in_home):
+        empty_repo.add(dotfile_in_home)
+
+        index = ReverseIndex(DotfileRepo(empty_repo.dir))
+        assert len(index) == 1
+        assert dotfile_in_home in index
+
+    def test_install_builds_index(self, filled_remote_url, repo_dir,
+                                  home_dir):
+        repo = DotfileRepo.install(filled_remote_url, repo_dir, home_dir)
+
+        assert len(repo.reverse_index) == len(list(repo.dotfiles))
+        for dotfile in repo.dotfiles:
+            assert repo.reverse_index.lookup(dotfile.home_path) == dotfile.path
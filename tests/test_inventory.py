@@ -99,6 +99,25 @@ class TestInventory(object):
         assert count_before == len(lines) + 1
         assert not any(line.startswith(dotfile_in_inventory) for line in lines)
 
+    def test_with_prefix(self, empty_inventory):
+        for path in ('.vimrc', '.config/b', '.config/a', '.configure', '.zsh'):
+            empty_inventory.add(path)
+
+        assert [e.path for e in empty_inventory.with_prefix('.config')] == \
+            ['.config/a', '.config/b', '.configure']
+        assert [e.path for e in empty_inventory.with_prefix('.config/')] == \
+            ['.config/a', '.config/b']
+        assert not list(empty_inventory.with_prefix('.x'))
+
+    def test_with_prefix_after_changes(self, empty_inventory):
+        empty_inventory.add('.vimrc')
+        assert len(list(empty_inventory.with_prefix(''))) == 1
+
+        empty_inventory.add('.viminfo')
+        empty_inventory.remove('.vimrc')
+        assert [e.path for e in empty_inventory.with_prefix('.vim')] == \
+            ['.viminfo']
+
 
 class TestInventoryEntry(object):
 
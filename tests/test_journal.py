@@ -0,0 +1,66 @@
+"""
+Tests for the :class:`Journal` of applied plans.
+"""
+import os
+
+from moredots.plan import Plan, MKDIR, LINK
+
+
+class TestJournal(object):
+
+    def test_not_pending(self, empty_repo):
+        assert not empty_repo.journal.pending
+
+    def test_finished_plan(self, empty_repo, tmpdir):
+        journal = empty_repo.journal
+        plan = Plan()
+        plan.add(MKDIR, str(tmpdir.join('dir')))
+        plan.apply(journal=journal)
+
+        assert not journal.pending
+        assert os.path.isdir(str(tmpdir.join('dir')))
+
+    def test_load_remaining_steps(self, empty_repo, tmpdir):
+        journal = empty_repo.journal
+        plan = sample_plan(tmpdir)
+
+        journal.start(plan.steps)
+        journal.done(0)
+        journal.done(2)
+
+        assert journal.pending
+        assert journal.load().steps == [plan.steps[1]]
+
+    def test_load_ignores_partial_line(self, empty_repo, tmpdir):
+        journal = empty_repo.journal
+        plan = sample_plan(tmpdir)
+
+        journal.start(plan.steps)
+        journal.done(0)
+        with open(journal.file, 'a') as f:
+            f.write("do")
+
+        assert journal.load().steps == plan.steps[1:]
+
+    def test_resume(self, empty_repo, tmpdir):
+        journal = empty_repo.journal
+        plan = sample_plan(tmpdir)
+        journal.start(plan.steps)
+        journal.done(0)
+
+        remaining = journal.load()
+        remaining.apply(journal=journal)
+
+        assert not journal.pending
+        assert not os.path.exists(str(tmpdir.join('a')))  # step 0 skipped
+        assert os.path.islink(str(tmpdir.join('b')))
+
+
+# Utility functions
+
+def sample_plan(tmpdir):
+    target = str(tmpdir.join('target'))
+    plan = Plan()
+    for name in ('a', 'b', 'c'):
+        plan.add(LINK, str(tmpdir.join(name)), target)
+    return plan
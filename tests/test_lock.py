@@ -0,0 +1,56 @@
+"""
+Tests for the :class:`RepoLock` of dotfile repository.
+"""
+import os
+
+from moredots.lock import RepoLock
+from moredots.repo import DotfileRepo
+
+
+class TestRepoLock(object):
+
+    def test_acquire_release(self, empty_repo):
+        lock = empty_repo.lock
+        assert lock.acquire()
+        assert lock.locked
+        assert os.path.exists(lock.file)
+
+        lock.release()
+        assert not lock.locked
+
+    def test_reentrant(self, empty_repo):
+        with empty_repo.lock:
+            with empty_repo.lock:
+                assert empty_repo.lock.locked
+            assert empty_repo.lock.locked
+        assert not empty_repo.lock.locked
+
+    def test_excludes_other_repo_objects(self, empty_repo):
+        # separate objects lock the same file independently,
+        # just like separate processes do
+        other_lock = RepoLock(DotfileRepo(empty_repo.dir))
+
+        with empty_repo.lock:
+            assert not other_lock.acquire(blocking=False)
+        assert other_lock.acquire(blocking=False)
+        other_lock.release()
+
+    def test_held_by_modifying_methods(self, empty_repo, monkeypatch):
+        observed = []
+        monkeypatch.setattr(empty_repo, '_install_dotfiles',
+                            lambda: observed.append(empty_repo.lock.locked))
+
+        empty_repo.relocate()
+        assert observed == [True]
+        assert not empty_repo.lock.locked
+
+    def test_operations_use_separate_backup_dirs(self, empty_repo, home_dir):
+        path = os.path.join(home_dir, '.foo')
+        backups = []
+        for _ in xrange(2):
+            with empty_repo.lock:
+                backups.append(empty_repo._backup_path(path))
+                with empty_repo.lock:  # same operation
+                    assert empty_repo._backup_path(path) == backups[-1]
+
+        assert backups[0] != backups[1]
@@ -0,0 +1,80 @@
+"""
+Tests for the :class:`Maintenance` schedule of dotfile repository.
+"""
+import os
+import time
+
+import pytest
+
+from moredots.maintenance import Maintenance
+
+from tests.conftest import dotfile_in_home
+
+
+class TestMaintenance(object):
+
+    def test_not_due_initially(self, maintenance):
+        assert not maintenance.is_due()
+
+    def test_due_after_commits(self, maintenance):
+        maintenance.repo.set_config('maintenancecommits', 2)
+        assert not maintenance.note_commit()
+        assert not maintenance.is_due()
+
+        maintenance._save({'commits': 2})
+        assert maintenance.is_due()
+
+    def test_due_with_loose_objects(self, maintenance):
+        maintenance.repo.set_config('maintenancelooseobjects', 1)
+        sample_dir = os.path.join(maintenance.repo.git_repo.git_dir,
+                                  'objects', '17')
+        if not os.path.isdir(sample_dir):
+            os.mkdir(sample_dir)
+        open(os.path.join(sample_dir, '0' * 38), 'w').close()
+
+        assert maintenance.loose_objects() >= 256
+        assert maintenance.is_due()
+
+    def test_rate_limited(self, maintenance):
+        maintenance.repo.set_config('maintenancecommits', 1)
+        maintenance.run(wait=True)
+        maintenance.note_commit()
+        assert not maintenance.is_due()
+
+        maintenance._save({'last_run': time.time() - 3600, 'commits': 1})
+        assert not maintenance.is_due()
+        maintenance.repo.set_config('maintenanceinterval', 60)
+        assert maintenance.is_due()
+
+    def test_disabled(self, maintenance):
+        maintenance.repo.set_config('maintenancecommits', 1)
+        maintenance.repo.set_config('maintenance', 'false')
+        maintenance.note_commit()
+        assert not maintenance.is_due()
+
+    def test_run(self, maintenance, home_dir):
+        repo = maintenance.repo
+        for i in xrange(3):
+            repo.add(dotfile_in_home(home_dir, '.file%d' % i))
+
+        maintenance.run(wait=True)
+
+        assert maintenance._load()['commits'] == 0
+        objects = repo.git_repo.git.count_objects('-v')
+        assert 'count: 0' in objects.splitlines()
+
+    def test_scheduled_by_commit(self, maintenance, home_dir):
+        repo = maintenance.repo
+        repo.set_config('maintenancecommits', 1)
+        repo.add(dotfile_in_home(home_dir, '.file'))
+
+        assert maintenance._load()['commits'] == 0
+        assert not maintenance.is_due()
+
+
+# Fixtures
+
+@pytest.fixture
+def maintenance(empty_repo):
+    """Maintenance schedule of an empty repository."""
+    return Maintenance(empty_repo)
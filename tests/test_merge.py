@@ -0,0 +1,95 @@
+"""
+Tests for the merge driver of inventory file.
+"""
+from moredots.merge import main, merge
+
+
+class TestMerge(object):
+
+    def test_unrelated_additions(self):
+        base = [".a:hardlink=False\n"]
+        ours = base + [".b:hardlink=False\n"]
+        theirs = [".0:hardlink=True\n"] + base
+
+        lines, conflicts = merge(base, ours, theirs)
+
+        assert conflicts == []
+        assert lines == [".0:hardlink=True", ".a:hardlink=False",
+                         ".b:hardlink=False"]
+
+    def test_removal(self):
+        base = [".a:hardlink=False\n", ".b:hardlink=False\n"]
+        ours = [".a:hardlink=False\n"]
+
+        assert merge(base, ours, base) == ([".a:hardlink=False"], [])
+        assert merge(base, base, ours) == ([".a:hardlink=False"], [])
+
+    def test_different_fields(self):
+        base = [".a:hardlink=False\n"]
+        ours = [".a:hardlink=False:tags=work\n"]
+        theirs = [".a:hardlink=True\n"]
+
+        lines, conflicts = merge(base, ours, theirs)
+
+        assert conflicts == []
+        assert lines == [".a:hardlink=True:tags=work"]
+
+    def test_same_change(self):
+        base = []
+        ours = theirs = [".a:hardlink=True\n"]
+        assert merge(base, ours, theirs) == ([".a:hardlink=True"], [])
+
+    def test_conflicting_change(self):
+        base = [".a:tags=home\n", ".b:hardlink=False\n"]
+        ours = [".a:tags=work\n", ".b:hardlink=False\n", ".c:hardlink=False\n"]
+        theirs = [".a:tags=laptop\n", ".b:hardlink=False\n"]
+
+        lines, conflicts = merge(base, ours, theirs)
+
+        assert conflicts == ['.a']
+        assert lines == ["<<<<<<< ours", ".a:tags=work", "=======",
+                         ".a:tags=laptop", ">>>>>>> theirs",
+                         ".b:hardlink=False", ".c:hardlink=False"]
+
+    def test_removed_and_changed(self):
+        base = [".a:tags=home\n"]
+        ours = []
+        theirs = [".a:tags=work\n"]
+
+        lines, conflicts = merge(base, ours, theirs)
+
+        assert conflicts == ['.a']
+        assert lines == ["<<<<<<< ours", "=======", ".a:tags=work",
+                         ">>>>>>> theirs"]
+
+
+class TestMain(object):
+
+    def test_clean(self, tmpdir):
+        base, ours, theirs = inventory_files(
+            tmpdir, "", ".a:hardlink=False\n", ".b:hardlink=True\n")
+        assert main([base, ours, theirs]) == 0
+        with open(ours) as f:
+            assert f.read() == ".a:hardlink=False\n.b:hardlink=True\n"
+
+    def test_conflict(self, tmpdir):
+        base, ours, theirs = inventory_files(
+            tmpdir, ".a:tags=x\n", ".a:tags=y\n", ".a:tags=z\n")
+        assert main([base, ours, theirs]) == 1
+        with open(ours) as f:
+            assert f.read().startswith("<<<<<<< ours\n")
+
+    def test_wrong_arguments(self):
+        assert main([]) == 2
+
+
+# Utility functions
+
+def inventory_files(tmpdir, *contents):
+    """Writes versions of inventory into files."""
+    paths = []
+    for name, content in zip(('base', 'ours', 'theirs'), contents):
+        path = tmpdir.join(name)
+        path.write(content)
+        paths.append(str(path))
+    return paths
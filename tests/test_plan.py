@@ -0,0 +1,118 @@
+"""
+Tests for the :class:`Plan` of changes to the filesystem.
+"""
+import os
+
+import pytest
+
+from moredots.plan import (Plan, MKDIR, RMDIR, MOVE, LINK, UNLINK, SKIP,
+                           BACKUP, _waves)
+
+
+class TestPlan(object):
+
+    def test_empty(self):
+        plan = Plan()
+        assert len(plan) == 0
+        assert not plan
+        plan.apply()
+
+    def test_only_skips(self, tmpdir):
+        plan = Plan()
+        plan.add(SKIP, str(tmpdir.join('foo')), reason="whatever")
+        assert len(plan) == 1
+        assert not plan
+
+    def test_planned_state(self, tmpdir):
+        directory = str(tmpdir.join('dir'))
+        link = os.path.join(directory, 'link')
+        plan = Plan()
+
+        assert not plan.lexists(directory)
+        plan.add(MKDIR, directory)
+        assert plan.isdir(directory)
+        plan.add(LINK, link, str(tmpdir.join('target')))
+        assert plan.islink(link)
+        assert plan.listdir(directory) == ['link']
+
+        # nothing has been changed yet
+        assert not os.path.exists(directory)
+
+    def test_replaced_directory_hides_contents(self, tmpdir):
+        directory = tmpdir.mkdir('dir')
+        directory.join('file').write("foo")
+        plan = Plan()
+
+        plan.add(MOVE, str(directory), str(tmpdir.join('moved')))
+        plan.add(MKDIR, str(directory))
+        assert plan.listdir(str(directory)) == []
+
+    def test_apply(self, tmpdir):
+        target = tmpdir.join('target')
+        target.write("foo")
+        old_file = tmpdir.join('old')
+        old_file.write("old")
+        directory = str(tmpdir.join('a', 'b'))
+
+        plan = Plan()
+        plan.add(MKDIR, directory)
+        plan.add(LINK, os.path.join(directory, 'link'), str(target))
+        plan.add(LINK, str(old_file), str(target), 'hardlink')
+        plan.apply()
+
+        assert os.readlink(os.path.join(directory, 'link')) == str(target)
+        assert os.path.samefile(str(old_file), str(target))
+
+    def test_backup_never_overwrites(self, tmpdir):
+        displaced = tmpdir.join('displaced')
+        displaced.write("new")
+        backup = tmpdir.mkdir('backup').join('displaced')
+        backup.write("old")
+
+        plan = Plan()
+        plan.add(BACKUP, str(displaced), str(backup))
+        with pytest.raises(OSError):
+            plan.apply()
+
+        assert backup.read() == "old"
+        assert displaced.read() == "new"
+
+    def test_apply_keeps_order_of_dependent_steps(self, tmpdir):
+        directory = str(tmpdir.join('dir'))
+        files = [os.path.join(directory, str(i)) for i in range(32)]
+        target = tmpdir.join('target')
+        target.write("foo")
+
+        plan = Plan()
+        plan.add(MKDIR, directory)
+        for path in files:
+            plan.add(LINK, path, str(target))
+        for path in files:
+            plan.add(UNLINK, path)
+        plan.add(RMDIR, directory)
+        plan.apply()
+
+        assert not os.path.exists(directory)
+
+    def test_independent_steps_run_together(self, tmpdir):
+        target = str(tmpdir.join('target'))
+        plan = Plan()
+        plan.add(MKDIR, str(tmpdir.join('dir')))
+        for i in range(4):
+            plan.add(LINK, str(tmpdir.join('dir', str(i))), target)
+
+        waves = _waves(plan.steps)
+        assert len(waves) == 2
+        assert [plan.steps[i].action for i in waves[0]] == [MKDIR]
+        assert len(waves[1]) == 4
+
+    def test_format(self, tmpdir):
+        plan = Plan()
+        plan.add(MKDIR, str(tmpdir.join('dir')))
+        plan.add(LINK, str(tmpdir.join('link')), str(tmpdir.join('foo')),
+                 'hardlink')
+
+        lines = plan.format().splitlines()
+        assert len(lines) == 2
+        assert lines[0].startswith(MKDIR)
+        assert lines[1].endswith("(hardlink)")
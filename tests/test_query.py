@@ -0,0 +1,71 @@
+"""
+Tests for querying the inventory of dotfile repository.
+"""
+import os
+import time
+
+import pytest
+
+from moredots.query import query
+
+from tests.conftest import dotfile_in_home
+
+
+class TestQuery(object):
+
+    def test_all(self, repo):
+        assert paths(query(repo)) == ['.bashrc', '.config/app/a',
+                                      '.config/app/b', '.vimrc']
+
+    def test_prefix(self, repo):
+        assert paths(query(repo, '.config/')) == ['.config/app/a',
+                                                  '.config/app/b']
+
+    def test_glob(self, repo):
+        assert paths(query(repo, '*rc')) == ['.bashrc', '.vimrc']
+        assert paths(query(repo, '.config/*/b')) == ['.config/app/b']
+
+    def test_link_type(self, repo):
+        assert paths(query(repo, link_type='hardlink')) == ['.vimrc']
+
+    def test_tag(self, repo):
+        assert paths(query(repo, tag='work')) == ['.bashrc']
+
+    def test_profile(self, repo):
+        assert paths(query(repo, profile='home')) == ['.config/app/a',
+                                                      '.config/app/b',
+                                                      '.vimrc']
+
+    def test_modified_since(self, repo):
+        old_time = time.time() - 3600
+        path = repo.dotfile('.config/app/a').repo_path
+        os.utime(path, (old_time, old_time))
+
+        assert paths(query(repo, '.config/',
+                           modified_since=old_time + 60)) == ['.config/app/b']
+
+    def test_listing(self, repo):
+        listing = next(query(repo, '.bashrc'))
+        assert listing.link_type == 'symlink'
+        assert listing.tags == ['work']
+        assert not listing.folded
+        assert listing.mtime is not None
+
+
+# Utility functions
+
+def paths(listings):
+    return [listing.path for listing in listings]
+
+
+# Fixtures
+
+@pytest.fixture
+def repo(empty_repo, home_dir):
+    """Repository with dotfiles of different kinds."""
+    empty_repo.add(dotfile_in_home(home_dir, '.bashrc'), tags=['work'])
+    empty_repo.add(dotfile_in_home(home_dir, '.vimrc'), hardlink=True)
+    os.makedirs(os.path.join(home_dir, '.config', 'app'))
+    for name in ('a', 'b'):
+        empty_repo.add(dotfile_in_home(home_dir, '.config/app/' + name))
+    return empty_repo
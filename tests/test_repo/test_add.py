@@ -2,10 +2,13 @@
 Tests for adding files to :class:`DotfileRepo`.
 """
 import os
+import shutil
+import tempfile
 
 import pytest
 
 from moredots import exc
+from moredots.repo import DotfileRepo
 
 from tests.test_repo import dotfile_exists, dotdir_file_exists
 
@@ -70,3 +73,74 @@ class TestAdd(object):
         assert (os.path.exists(dotdir_file_in_repo)
                 and not os.path.islink(dotdir_file_in_repo))
         assert os.path.exists(dotdir_file_in_home)
+
+    def test_add_file_as_reflink(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, reflink=True)
+
+        _, name = os.path.split(dotfile_in_home)
+        dotfile_in_repo = os.path.join(repo.dir, name[1:])
+        assert not os.path.islink(dotfile_in_home)
+        assert not os.path.samefile(dotfile_in_home, dotfile_in_repo)
+        with open(dotfile_in_home) as f1, open(dotfile_in_repo) as f2:
+            assert f1.read() == f2.read()
+
+    def test_add_file_as_hardlink_and_reflink(self, empty_repo,
+                                              dotfile_in_home):
+        with pytest.raises(ValueError):
+            empty_repo.add(dotfile_in_home, hardlink=True, reflink=True)
+
+    def test_add_file_dry_run(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        plan = repo.add(dotfile_in_home, dry_run=True)
+
+        assert [step.action for step in plan] == ['move', 'link']
+        assert not os.path.islink(dotfile_in_home)
+        assert len(repo.inventory) == 0
+
+
+class TestAddAcrossFilesystems(object):
+
+    def test_add_file(self, foreign_repo, dotfile_in_home):
+        repo = foreign_repo
+        repo.add(dotfile_in_home)
+
+        assert dotfile_exists(dotfile_in_home, repo)
+        assert os.path.islink(dotfile_in_home)
+
+    def test_add_file_preserves_mode(self, foreign_repo, dotfile_in_home):
+        repo = foreign_repo
+        os.chmod(dotfile_in_home, 0o600)
+        repo.add(dotfile_in_home)
+
+        mode = os.stat(os.path.realpath(dotfile_in_home)).st_mode
+        assert mode & 0o777 == 0o600
+
+    def test_add_file_as_hardlink(self, foreign_repo, dotfile_in_home):
+        with pytest.raises(exc.CrossDeviceLinkError):
+            foreign_repo.add(dotfile_in_home, hardlink=True)
+        assert not os.path.islink(dotfile_in_home)
+
+    def test_add_dotdir(self, foreign_repo, home_dir, dotdir_file_in_home):
+        repo = foreign_repo
+        dotdir = os.path.join(home_dir, os.path.relpath(
+            dotdir_file_in_home, start=home_dir).split(os.path.sep)[0])
+        repo.add(dotdir)
+
+        assert os.path.islink(dotdir)
+        assert dotdir_file_exists(dotdir_file_in_home, home_dir, repo)
+
+
+# Fixtures / resources
+
+@pytest.fixture
+def foreign_repo(request, home_dir):
+    """Empty moredots repository on different filesystem than $HOME."""
+    foreign_dir = '/dev/shm'
+    if not os.path.isdir(foreign_dir) or \
+            os.stat(foreign_dir).st_dev == os.stat(home_dir).st_dev:
+        pytest.skip("no other filesystem available")
+
+    repo_dir = tempfile.mkdtemp(dir=foreign_dir)
+    request.addfinalizer(lambda: shutil.rmtree(repo_dir))
+    return DotfileRepo.init(repo_dir, home_dir)
@@ -0,0 +1,162 @@
+"""
+Tests for encrypted dotfiles in :class:`DotfileRepo`.
+"""
+import os
+
+import pytest
+
+from moredots import exc
+from moredots.inventory import InventoryEntry
+
+
+#: Trivial reversible "encryption" standing in for gpg or age
+ROT13 = "tr a-zA-Z n-za-mN-ZA-M"
+
+PLAINTEXT = "machine example.com password hunter2\n"
+
+
+class TestEncrypt(object):
+
+    def test_add(self, repo, secret):
+        repo.add(secret, encrypt=True)
+        dotfile = repo.dotfile(secret)
+
+        assert read(secret) == PLAINTEXT
+        assert not os.path.islink(secret)
+        assert read(dotfile.repo_path) == rot13(PLAINTEXT)
+        assert repo.inventory[dotfile.path].link_type == 'encrypted'
+
+    def test_add_without_filter(self, empty_repo, secret, monkeypatch):
+        monkeypatch.setattr('moredots.encryption.find_executable',
+                            lambda name: None)
+        with pytest.raises(exc.EncryptionError):
+            empty_repo.add(secret, encrypt=True)
+        assert not os.path.exists(empty_repo.dotfile(secret).repo_path)
+
+    def test_add_with_failing_filter(self, repo, secret):
+        repo.set_config('encrypt', 'false')
+        with pytest.raises(exc.EncryptionError):
+            repo.add(secret, encrypt=True)
+        assert not os.path.exists(repo.dotfile(secret).repo_path)
+
+    def test_add_directory(self, repo, dotdir_in_home):
+        with pytest.raises(exc.InvalidLinkTypeError):
+            repo.add(dotdir_in_home, encrypt=True)
+
+    def test_install(self, repo, secret):
+        repo.add(secret, encrypt=True)
+        os.unlink(secret)
+
+        repo._install_dotfiles()
+        assert read(secret) == PLAINTEXT
+        assert not os.path.islink(secret)
+
+    def test_decrypt_only_changed_ciphertext(self, repo, secret, tmpdir):
+        log = str(tmpdir.join('decrypt.log'))
+        repo.set_config('decrypt', "echo >>%s; %s" % (log, ROT13))
+        repo.add(secret, encrypt=True)
+        dotfile = repo.dotfile(secret)
+
+        # plaintext is cached on add already
+        os.unlink(secret)
+        repo._install_dotfiles()
+        assert not os.path.exists(log)
+
+        # ciphertext changed, e.g. pulled from remote
+        with open(dotfile.repo_path, 'w') as f:
+            f.write(rot13("changed\n"))
+        repo._install_dotfiles()
+        repo._install_dotfiles()
+
+        assert read(secret) == "changed\n"
+        assert len(read(log).splitlines()) == 1
+
+    def test_prune(self, repo, secret):
+        repo.add(secret, encrypt=True)
+        dotfile = repo.dotfile(secret)
+        old_plaintext = repo.decryption_cache.file(dotfile.repo_path)
+
+        with open(dotfile.repo_path, 'w') as f:
+            f.write(rot13("changed\n"))
+        repo._install_dotfiles()
+
+        assert not os.path.exists(old_plaintext)
+        assert os.listdir(repo.decryption_cache.dir) == \
+            [repo.decryption_cache.blob_hash(dotfile.repo_path)]
+
+    def test_blob_hash(self, repo, secret):
+        repo.add(secret, encrypt=True)
+        repo_path = repo.dotfile(secret).repo_path
+
+        assert repo.decryption_cache.blob_hash(repo_path) == \
+            repo.git_repo.git.hash_object(repo_path)
+
+    def test_collect_changes(self, repo, secret):
+        repo.add(secret, encrypt=True)
+        assert repo.collect_changes() == []
+
+        with open(secret, 'a') as f:
+            f.write("changed\n")
+        changed = repo.collect_changes()
+
+        assert [df.home_path for df in changed] == [secret]
+        assert read(changed[0].repo_path) == rot13(PLAINTEXT + "changed\n")
+
+    def test_remove(self, repo, secret):
+        repo.add(secret, encrypt=True)
+        repo.remove(secret)
+
+        assert read(secret) == PLAINTEXT
+        assert not os.path.exists(repo.dotfile(secret).repo_path)
+
+    def test_remove_uninstalled(self, repo, secret):
+        repo.add(secret, encrypt=True)
+        os.unlink(secret)
+        repo.remove(secret)
+
+        assert read(secret) == PLAINTEXT
+
+    def test_remove_keeps_changes(self, repo, secret):
+        repo.add(secret, encrypt=True)
+        with open(secret, 'a') as f:
+            f.write("changed\n")
+        repo.remove(secret)
+
+        assert read(secret) == PLAINTEXT + "changed\n"
+        assert not os.path.exists(repo.dotfile(secret).repo_path)
+
+
+class TestInventoryEntry(object):
+
+    def test_link_type(self):
+        assert InventoryEntry('.netrc', encrypt=True).link_type == 'encrypted'
+
+
+# Utility functions
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def rot13(text):
+    return text.encode('rot13')
+
+
+# Fixtures
+
+@pytest.fixture
+def repo(empty_repo):
+    """Repository with encryption filters configured."""
+    empty_repo.set_config('encrypt', ROT13)
+    empty_repo.set_config('decrypt', ROT13)
+    return empty_repo
+
+
+@pytest.fixture
+def secret(home_dir):
+    """Dotfile with secret content."""
+    path = os.path.join(home_dir, '.netrc')
+    with open(path, 'w') as f:
+        f.write(PLAINTEXT)
+    return path
@@ -0,0 +1,126 @@
+"""
+Tests for large dotfiles kept in object store by :class:`DotfileRepo`.
+"""
+import os
+
+import pytest
+
+from moredots import exc
+from moredots.repo import DotfileRepo
+from moredots.store import file_sha256, read_pointer
+
+
+#: Size of files which are kept in object store in these tests
+THRESHOLD = 4096
+
+
+class TestExternal(object):
+
+    def test_add_small_file(self, repo, home_dir):
+        path = payload(home_dir, '.small', THRESHOLD - 1)
+        repo.add(path)
+
+        assert os.path.islink(path)
+        assert repo.inventory['.small'].link_type == 'symlink'
+
+    def test_add(self, repo, home_dir):
+        path = payload(home_dir, '.histfile')
+        digest = file_sha256(path)
+        repo.add(path)
+
+        assert not os.path.islink(path)
+        assert file_sha256(path) == digest
+        assert read_pointer(repo.dotfile(path).repo_path) == \
+            (digest, os.path.getsize(path))
+        assert repo.inventory['.histfile'].link_type == 'external'
+        assert os.path.isfile(repo.object_store.file(digest))
+
+    def test_install(self, repo, home_dir):
+        path = payload(home_dir, '.histfile')
+        digest = file_sha256(path)
+        repo.add(path)
+        os.unlink(path)
+
+        repo._install_dotfiles()
+        assert file_sha256(path) == digest
+
+    def test_install_missing_object(self, repo, home_dir):
+        path = payload(home_dir, '.histfile')
+        digest = file_sha256(path)
+        repo.add(path)
+        os.unlink(path)
+        os.unlink(repo.object_store.file(digest))
+
+        with pytest.raises(exc.ObjectNotFoundError):
+            repo._install_dotfiles()
+
+    def test_install_from_remote_store(self, repo, home_dir, tmpdir,
+                                       remote_store):
+        path = payload(home_dir, '.histfile')
+        digest = file_sha256(path)
+        repo.add(path)
+        repo._push_objects()
+        os.unlink(repo.object_store.file(digest))
+
+        other_home = str(tmpdir.mkdir('other_home'))
+        DotfileRepo.install('file://' + repo.dir,
+                            str(tmpdir.join('other_repo')), other_home)
+
+        other_path = os.path.join(other_home, '.histfile')
+        assert file_sha256(other_path) == digest
+        assert os.path.isfile(repo.object_store.file(digest))
+
+    def test_collect_changes(self, repo, home_dir):
+        path = payload(home_dir, '.histfile')
+        repo.add(path)
+        assert repo.collect_changes() == []
+
+        with open(path, 'ab') as f:
+            f.write("more history")
+        changed = repo.collect_changes()
+
+        assert [df.home_path for df in changed] == [path]
+        digest, _ = read_pointer(changed[0].repo_path)
+        assert digest == file_sha256(path)
+
+    def test_repo_holds_only_pointer(self, repo, home_dir):
+        path = payload(home_dir, '.histfile', 1024 * 1024)
+        repo.add(path)
+
+        blob = repo.git_repo.head.commit.tree[
+            os.path.relpath(repo.dotfile(path).repo_path, repo.dir)]
+        assert blob.size < 256
+
+
+# Utility functions
+
+def payload(directory, name, size=THRESHOLD):
+    """Creates binary file of given size."""
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return path
+
+
+# Fixtures
+
+@pytest.fixture
+def repo(empty_repo, tmpdir, monkeypatch):
+    """Repository keeping large files in object store. Store is configured
+    globally, so that it's shared by all repos, like it would be normally.
+    """
+    global_home = str(tmpdir.mkdir('global_home'))
+    monkeypatch.setenv('HOME', global_home)
+    with open(os.path.join(global_home, '.gitconfig'), 'w') as f:
+        f.write("[moredots]\n\tstore = %s\n\texternalthreshold = %d\n" % (
+            tmpdir.join('store'), THRESHOLD))
+    return empty_repo
+
+
+@pytest.fixture
+def remote_store(repo, tmpdir):
+    """Directory acting as remote store."""
+    path = str(tmpdir.mkdir('remote_store'))
+    with open(os.path.expanduser('~/.gitconfig'), 'a') as f:
+        f.write("\tremotestore = %s\n" % path)
+    return path
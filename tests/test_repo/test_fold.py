@@ -0,0 +1,118 @@
+"""
+Tests for folded dot-directories in :class:`DotfileRepo`.
+"""
+import os
+
+import pytest
+
+from moredots import exc
+from moredots.repo import DotfileRepo
+
+
+class TestFold(object):
+
+    def test_add_dotdir_is_folded(self, empty_repo, home_dir, dotdir_in_home):
+        repo = empty_repo
+        dotdir = os.path.join(home_dir, dotdir_path(home_dir, dotdir_in_home))
+        repo.add(dotdir)
+
+        assert os.path.islink(dotdir)
+        assert repo.inventory[relative(home_dir, dotdir)].fold
+
+    def test_add_empty_dotdir_is_committed(self, empty_repo, home_dir):
+        repo = empty_repo
+        dotdir = os.path.join(home_dir, '.emptydir')
+        os.mkdir(dotdir)
+        repo.add(dotdir)
+
+        assert not repo.git_repo.is_dirty()
+        committed = repo.git_repo.head.commit.tree['.mdots_files']
+        assert '.emptydir' in committed.data_stream.read()
+
+    def test_add_dotdir_as_hardlink(self, empty_repo, home_dir, dotdir_in_home):
+        dotdir = os.path.join(home_dir, dotdir_path(home_dir, dotdir_in_home))
+        with pytest.raises(exc.InvalidLinkTypeError):
+            empty_repo.add(dotdir, hardlink=True)
+
+    def test_folded_dotdir_is_single_dotfile(self, empty_repo, home_dir,
+                                             dotdir_file_in_home):
+        repo = empty_repo
+        dotdir = top_dotdir(home_dir, dotdir_file_in_home)
+        repo.add(dotdir)
+
+        dotfiles = list(repo.dotfiles)
+        assert len(dotfiles) == 1
+        assert dotfiles[0].home_path == dotdir
+
+    def test_remove_folded_dotdir(self, empty_repo, home_dir,
+                                  dotdir_file_in_home):
+        repo = empty_repo
+        dotdir = top_dotdir(home_dir, dotdir_file_in_home)
+        repo.add(dotdir)
+        repo.remove(dotdir)
+
+        assert not os.path.islink(dotdir)
+        assert os.path.isfile(dotdir_file_in_home)
+        assert len(repo.inventory) == 0
+
+    def test_remove_file_unfolds_dotdir(self, empty_repo, home_dir,
+                                        dotdir_file_in_home):
+        repo = empty_repo
+        dotdir = top_dotdir(home_dir, dotdir_file_in_home)
+        sibling = os.path.join(os.path.dirname(dotdir_file_in_home), 'sibling')
+        with open(sibling, 'w') as f:
+            f.write("sibling")
+        repo.add(dotdir)
+
+        repo.remove(dotdir_file_in_home)
+
+        assert not os.path.islink(dotdir)
+        assert os.path.isfile(dotdir_file_in_home)
+        assert not os.path.islink(dotdir_file_in_home)
+        assert os.path.islink(sibling)
+        assert relative(home_dir, dotdir) in repo.inventory
+
+    def test_install_folded_dotdir(self, remote_dir, repo_dir, home_dir,
+                                   dotdir_file_in_home):
+        dotdir = top_dotdir(home_dir, dotdir_file_in_home)
+        remote = DotfileRepo.init(remote_dir, home_dir)
+        remote.add(dotdir)
+        os.unlink(dotdir)
+
+        DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir)
+        assert os.path.islink(dotdir)
+
+    def test_install_unfolds_existing_dotdir(self, remote_dir, repo_dir,
+                                             home_dir, dotdir_file_in_home):
+        dotdir = top_dotdir(home_dir, dotdir_file_in_home)
+        remote = DotfileRepo.init(remote_dir, home_dir)
+        remote.add(dotdir)
+        os.unlink(dotdir)
+
+        # directory with some untracked file already exists in $HOME
+        os.mkdir(dotdir)
+        untracked = os.path.join(dotdir, 'untracked')
+        with open(untracked, 'w') as f:
+            f.write("untracked")
+
+        DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir)
+
+        assert not os.path.islink(dotdir)
+        assert os.path.isfile(untracked) and not os.path.islink(untracked)
+        assert os.path.isfile(dotdir_file_in_home)
+
+
+# Utility functions
+
+def relative(home_dir, path):
+    return os.path.relpath(path, start=home_dir)
+
+
+def dotdir_path(home_dir, dotdir_in_home):
+    """Relative path of the topmost dot-directory."""
+    return relative(home_dir, dotdir_in_home).split(os.path.sep)[0]
+
+
+def top_dotdir(home_dir, path):
+    """Absolute path to topmost dot-directory containing given path."""
+    return os.path.join(home_dir, dotdir_path(home_dir, path))
@@ -0,0 +1,52 @@
+"""
+Tests for removing orphaned links of :class:`DotfileRepo`.
+"""
+import os
+
+from moredots.repo import DotfileRepo
+
+
+class TestGc(object):
+
+    def test_gc_nothing(self, filled_repo):
+        assert filled_repo.gc() == []
+
+    def test_gc_orphan(self, filled_repo):
+        repo = filled_repo
+        dotfile = next(repo.dotfiles)
+        os.unlink(dotfile.repo_path)
+
+        assert repo.gc() == [dotfile.home_path]
+        assert not os.path.lexists(dotfile.home_path)
+        assert dotfile.home_path not in repo.reverse_index
+
+    def test_gc_dry_run(self, filled_repo):
+        repo = filled_repo
+        dotfile = next(repo.dotfiles)
+        os.unlink(dotfile.repo_path)
+
+        assert repo.gc(dry_run=True) == [dotfile.home_path]
+        assert os.path.islink(dotfile.home_path)
+
+    def test_gc_keeps_foreign_links(self, empty_repo, home_dir, tmpdir):
+        link = os.path.join(home_dir, '.foreign')
+        os.symlink(str(tmpdir.join('nonexistent')), link)
+
+        assert empty_repo.gc() == []
+        assert os.path.islink(link)
+
+    def test_sync_removes_orphans(self, tmpdir, remote_dir, repo_dir,
+                                  home_dir):
+        remote_home = str(tmpdir.mkdir('remote_home'))
+        remote = DotfileRepo.init(remote_dir, remote_home)
+        for name in ('.foo', '.bar'):
+            with open(os.path.join(remote_home, name), 'w') as f:
+                f.write(name)
+            remote.add(os.path.join(remote_home, name))
+
+        repo = DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir)
+        remote.remove('.bar')
+        repo.sync()
+
+        assert os.path.islink(os.path.join(home_dir, '.foo'))
+        assert not os.path.lexists(os.path.join(home_dir, '.bar'))
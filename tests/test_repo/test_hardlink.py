@@ -0,0 +1,63 @@
+"""
+Tests for hardlinked dotfiles in :class:`DotfileRepo`.
+"""
+import os
+import time
+
+
+class TestHardlink(object):
+
+    def test_check_intact(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, hardlink=True)
+        assert repo.check_hardlinks() == []
+
+    def test_check_drifted(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, hardlink=True)
+        save_by_rename(dotfile_in_home, "new content")
+
+        drifted = repo.check_hardlinks()
+        assert [df.home_path for df in drifted] == [dotfile_in_home]
+
+    def test_repair_newer_home_file(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, hardlink=True)
+        save_by_rename(dotfile_in_home, "new content")
+
+        updated = repo.repair_hardlinks()
+
+        assert len(updated) == 1
+        assert os.path.samefile(dotfile_in_home, updated[0].repo_path)
+        with open(updated[0].repo_path) as f:
+            assert f.read() == "new content"
+
+    def test_repair_newer_repo_file(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, hardlink=True)
+        save_by_rename(dotfile_in_home, "old content")
+
+        # make the copy in repo newer
+        dotfile = repo.check_hardlinks()[0]
+        future = time.time() + 60
+        os.utime(dotfile.repo_path, (future, future))
+
+        assert repo.repair_hardlinks() == []
+        assert os.path.samefile(dotfile_in_home, dotfile.repo_path)
+        with open(dotfile_in_home) as f:
+            assert f.read() != "old content"
+
+
+# Utility functions
+
+def save_by_rename(path, content):
+    """Save file the way some editors do, i.e. by writing a new file
+    and renaming it over the old one.
+    """
+    new_path = path + '.new'
+    with open(new_path, 'w') as f:
+        f.write(content)
+
+    future = time.time() + 1
+    os.utime(new_path, (future, future))
+    os.rename(new_path, path)
@@ -1,6 +1,11 @@
 """
 Tests for the :class:`DotfileRepo` installation.
 """
+import os
+
+import pytest
+
+from moredots import exc
 from moredots.repo import DotfileRepo
 
 
@@ -24,3 +29,53 @@ class TestInstall(object):
     def test_install_filled(self, filled_remote_url, repo_dir, home_dir):
         repo = DotfileRepo.install(filled_remote_url, repo_dir, home_dir)
         assert len(list(repo.dotfiles)) > 0
+
+    def test_install_backs_up_existing_files(self, filled_remote_url,
+                                             repo_dir, home_dir):
+        remote = DotfileRepo(filled_remote_url[len('file://'):])
+        dotfile = next(df for df in remote.dotfiles
+                       if os.path.sep not in df.path)
+        os.unlink(dotfile.home_path)
+        with open(dotfile.home_path, 'w') as f:
+            f.write("local")
+
+        repo = DotfileRepo.install(filled_remote_url, repo_dir, home_dir)
+
+        assert os.path.islink(dotfile.home_path)
+        backup = repo._backup_path(dotfile.home_path)
+        with open(backup) as f:
+            assert f.read() == "local"
+
+    def test_backup_dirs_are_unique(self, empty_repo, home_dir):
+        path = os.path.join(home_dir, '.foo')
+        backups = set()
+        for _ in xrange(3):
+            empty_repo._backup_dir = None  # as if it was another run
+            backups.add(os.path.dirname(empty_repo._backup_path(path)))
+
+        assert len(backups) == 3
+        assert all(os.path.isdir(backup) for backup in backups)
+
+    def test_install_twice(self, filled_remote_url, repo_dir, home_dir):
+        DotfileRepo.install(filled_remote_url, repo_dir, home_dir)
+        with pytest.raises(exc.RepositoryExistsError):
+            DotfileRepo.install(filled_remote_url, repo_dir, home_dir)
+
+    def test_install_resumes_interrupted(self, filled_remote_url,
+                                         repo_dir, home_dir):
+        repo = DotfileRepo.install(filled_remote_url, repo_dir, home_dir)
+        dotfiles = list(repo.dotfiles)
+        for dotfile in dotfiles:
+            os.unlink(dotfile.home_path)
+
+        # simulate installation that was interrupted after the first link
+        plan = repo._install_dotfiles(dry_run=True)
+        steps = [step for step in plan.steps if step.action == 'link']
+        repo.journal.start(steps)
+        repo.journal.done(0)
+
+        DotfileRepo.install(filled_remote_url, repo_dir, home_dir)
+
+        assert not repo.journal.pending
+        assert not os.path.lexists(steps[0].path)
+        assert all(os.path.islink(step.path) for step in steps[1:])
@@ -0,0 +1,57 @@
+"""
+Tests for reflinked dotfiles in :class:`DotfileRepo`.
+"""
+import os
+
+from moredots.repo import DotfileRepo
+
+
+class TestReflink(object):
+
+    def test_collect_unchanged(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, reflink=True)
+        assert repo.collect_changes() == []
+
+    def test_collect_changed(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, reflink=True)
+        with open(dotfile_in_home, 'a') as f:
+            f.write("changed")
+
+        changed = repo.collect_changes()
+
+        assert [df.home_path for df in changed] == [dotfile_in_home]
+        with open(changed[0].repo_path) as f:
+            assert f.read().endswith("changed")
+
+    def test_collect_ignores_symlinks(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home)
+        with open(dotfile_in_home, 'a') as f:
+            f.write("changed")
+
+        assert repo.collect_changes() == []
+
+    def test_install_reflink(self, remote_dir, repo_dir, home_dir,
+                             dotfile_in_home):
+        remote = DotfileRepo.init(remote_dir, home_dir)
+        remote.add(dotfile_in_home, reflink=True)
+        os.unlink(dotfile_in_home)
+
+        DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir)
+
+        assert os.path.isfile(dotfile_in_home)
+        assert not os.path.islink(dotfile_in_home)
+
+    def test_remove_keeps_changes(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.add(dotfile_in_home, reflink=True)
+        with open(dotfile_in_home, 'a') as f:
+            f.write("changed")
+
+        repo.remove(dotfile_in_home)
+
+        with open(dotfile_in_home) as f:
+            assert f.read().endswith("changed")
+        assert not os.path.exists(repo.dotfile(dotfile_in_home).repo_path)
@@ -0,0 +1,88 @@
+"""
+Tests for relocating :class:`DotfileRepo` and relative symlinks.
+"""
+import os
+import shutil
+
+import pytest
+
+from moredots import exc
+from moredots import repo as repo_module
+from moredots.repo import DotfileRepo
+
+
+class TestRelocate(object):
+
+    def test_relative_links(self, empty_repo, dotfile_in_home):
+        repo = empty_repo
+        repo.relative_links = True
+        repo.add(dotfile_in_home)
+
+        target = os.readlink(dotfile_in_home)
+        assert not os.path.isabs(target)
+        assert os.path.realpath(dotfile_in_home) == \
+            os.path.realpath(repo.dotfile(dotfile_in_home).repo_path)
+
+    def test_relocate_repo(self, filled_repo, tmpdir):
+        repo = filled_repo
+        new_dir = str(tmpdir.join('moved'))
+
+        repo.relocate(new_dir)
+
+        assert repo.dir == new_dir
+        assert all(os.path.exists(df.home_path) for df in repo.dotfiles)
+        assert all(os.path.realpath(df.home_path).startswith(new_dir)
+                   for df in repo.dotfiles)
+
+    def test_relocate_to_nonempty_dir(self, filled_repo, tmpdir):
+        new_dir = tmpdir.mkdir('moved')
+        new_dir.join('foo').write("foo")
+
+        with pytest.raises(exc.RepositoryExistsError):
+            filled_repo.relocate(str(new_dir))
+
+    def test_relocate_hardlinks_across_filesystems(self, empty_repo,
+                                                   dotfile_in_home, tmpdir,
+                                                   monkeypatch):
+        repo = empty_repo
+        repo.add(dotfile_in_home, hardlink=True)
+        old_dir = repo.dir
+        new_dir = str(tmpdir.join('moved'))
+
+        # pretend that the new directory is on another filesystem
+        device = repo_module._device
+        monkeypatch.setattr(repo_module, '_device', lambda path: (
+            -1 if path.startswith(new_dir) else device(path)))
+
+        with pytest.raises(exc.CrossDeviceLinkError):
+            repo.relocate(new_dir)
+        assert repo.dir == old_dir
+        assert os.path.isdir(old_dir)
+        assert not os.path.exists(new_dir)
+
+    def test_switch_to_relative_links(self, filled_repo):
+        repo = filled_repo
+        repo.relocate(relative=True)
+
+        assert repo.relative_links
+        for dotfile in repo.dotfiles:
+            assert not os.path.isabs(os.readlink(dotfile.home_path))
+
+    def test_relocate_together_rewrites_nothing(self, tmpdir, dotfile_name):
+        base = tmpdir.mkdir('old')
+        home_dir = str(base.mkdir('home'))
+        repo = DotfileRepo.init(str(base.join('repo')), home_dir)
+        repo.relative_links = True
+        dotfile = os.path.join(home_dir, dotfile_name)
+        with open(dotfile, 'w') as f:
+            f.write("foo")
+        repo.add(dotfile)
+
+        # move both repo and home directory, like when renaming user
+        new_base = str(tmpdir.join('new'))
+        shutil.move(str(base), new_base)
+        repo = DotfileRepo(os.path.join(new_base, 'repo'))
+        plan = repo.relocate(home_dir=os.path.join(new_base, 'home'))
+
+        assert not plan
+        assert os.path.isfile(os.path.join(new_base, 'home', dotfile_name))
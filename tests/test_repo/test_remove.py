@@ -58,3 +58,13 @@ class TestRemove(object):
         repo.remove(dotdir_file)
         with pytest.raises(exc.DotfileNotFoundError):
             repo.remove(dotdir_file)
+
+    def test_remove_file_dry_run(self, filled_repo):
+        repo = filled_repo
+        dotfile = next(repo.dotfiles)
+
+        plan = repo.remove(dotfile.path, dry_run=True)
+
+        assert plan
+        assert os.path.exists(dotfile.repo_path)
+        assert os.path.islink(dotfile.home_path)
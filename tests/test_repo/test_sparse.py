@@ -0,0 +1,155 @@
+"""
+Tests for installing a profile of :class:`DotfileRepo`
+using Git sparse checkout.
+"""
+import os
+
+import pytest
+
+from moredots import fsck
+from moredots.repo import DotfileRepo
+
+
+class TestSparseInstall(object):
+
+    def test_install_without_profile_is_not_sparse(self, tagged_remote,
+                                                   repo_dir, home_dir):
+        remote, _ = tagged_remote
+        repo = DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir)
+
+        assert not repo.is_sparse
+        assert repo.profile is None
+
+    def test_install_profile_checks_out_subset(self, tagged_remote,
+                                               repo_dir, home_dir):
+        remote, _ = tagged_remote
+        repo = DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir,
+                                   profile='server')
+
+        assert repo.is_sparse
+        assert repo.profile == 'server'
+        assert os.path.exists(repo.dotfile('.common').repo_path)
+        assert os.path.exists(repo.dotfile('.server').repo_path)
+        assert not os.path.exists(repo.dotfile('.workstation').repo_path)
+        assert len(repo.inventory) == 3
+
+    def test_install_profile_links_subset(self, tagged_remote,
+                                          repo_dir, home_dir):
+        remote, _ = tagged_remote
+        DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir,
+                            profile='server')
+
+        assert os.path.islink(os.path.join(home_dir, '.common'))
+        assert os.path.islink(os.path.join(home_dir, '.server'))
+        assert not os.path.lexists(os.path.join(home_dir, '.workstation'))
+
+    def test_sync_checks_out_new_profile_dotfiles(self, tagged_remote,
+                                                  repo_dir, home_dir):
+        remote, remote_home = tagged_remote
+        repo = DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir,
+                                   profile='server')
+        for name, tags in (('.server2', ['server']), ('.other', ['other'])):
+            add_dotfile(remote, remote_home, name, tags)
+
+        repo.sync()
+
+        assert os.path.islink(os.path.join(home_dir, '.server2'))
+        assert os.path.exists(repo.dotfile('.server2').repo_path)
+        assert not os.path.exists(repo.dotfile('.other').repo_path)
+
+    def test_switch_updates_sparse_checkout(self, tagged_remote,
+                                            repo_dir, home_dir):
+        remote, _ = tagged_remote
+        repo = DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir,
+                                   profile='server')
+        repo.switch('workstation')
+
+        assert not os.path.exists(repo.dotfile('.server').repo_path)
+        assert os.path.exists(repo.dotfile('.workstation').repo_path)
+        assert os.path.islink(os.path.join(home_dir, '.workstation'))
+        assert not os.path.lexists(os.path.join(home_dir, '.server'))
+
+    def test_switch_to_all_checks_out_everything(self, tagged_remote,
+                                                 repo_dir, home_dir):
+        remote, _ = tagged_remote
+        repo = DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir,
+                                   profile='server')
+        uninstalled, installed = repo.switch(None)
+
+        assert (uninstalled, installed) == ([], ['.workstation'])
+        assert repo.profile is None
+        assert os.path.exists(repo.dotfile('.workstation').repo_path)
+        assert os.path.islink(os.path.join(home_dir, '.workstation'))
+        assert os.path.islink(os.path.join(home_dir, '.server'))
+
+
+class TestSparseChanges(object):
+
+    def test_add(self, sparse_repo, home_dir):
+        add_dotfile(sparse_repo, home_dir, '.new')
+
+        assert os.path.islink(os.path.join(home_dir, '.new'))
+        assert '.new' in sparse_repo.inventory
+        assert is_indexed(sparse_repo, '.new')
+        assert not sparse_repo.git_repo.is_dirty()
+
+    def test_add_outside_profile(self, sparse_repo, home_dir):
+        add_dotfile(sparse_repo, home_dir, '.other', ['other'])
+
+        assert os.path.exists(sparse_repo.dotfile('.other').repo_path)
+        assert is_indexed(sparse_repo, '.other')
+        assert not sparse_repo.git_repo.is_dirty()
+
+    def test_remove(self, sparse_repo, home_dir):
+        sparse_repo.remove('.server')
+
+        home_path = os.path.join(home_dir, '.server')
+        assert os.path.isfile(home_path) and not os.path.islink(home_path)
+        assert '.server' not in sparse_repo.inventory
+        assert not is_indexed(sparse_repo, '.server')
+        assert not sparse_repo.git_repo.is_dirty()
+
+    def test_fsck(self, sparse_repo, home_dir):
+        add_dotfile(sparse_repo, home_dir, '.new')
+        assert fsck.check(sparse_repo) == []
+
+
+# Utility functions
+
+def add_dotfile(repo, home_dir, name, tags=None):
+    path = os.path.join(home_dir, name)
+    with open(path, 'w') as f:
+        f.write(name)
+    repo.add(path, tags=tags)
+
+
+def is_indexed(repo, name):
+    path = os.path.relpath(repo.dotfile(name).repo_path, start=repo.dir)
+    return path in repo.git_repo.git.ls_files().splitlines()
+
+
+# Fixtures / resources
+
+@pytest.fixture
+def tagged_remote(remote_dir, tmpdir):
+    """Remote repository with dotfiles tagged for different profiles.
+    :return: Tuple of repo and its home directory
+    """
+    remote_home = str(tmpdir.mkdir('remote_home'))
+    remote = DotfileRepo.init(remote_dir, remote_home)
+
+    add_dotfile(remote, remote_home, '.common')
+    add_dotfile(remote, remote_home, '.server', ['server'])
+    add_dotfile(remote, remote_home, '.workstation', ['workstation'])
+
+    return remote, remote_home
+
+
+@pytest.fixture
+def sparse_repo(tagged_remote, repo_dir, home_dir):
+    """Repository installed from :func:`tagged_remote`
+    with ``server`` profile, i.e. using sparse checkout.
+    """
+    remote, _ = tagged_remote
+    return DotfileRepo.install('file://' + remote.dir, repo_dir, home_dir,
+                               profile='server')
@@ -0,0 +1,81 @@
+"""
+Tests for switching profiles of :class:`DotfileRepo`.
+"""
+import os
+
+import pytest
+
+
+class TestSwitch(object):
+
+    def test_switch_uninstalls_other_profile(self, tagged_repo):
+        repo, dotfiles = tagged_repo
+        repo.switch('server')
+
+        assert os.path.islink(dotfiles['common'])
+        assert os.path.islink(dotfiles['server'])
+        assert not os.path.lexists(dotfiles['workstation'])
+        assert repo.profile == 'server'
+
+    def test_switch_returns_delta(self, tagged_repo):
+        repo, _ = tagged_repo
+        repo.switch('server')
+        uninstalled, installed = repo.switch('workstation')
+
+        assert uninstalled == ['.server']
+        assert installed == ['.workstation']
+
+    def test_switch_dry_run(self, tagged_repo):
+        repo, dotfiles = tagged_repo
+        uninstalled, installed = repo.switch('server', dry_run=True)
+
+        assert uninstalled == ['.workstation'] and installed == []
+        assert os.path.islink(dotfiles['workstation'])
+        assert repo.profile is None
+
+    def test_switch_back_to_all(self, tagged_repo):
+        repo, dotfiles = tagged_repo
+        repo.switch('server')
+        repo.switch(None)
+
+        assert all(os.path.islink(path) for path in dotfiles.values())
+        assert repo.profile is None
+
+    def test_switch_keeps_foreign_files(self, tagged_repo):
+        repo, dotfiles = tagged_repo
+        os.unlink(dotfiles['workstation'])
+        with open(dotfiles['workstation'], 'w') as f:
+            f.write("foreign")
+
+        repo.switch('server')
+        assert os.path.isfile(dotfiles['workstation'])
+
+    def test_install_respects_profile(self, tagged_repo):
+        repo, dotfiles = tagged_repo
+        repo.switch('server')
+        for path in dotfiles.values():
+            if os.path.islink(path):
+                os.unlink(path)
+
+        repo._install_dotfiles()
+
+        assert os.path.islink(dotfiles['server'])
+        assert not os.path.lexists(dotfiles['workstation'])
+
+
+# Fixtures / resources
+
+@pytest.fixture
+def tagged_repo(empty_repo, home_dir):
+    """Repository with dotfiles tagged for different profiles.
+    :return: Tuple of repo and dict mapping tags to dotfile paths
+    """
+    dotfiles = {}
+    for tag in ('common', 'server', 'workstation'):
+        path = os.path.join(home_dir, '.' + tag)
+        with open(path, 'w') as f:
+            f.write(tag)
+        empty_repo.add(path, tags=[tag] if tag != 'common' else None)
+        dotfiles[tag] = path
+
+    return empty_repo, dotfiles
@@ -1,9 +1,15 @@
 """
 Tests for :class:`DotfileRepo` synchronization.
 """
+import os
+
+import git
 import pytest
 
 from moredots import exc
+from moredots.repo import DotfileRepo
+
+from tests.conftest import dotfile_in_home
 
 
 class TestSync(object):
@@ -37,3 +43,210 @@ class TestSync(object):
     def test_sync_with_unrelated_remote(self, filled_repo, filled_remote_url):
         with pytest.raises(exc.UnrelatedRemoteError):
             filled_repo.sync(filled_remote_url)
+
+    def test_sync_with_unreachable_remote(self, filled_repo, tmpdir):
+        head = filled_repo.git_repo.head.commit
+        with pytest.raises(exc.PullError):
+            filled_repo.sync('file://' + str(tmpdir.join('missing')))
+        assert filled_repo.git_repo.head.commit == head
+
+
+class TestCoalesce(object):
+
+    def test_disabled(self, filled_repo):
+        head = filled_repo.git_repo.head.commit
+        assert filled_repo._coalesce_commits() == 0
+        assert filled_repo.git_repo.head.commit == head
+
+    def test_coalesce(self, filled_repo, home_dir):
+        repo = filled_repo
+        repo.add(dotfile_in_home(home_dir, '.coalesced'))
+        repo.remove(os.path.join(home_dir, '.coalesced'))
+        tree = repo.git_repo.head.commit.tree
+        count = len(list(repo.git_repo.iter_commits()))
+
+        repo.set_config('coalescewindow', 3600)
+        assert repo._coalesce_commits() == count
+
+        head = repo.git_repo.head.commit
+        assert head.tree == tree
+        assert not head.parents
+        assert head.message.startswith("[moredots] Add ")
+        assert "; remove .coalesced\n" in head.message
+        assert not repo.git_repo.is_dirty()
+
+    def test_outside_window(self, filled_repo, home_dir):
+        repo = filled_repo
+        repo.git_repo.index.commit("[moredots] Update .old",
+                                   author_date='2000-01-01T00:00:00',
+                                   commit_date='2000-01-01T00:00:00')
+        repo.add(dotfile_in_home(home_dir, '.first'))
+        repo.add(dotfile_in_home(home_dir, '.second'))
+        old_commit = repo.git_repo.head.commit.parents[0].parents[0]
+
+        repo.set_config('coalescewindow', 3600)
+        assert repo._coalesce_commits() == 2
+
+        head = repo.git_repo.head.commit
+        assert head.parents == (old_commit,)
+        assert head.message.splitlines()[0] == \
+            "[moredots] Add .first, .second"
+
+    def test_pushed_commits_kept(self, tmpdir, filled_remote_url):
+        home_dir = str(tmpdir.mkdir('coalesce_home'))
+        repo = DotfileRepo.install(filled_remote_url,
+                                   str(tmpdir.join('coalesce_repo')),
+                                   home_dir)
+        pushed = repo.git_repo.head.commit
+        repo.add(dotfile_in_home(home_dir, '.first'))
+
+        repo.set_config('coalescewindow', 3600)
+        assert repo._coalesce_commits() == 0
+
+        repo.add(dotfile_in_home(home_dir, '.second'))
+        assert repo._coalesce_commits() == 2
+        assert repo.git_repo.head.commit.parents == (pushed,)
+
+    def test_commits_pushed_to_mirror_kept(self, filled_repo, tmpdir):
+        repo = filled_repo
+        mirror = bare_remote(tmpdir, 'backup')
+        repo.add_remote('backup', 'file://' + mirror.git_dir, role='push')
+        repo.set_config('coalescewindow', 86400)
+        repo.sync()
+        pushed = repo.git_repo.head.commit
+
+        repo.add(dotfile_in_home(repo.home_dir, '.first'))
+        repo.add(dotfile_in_home(repo.home_dir, '.second'))
+        results = repo.sync()
+
+        assert all(result.ok for result in results)
+        assert repo.git_repo.head.commit.parents == (pushed,)
+        assert mirror.head.commit == repo.git_repo.head.commit
+
+    def test_sync(self, filled_repo, remote_dir):
+        repo = filled_repo
+        remote = git.Repo.init(remote_dir, bare=True)
+        repo.set_config('coalescewindow', 3600)
+        repo.sync('file://' + remote_dir)
+
+        assert remote.head.commit == repo.git_repo.head.commit
+        assert len(list(remote.iter_commits())) == 1
+
+
+class TestRemotes(object):
+
+    def test_origin_is_default(self, empty_repo, remote_dir):
+        repo = empty_repo
+        repo.git_repo.create_remote('origin', 'file://' + remote_dir)
+        repo.git_repo.create_remote('other', 'file://' + remote_dir)
+
+        assert repo.remotes == [('origin', 'file://' + remote_dir, 'both')]
+
+    def test_add_and_remove(self, empty_repo, remote_dir):
+        repo = empty_repo
+        repo.add_remote('backup', 'file://' + remote_dir, role='push')
+        repo.add_remote('origin', 'file://' + remote_dir)
+        assert repo.remotes == [
+            ('origin', 'file://' + remote_dir, 'both'),
+            ('backup', 'file://' + remote_dir, 'push'),
+        ]
+
+        repo.remove_remote('backup')
+        assert [remote.name for remote in repo.remotes] == ['origin']
+        with pytest.raises(exc.UnknownRemoteError):
+            repo.remove_remote('backup')
+
+    def test_invalid_role(self, empty_repo, remote_dir):
+        with pytest.raises(ValueError):
+            empty_repo.add_remote('backup', 'file://' + remote_dir,
+                                  role='fetch')
+
+    def test_sync_pushes_to_all(self, filled_repo, tmpdir):
+        repo = filled_repo
+        mirrors = [bare_remote(tmpdir, name)
+                   for name in ('origin', 'backup', 'archive')]
+        for name, mirror in zip(('backup', 'archive'), mirrors[1:]):
+            repo.add_remote(name, 'file://' + mirror.git_dir, role='push')
+
+        results = repo.sync('file://' + mirrors[0].git_dir)
+
+        assert sorted(r.remote for r in results) == \
+            ['archive', 'backup', 'origin']
+        assert all(r.ok and r.seconds >= 0 for r in results)
+        for mirror in mirrors:
+            assert mirror.head.commit == repo.git_repo.head.commit
+
+    def test_sync_reports_failures(self, filled_repo, tmpdir):
+        repo = filled_repo
+        mirror = bare_remote(tmpdir, 'origin')
+        repo.add_remote('broken', 'file://' + str(tmpdir.join('missing')),
+                        role='push')
+
+        results = dict((r.remote, r) for r in
+                       repo.sync('file://' + mirror.git_dir))
+
+        assert results['origin'].ok
+        assert not results['broken'].ok
+        assert results['broken'].error
+        assert mirror.head.commit == repo.git_repo.head.commit
+
+    def test_sync_pull_only(self, filled_repo, tmpdir):
+        repo = filled_repo
+        upstream = bare_remote(tmpdir, 'upstream')
+        repo.add_remote('upstream', 'file://' + upstream.git_dir,
+                        role='pull')
+
+        assert repo.sync() == []
+        assert not upstream.head.is_valid()
+
+
+# Utility functions
+
+def bare_remote(tmpdir, name):
+    """Creates empty bare Git repository to act as remote."""
+    return git.Repo.init(str(tmpdir.join('%s.git' % name)), bare=True)
+
+
+class TestMergeInventory(object):
+
+    def test_driver_registered(self, empty_repo):
+        reader = empty_repo.git_repo.config_reader()
+        assert 'moredots.merge' in reader.get_value('merge "mdots"', 'driver')
+        attributes = empty_repo.git_repo.git.check_attr('merge',
+                                                        '.mdots_files')
+        assert attributes.endswith(': merge: mdots')
+
+    def test_concurrent_additions(self, filled_repo, tmpdir):
+        first = filled_repo
+        remote = bare_remote(tmpdir, 'shared')
+        first.sync('file://' + remote.git_dir)
+        second_home = str(tmpdir.mkdir('second_home'))
+        second = DotfileRepo.install('file://' + remote.git_dir,
+                                     str(tmpdir.join('second')), second_home)
+
+        first.add(dotfile_in_home(first.home_dir, '.first'))
+        second.add(dotfile_in_home(second_home, '.second'))
+        first.sync()
+        second.sync()
+        first.sync()
+
+        assert first.git_repo.head.commit == second.git_repo.head.commit
+        assert set(entry.path for entry in first.inventory) == \
+            set(entry.path for entry in second.inventory)
+        assert os.path.islink(os.path.join(first.home_dir, '.second'))
+        assert os.path.islink(os.path.join(second_home, '.first'))
+
+    def test_conflict(self, filled_repo, tmpdir):
+        first = filled_repo
+        remote = bare_remote(tmpdir, 'shared')
+        first.sync('file://' + remote.git_dir)
+        second_home = str(tmpdir.mkdir('second_home'))
+        second = DotfileRepo.install('file://' + remote.git_dir,
+                                     str(tmpdir.join('second')), second_home)
+
+        first.add(dotfile_in_home(first.home_dir, '.same'))
+        second.add(dotfile_in_home(second_home, '.same'))
+        first.sync()
+
+        with pytest.raises(exc.MergeConflictError):
+            second.sync()
@@ -0,0 +1,124 @@
+"""
+Tests for templated dotfiles in :class:`DotfileRepo`.
+"""
+import os
+import socket
+
+import pytest
+
+from moredots import exc
+
+
+TEMPLATE = "[user]\n\temail = {{ email }}\n# {{ hostname }}\n"
+
+
+class TestTemplate(object):
+
+    def test_add(self, repo, template):
+        repo.add(template, template=True)
+        dotfile = repo.dotfile(template)
+
+        assert read(dotfile.repo_path) == TEMPLATE
+        assert read(template) == rendered()
+        assert not os.path.islink(template)
+        assert repo.inventory[dotfile.path].link_type == 'template'
+
+    def test_add_dry_run(self, repo, template):
+        plan = repo.add(template, template=True, dry_run=True)
+
+        assert [step.action for step in plan] == ['copy', 'link']
+        assert read(template) == TEMPLATE
+
+    def test_add_with_undefined_variable(self, empty_repo, template):
+        with pytest.raises(exc.TemplateError):
+            empty_repo.add(template, template=True)
+        assert read(template) == TEMPLATE
+        assert not os.path.exists(empty_repo.dotfile(template).repo_path)
+
+    def test_install(self, repo, template):
+        repo.add(template, template=True)
+        os.unlink(template)
+
+        repo._install_dotfiles()
+        assert read(template) == rendered()
+
+    def test_rerender_on_variable_change(self, repo, template):
+        repo.add(template, template=True)
+
+        set_var(repo, 'email', 'joe@work.example.com')
+        repo._install_dotfiles()
+
+        assert read(template) == rendered('joe@work.example.com')
+        assert len(os.listdir(repo.template_cache.dir)) == 1
+
+    def test_rerender_on_template_change(self, repo, template):
+        repo.add(template, template=True)
+        with open(repo.dotfile(template).repo_path, 'a') as f:
+            f.write("[core]\n")
+
+        repo._install_dotfiles()
+        assert read(template) == rendered() + "[core]\n"
+
+    def test_render_cached(self, repo, template, monkeypatch):
+        repo.add(template, template=True)
+        os.unlink(template)
+
+        # template that was rendered before isn't rendered again
+        monkeypatch.setattr('moredots.template.render', None)
+        repo._install_dotfiles()
+        assert read(template) == rendered()
+
+    def test_profile_variables(self, repo, template):
+        set_var(repo, 'email', 'joe@work.example.com', profile='work')
+        repo.add(template, template=True)
+        assert read(template) == rendered()
+
+        repo.switch('work')
+        repo._install_dotfiles()
+        assert read(template) == rendered('joe@work.example.com')
+
+    def test_remove(self, repo, template):
+        repo.add(template, template=True)
+        repo.remove(template)
+
+        assert read(template) == rendered()
+        assert not os.path.exists(repo.dotfile(template).repo_path)
+
+
+# Utility functions
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def rendered(email='joe@example.com'):
+    return TEMPLATE.replace('{{ email }}', email).replace(
+        '{{ hostname }}', socket.gethostname())
+
+
+def set_var(repo, name, value, profile=None):
+    section = 'moredots "vars%s"' % ('.' + profile if profile else '')
+    writer = repo.git_repo.config_writer()
+    try:
+        writer.set_value(section, name, value)
+    finally:
+        writer.release()
+
+
+# Fixtures
+
+@pytest.fixture
+def repo(empty_repo):
+    """Repository with template variables defined."""
+    set_var(empty_repo, 'email', 'joe@example.com')
+    return empty_repo
+
+
+@pytest.fixture
+def template(home_dir):
+    """Templated dotfile."""
+    path = os.path.join(home_dir, '.gitconfig')
+    with open(path, 'w') as f:
+        f.write(TEMPLATE)
+    return path
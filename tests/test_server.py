@@ -0,0 +1,109 @@
+"""
+Tests for ``mdots server`` and its client.
+"""
+import os
+import threading
+
+import pytest
+
+from moredots import client, exc
+from moredots.server import Server
+
+from tests.conftest import dotfile_in_home, dotfile_name
+
+
+class TestClient(object):
+
+    def test_no_server(self, tmpdir):
+        assert client.request(['gc'], str(tmpdir.join('none.sock'))) is None
+
+    def test_foreign_socket(self, server, monkeypatch):
+        monkeypatch.setattr(os, 'getuid', lambda: os.geteuid() + 1)
+        assert client.request(['gc'], server.server_address) is None
+
+    def test_disabled_server(self, monkeypatch):
+        monkeypatch.setenv(client.SOCKET_ENV, '')
+        assert client.socket_path() == ''
+        assert client.request(['gc']) is None
+
+    def test_fallback_to_local_execution(self, filled_repo, monkeypatch,
+                                         capsys):
+        monkeypatch.setenv(client.SOCKET_ENV, '')
+        path = next(iter(filled_repo.inventory)).path
+
+        code = client.main(['which', filled_repo.home_dir + '/' + path,
+                            filled_repo.dir])
+        assert not code
+        assert capsys.readouterr()[0].strip() == path
+
+
+class TestServer(object):
+
+    def test_execute(self, server, filled_repo):
+        path = next(iter(filled_repo.inventory)).path
+
+        response = client.request(
+            ['which', filled_repo.home_dir + '/' + path, filled_repo.dir],
+            server.server_address)
+        assert response['exit'] == 0
+        assert response['stdout'].strip() == path
+
+    def test_execute_in_client_cwd(self, server, filled_repo, monkeypatch):
+        path = next(iter(filled_repo.inventory)).path
+        monkeypatch.chdir(filled_repo.home_dir)
+
+        response = client.request(['which', path, filled_repo.dir],
+                                  server.server_address)
+        assert response['stdout'].strip() == path
+
+    def test_exit_code(self, server, filled_repo):
+        response = client.request(['which', '.nonexistent', filled_repo.dir],
+                                  server.server_address)
+        assert response['exit'] == 1
+
+    def test_invalid_args(self, server):
+        response = client.request(['--frobnicate'], server.server_address)
+        assert response['exit'] == 2
+        assert response['stderr']
+
+    def test_repo_cache(self, server, filled_repo, home_dir):
+        argv = ['gc', filled_repo.dir]
+        client.request(argv, server.server_address)
+        repo = server.repo_cache.get(filled_repo.dir)
+        client.request(argv, server.server_address)
+        assert server.repo_cache.get(filled_repo.dir) is repo
+
+        # repo modified without the server has to be opened again
+        filled_repo.add(dotfile_in_home(home_dir, dotfile_name()))
+        assert server.repo_cache.get(filled_repo.dir) is not repo
+
+    def test_already_running(self, server):
+        with pytest.raises(exc.ServerRunningError):
+            Server(server.server_address)
+
+    def test_stale_socket(self, server):
+        path = server.server_address
+        server.shutdown()
+        server.socket.close()  # simulate killed server leaving socket behind
+        assert os.path.exists(path)
+
+        other_server = Server(path)
+        other_server.server_close()
+        assert not os.path.exists(path)
+
+
+# Fixtures
+
+@pytest.fixture
+def server(request, tmpdir):
+    """Server running in a separate thread."""
+    server = Server(str(tmpdir.join('mdots.sock')))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+    request.addfinalizer(stop)
+    return server
@@ -0,0 +1,101 @@
+"""
+Tests for the :class:`ObjectStore` of large dotfiles.
+"""
+import os
+
+import pytest
+
+from moredots import exc
+from moredots.store import (ObjectStore, file_sha256, read_pointer,
+                            write_pointer)
+
+
+class TestPointer(object):
+
+    def test_roundtrip(self, tmpdir):
+        path = str(tmpdir.join('pointer'))
+        write_pointer(path, 'ab' * 32, 1234)
+        assert read_pointer(path) == ('ab' * 32, 1234)
+
+    def test_not_a_pointer(self, tmpdir):
+        path = str(tmpdir.join('file'))
+        with open(path, 'w') as f:
+            f.write("just a file\n")
+        assert read_pointer(path) is None
+
+    def test_large_file(self, tmpdir):
+        path = str(tmpdir.join('file'))
+        with open(path, 'w') as f:
+            f.write("x" * 4096)
+        assert read_pointer(path) is None
+
+
+class TestObjectStore(object):
+
+    def test_put(self, store, payload):
+        digest, size = store.put(payload)
+
+        assert digest == file_sha256(payload)
+        assert size == os.path.getsize(payload)
+        assert os.path.isfile(store.file(digest))
+
+    def test_put_deduplicates(self, store, payload, tmpdir):
+        other = str(tmpdir.join('other'))
+        with open(payload) as src, open(other, 'w') as dst:
+            dst.write(src.read())
+
+        assert store.put(payload) == store.put(other)
+        assert len(os.listdir(store.dir)) == 1
+
+    def test_get_missing(self, store):
+        with pytest.raises(exc.ObjectNotFoundError):
+            store.get('ab' * 32)
+
+    def test_get_from_candidate(self, store, payload):
+        digest = file_sha256(payload)
+        assert store.get(digest, candidate=payload) == store.file(digest)
+
+    def test_push_and_get_from_remote(self, store, payload, remote_store):
+        digest, _ = store.put(payload)
+        assert store.push([digest]) == [digest]
+        assert store.push([digest]) == []  # already there
+
+        os.unlink(store.file(digest))
+        assert file_sha256(store.get(digest)) == digest
+
+    def test_get_corrupted_from_remote(self, store, payload, remote_store):
+        digest, _ = store.put(payload)
+        store.push([digest])
+        os.unlink(store.file(digest))
+        with open(store.remote_file(digest), 'a') as f:
+            f.write("garbage")
+
+        with pytest.raises(exc.ObjectNotFoundError):
+            store.get(digest)
+        assert not os.path.exists(store.file(digest))
+
+
+# Fixtures
+
+@pytest.fixture
+def store(empty_repo, tmpdir):
+    """Object store in temporary directory."""
+    empty_repo.set_config('store', str(tmpdir.join('store')))
+    return ObjectStore(empty_repo)
+
+
+@pytest.fixture
+def remote_store(store, tmpdir):
+    """Directory acting as remote store."""
+    path = str(tmpdir.mkdir('remote_store'))
+    store.repo.set_config('remotestore', 'file://' + path)
+    return path
+
+
+@pytest.fixture
+def payload(tmpdir):
+    """Binary file to store."""
+    path = str(tmpdir.join('payload'))
+    with open(path, 'wb') as f:
+        f.write(os.urandom(64 * 1024))
+    return path
@@ -0,0 +1,32 @@
+"""
+Tests for rendering templates.
+"""
+import pytest
+
+from moredots import exc
+from moredots.template import render, variables
+
+
+class TestRender(object):
+
+    def test_no_variables(self):
+        assert render("export EDITOR=vim\n", {}) == "export EDITOR=vim\n"
+
+    def test_variables(self):
+        text = render("Host {{hostname}}\n  User {{ user }}\n",
+                      {'hostname': 'box', 'user': 'joe'})
+        assert text == "Host box\n  User joe\n"
+
+    def test_shell_syntax_untouched(self):
+        text = "echo ${HOME} $user {not_a_var}"
+        assert render(text, {'user': 'joe'}) == text
+
+    def test_undefined_variable(self):
+        with pytest.raises(exc.TemplateError) as e:
+            render("{{ hostname }} {{ nope }}", {'hostname': 'box'}, '.foo')
+        assert e.value.path == '.foo'
+        assert e.value.variable == 'nope'
+
+    def test_variables_used(self):
+        assert variables("{{ os }} {{hostname}} {{ os }}") == ['hostname',
+                                                                'os']